@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+from fhir.resources.bundle import Bundle
+
+from linuxforhealth.csvtofhir.fhirutils.fhir_utils import (get_new_bundle, get_new_bundle_entry_post_resource,
+                                                           get_new_bundle_entry_put_resource, get_resource_id)
+from linuxforhealth.csvtofhir.serialization import ConvertedResource, dumps
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# maximum number of entries within a transaction bundle
+DEFAULT_BUNDLE_MAX_ENTRIES = 100
+
+# maximum number of group by keys with an open, partially filled, bundle
+DEFAULT_MAX_OPEN_BUNDLES = 1000
+
+
+class BundleBuilder:
+    """
+    Packs converted resources into PUT transaction Bundles grouped by group by key.
+
+    Resources are keyed by resource type and id within an open bundle, since a transaction may not contain two entries
+    for the same resource. A later resource with the same key replaces the earlier entry. Resources without an id are
+    added as POST entries.
+
+    A bundle is completed when it reaches max_entries. Open bundles are bounded by max_open_bundles. When the limit
+    is reached, the least recently updated bundle is completed, so memory remains bounded for unsorted input.
+    """
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_BUNDLE_MAX_ENTRIES,
+                 max_open_bundles: int = DEFAULT_MAX_OPEN_BUNDLES):
+        """
+        :param max_entries: The maximum number of entries per bundle
+        :param max_open_bundles: The maximum number of open bundles
+        :raise: ValueError if max_entries or max_open_bundles is less than 1
+        """
+        if max_entries < 1 or max_open_bundles < 1:
+            raise ValueError("max_entries and max_open_bundles must be greater than 0")
+
+        self.max_entries = max_entries
+        self.max_open_bundles = max_open_bundles
+        self.bundle_count = 0
+        self._bundles: OrderedDict = OrderedDict()
+        # entry index by resource url, for each open bundle
+        self._entry_indexes: Dict[str, Dict[str, int]] = {}
+
+    def add(self, group_by_key: str, resources: Iterable[ConvertedResource]) -> List[Tuple[str, Bundle]]:
+        """
+        Adds converted resources to the bundle for a group by key.
+
+        :param group_by_key: The group by key
+        :param resources: The converted resources, in the model output format
+        :return: list of completed (group by key, Bundle) tuples
+        """
+        completed = []
+
+        for r in resources:
+            bundle = self._bundles.get(group_by_key)
+            if bundle is None:
+                if len(self._bundles) >= self.max_open_bundles:
+                    completed.append(self._complete(next(iter(self._bundles))))
+                bundle = get_new_bundle()
+                self._bundles[group_by_key] = bundle
+                self._entry_indexes[group_by_key] = {}
+            else:
+                self._bundles.move_to_end(group_by_key)
+
+            if r.resource.id is None:
+                bundle.entry.append(get_new_bundle_entry_post_resource(r.resource))
+            else:
+                entry = get_new_bundle_entry_put_resource(r.resource)
+                entry_indexes = self._entry_indexes[group_by_key]
+                entry_index = entry_indexes.get(entry.request.url)
+                if entry_index is not None:
+                    logger.debug(f"Replacing duplicate bundle entry {entry.request.url}")
+                    bundle.entry[entry_index] = entry
+                    continue
+                entry_indexes[entry.request.url] = len(bundle.entry)
+                bundle.entry.append(entry)
+
+            if len(bundle.entry) >= self.max_entries:
+                completed.append(self._complete(group_by_key))
+
+        return completed
+
+    def _complete(self, group_by_key: str) -> Tuple[str, Bundle]:
+        self.bundle_count += 1
+        del self._entry_indexes[group_by_key]
+        return group_by_key, self._bundles.pop(group_by_key)
+
+    def flush(self) -> List[Tuple[str, Bundle]]:
+        """
+        Completes all open bundles.
+
+        :return: list of completed (group by key, Bundle) tuples
+        """
+        return [self._complete(k) for k in list(self._bundles)]
+
+
+def serialize_bundle(bundle: Bundle) -> bytes:
+    """
+    Serializes a Bundle to JSON bytes.
+
+    :param bundle: The Bundle
+    :return: JSON bytes
+    """
+    return dumps(bundle.dict(), default=bundle.__json_encoder__)
+
+
+def create_transaction_bundle_data(resources: Iterable[Dict]) -> Dict:
+    """
+    Creates a PUT transaction Bundle, as a dictionary, from resource dictionaries.
+    Used when resources are read from output files, to avoid parsing resources into models.
+
+    As with BundleBuilder, a later resource with the same resource type and id replaces the earlier entry, and
+    resources without an id are added as POST entries.
+
+    :param resources: The FHIR resource dictionaries
+    :return: the transaction Bundle dictionary
+    """
+    entries = []
+    entry_indexes: Dict[str, int] = {}
+    for r in resources:
+        if r.get("id") is None:
+            entries.append({"resource": r, "request": {"method": "POST", "url": r["resourceType"]}})
+            continue
+
+        resource_url = f"{r['resourceType']}/{r['id']}"
+        entry = {"fullUrl": resource_url, "resource": r, "request": {"method": "PUT", "url": resource_url}}
+        if resource_url in entry_indexes:
+            entries[entry_indexes[resource_url]] = entry
+        else:
+            entry_indexes[resource_url] = len(entries)
+            entries.append(entry)
+    return {"resourceType": "Bundle", "id": get_resource_id(), "type": "transaction", "entry": entries}
+
+
+def bundle_results(results: Iterable[Tuple[Any, str, List[ConvertedResource]]],
+                   max_entries: int = DEFAULT_BUNDLE_MAX_ENTRIES,
+                   max_open_bundles: int = DEFAULT_MAX_OPEN_BUNDLES) \
+        -> Generator[Tuple[Optional[Exception], str, Optional[Bundle]], None, None]:
+    """
+    Packs conversion results into PUT transaction Bundles grouped by group by key.
+    Bundles are returned as they are completed, as the conversion results are iterated.
+
+    Usage:
+    results = convert("/data/patient.csv", OutputFormat.MODEL)
+    for processing_exception, group_by_key, bundle in bundle_results(results, max_entries=50):
+        pass
+
+    :param results: The conversion results from convert(), using the model output format
+    :param max_entries: The maximum number of entries per bundle
+    :param max_open_bundles: The maximum number of open bundles
+    :return: generator which returns (processing exception, group by key, Bundle) tuples. The Bundle is None if a
+    processing exception is returned.
+    """
+    builder = BundleBuilder(max_entries, max_open_bundles)
+
+    for processing_exception, group_by_key, resources in results:
+        if processing_exception:
+            yield processing_exception, group_by_key, None
+            continue
+
+        for completed_key, bundle in builder.add(group_by_key, resources):
+            yield None, completed_key, bundle
+
+    for completed_key, bundle in builder.flush():
+        yield None, completed_key, bundle
+
+    logger.debug(f"Created {builder.bundle_count} bundles")
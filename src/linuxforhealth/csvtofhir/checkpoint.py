@@ -0,0 +1,117 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConversionCheckpoint:
+    """
+    Records the progress of a conversion, so that a conversion which fails may be resumed.
+
+    A checkpoint contains the source files which are complete, the number of rows of the current source file which
+    were fully emitted, and the output writer state at that point. The current source file's size and modification
+    time are recorded, so that a checkpoint is not applied to a source file which has changed.
+    """
+
+    def __init__(self, checkpoint_path: str):
+        """
+        :param checkpoint_path: The checkpoint file path
+        """
+        self.checkpoint_path = checkpoint_path
+        self.completed_files: List[str] = []
+        self.current_file: Optional[str] = None
+        self.rows_emitted = 0
+        self.writer_state: Dict = {}
+        self._source_stat: Optional[List] = None
+
+    def load(self) -> bool:
+        """
+        Loads the checkpoint file.
+
+        :return: True if a checkpoint was loaded, False if the checkpoint file does not exist
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return False
+
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.completed_files = data["completedFiles"]
+        self.current_file = data["currentFile"]
+        self.rows_emitted = data["rowsEmitted"]
+        self.writer_state = data["writerState"]
+        self._source_stat = data["sourceStat"]
+        logger.info(f"Loaded checkpoint {self.checkpoint_path}: file={self.current_file} rows={self.rows_emitted}")
+        return True
+
+    def is_completed(self, source_path: str) -> bool:
+        return os.path.abspath(source_path) in self.completed_files
+
+    def get_start_row(self, source_path: str) -> int:
+        """
+        Returns the number of rows to skip when a source file's conversion is resumed.
+
+        :param source_path: The source file path
+        :return: the number of rows which were emitted, or 0 if the checkpoint is for a different file
+        :raise: ValueError if the source file has changed since the checkpoint was written
+        """
+        if self.current_file != os.path.abspath(source_path):
+            return 0
+
+        if self._source_stat != _get_source_stat(source_path):
+            raise ValueError(f"Source file {source_path} has changed since checkpoint {self.checkpoint_path}")
+        return self.rows_emitted
+
+    def update(self, source_path: str, rows_emitted: int, writer_state: Dict):
+        """
+        Records the progress of the current source file, and saves the checkpoint.
+
+        :param source_path: The source file path
+        :param rows_emitted: The number of source rows which were fully emitted
+        :param writer_state: The output writer state, once the emitted rows were written
+        """
+        self.current_file = os.path.abspath(source_path)
+        self.rows_emitted = rows_emitted
+        self.writer_state = writer_state
+        self._source_stat = _get_source_stat(source_path)
+        self.save()
+
+    def complete(self, source_path: str, writer_state: Dict):
+        """
+        Records a completed source file, and saves the checkpoint.
+
+        :param source_path: The source file path
+        :param writer_state: The output writer state, once the source file's resources were written
+        """
+        self.completed_files.append(os.path.abspath(source_path))
+        self.current_file = None
+        self.rows_emitted = 0
+        self.writer_state = writer_state
+        self._source_stat = None
+        self.save()
+
+    def save(self):
+        """Writes the checkpoint. The previous checkpoint is replaced once the new checkpoint is complete."""
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"completedFiles": self.completed_files,
+                       "currentFile": self.current_file,
+                       "rowsEmitted": self.rows_emitted,
+                       "sourceStat": self._source_stat,
+                       "writerState": self.writer_state,
+                       "savedAt": datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def remove(self):
+        """Removes the checkpoint file, once the conversion is complete"""
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def _get_source_stat(source_path: str) -> List:
+    stat = os.stat(source_path)
+    return [stat.st_size, stat.st_mtime_ns]
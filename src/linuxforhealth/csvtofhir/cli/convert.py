@@ -1,18 +1,28 @@
-import json
 import os
-import re
-from collections import defaultdict
-from typing import Dict, List
-
+import sys
+from typing import List, Optional
+
+from linuxforhealth.csvtofhir.bundle import DEFAULT_BUNDLE_MAX_ENTRIES, DEFAULT_MAX_OPEN_BUNDLES
+from linuxforhealth.csvtofhir.checkpoint import ConversionCheckpoint
+from linuxforhealth.csvtofhir.cli.load import create_loader
+from linuxforhealth.csvtofhir.cli.writers import (DEFAULT_WRITER_QUEUE_SIZE, GroupedResourceWriter, HttpBundleWriter,
+                                                  QueuedResourceWriter, ResourceWriter, create_writer,
+                                                  get_safe_source_file_id)
+from linuxforhealth.csvtofhir.config import get_converter_config, set_mapping_config_directory
 from linuxforhealth.csvtofhir.converter import convert
+from linuxforhealth.csvtofhir.dedup import DedupIndex, create_dedup_index
+from linuxforhealth.csvtofhir.external_sort import DEFAULT_SORT_BUFFER_RECORDS
+from linuxforhealth.csvtofhir.loader import FhirLoaderException
+from linuxforhealth.csvtofhir.manifest import DEFAULT_MANIFEST_FILE_NAME, ConversionManifest, hash_directory, hash_file
 from linuxforhealth.csvtofhir.model.contract import DataContract, load_data_contract
-from linuxforhealth.csvtofhir.support import validate_paths, open_file
+from linuxforhealth.csvtofhir.support import is_archive, list_archive_members, validate_paths
 
 
 def _filter_input_files(input_files: List[str], config_dir: str) -> List[str]:
     """
     Filters an input file list using the file definitions in a data contract.
-    Files which do not contain any data contract file definition key are removed.
+    Files which do not contain any data contract file definition key are removed. Zip archives are retained if any
+    archive member contains a file definition key.
 
     :param input_files: The input files to process
     :param config_dir: The configuration directory path
@@ -24,26 +34,35 @@ def _filter_input_files(input_files: List[str], config_dir: str) -> List[str]:
 
     filtered_files: List[str] = []
     for f in input_files:
-        base_file_name = os.path.splitext(os.path.basename(f))[0]
-        # match the data-contract key to any fragment of the file name
-        for def_name in file_definition_names:
-            if def_name.lower() in base_file_name.lower():
-                if f not in filtered_files:
-                    filtered_files.append(f)
+        source_names = list_archive_members(f) if is_archive(f) and os.path.isfile(f) else [f]
+        for source_name in source_names:
+            base_file_name = os.path.splitext(os.path.basename(source_name))[0]
+            # match the data-contract key to any fragment of the file name
+            for def_name in file_definition_names:
+                if def_name.lower() in base_file_name.lower():
+                    if f not in filtered_files:
+                        filtered_files.append(f)
 
     filtered_files.sort()
     return filtered_files
 
 
-def _convert_single_file(file_path: str, config_dir_path: str, output_dir_path: str, group_key_resource_counter: Dict):
+def _convert_single_file(file_path: str,
+                         config_dir_path: str,
+                         output_dir_path: str,
+                         writer: ResourceWriter,
+                         dedup_index: Optional[DedupIndex] = None,
+                         checkpoint: Optional[ConversionCheckpoint] = None) -> bool:
     """
     Converts a single source file to FHIR resource(s)
 
     :param file_path: The file path
     :param config_dir_path: The configuration directory path
     :param output_dir_path: The output directory path
-    :param group_key_resource_counter: Keeps a running count of resource counts per group key. Used for generating file
-        names.
+    :param writer: The resource writer used to write converted resources
+    :param dedup_index: Optional index used to suppress repeated referenced resources.
+    :param checkpoint: Optional checkpoint used to record and resume conversion progress.
+    :return: True if the source file was converted without errors
     :raises FileNotFoundError: if paths are not found
 
     """
@@ -54,31 +73,117 @@ def _convert_single_file(file_path: str, config_dir_path: str, output_dir_path:
     filtered_files = _filter_input_files([file_path], config_dir_path)
     print(f"Processing {len(filtered_files)} file(s)")
 
+    is_converted = True
     if not filtered_files:
         print(f"File {file_path} did not match a DataContract FileDefinition")
     else:
-        _convert_source_file(group_key_resource_counter, output_dir_path, file_path, config_dir_path)
+        is_converted = _convert_source_file(writer, file_path, config_dir_path, dedup_index, checkpoint)
 
     print("Processing complete")
+    return is_converted
+
+
+def _create_manifest(args, base_dir_path: str, output_dir_path: Optional[str]) -> Optional[ConversionManifest]:
+    """
+    Creates the conversion manifest used to skip unchanged source files in directory mode.
 
+    Files may only be skipped if each source file's output is independent of other source files: per-resource JSON
+    files, NDJSON files partitioned by source file, or resources posted to a FHIR server.
+
+    :param args: Parsed command line arguments
+    :param base_dir_path: The base directory path
+    :param output_dir_path: The output directory path
+    :return: the ConversionManifest, or None if the output layout does not support skipping files
+    """
+    post_to = getattr(args, "post_to", None)
+    output_format = getattr(args, "output_format", "json")
+    ndjson_partition = getattr(args, "ndjson_partition", "resource-type")
+
+    if post_to:
+        output = {"postTo": post_to}
+    elif getattr(args, "group_across_files", False) or output_format == "bundle" or \
+            (output_format == "ndjson" and ndjson_partition != "source-file"):
+        print("Unchanged files are not skipped, since output files combine resources from several source files")
+        return None
+    else:
+        output = {"directory": os.path.abspath(output_dir_path),
+                  "outputFormat": output_format,
+                  "ndjsonPartition": ndjson_partition if output_format == "ndjson" else None,
+                  "compression": getattr(args, "compression", None)}
+
+    manifest_path = getattr(args, "manifest", None) or os.path.join(base_dir_path, DEFAULT_MANIFEST_FILE_NAME)
+    return ConversionManifest(manifest_path, output)
+
+
+def _get_source_file_ids(file_path: str) -> List[str]:
+    """
+    Returns the source file ids used in output file names for a source file, or for each member of an archive.
 
-def _convert_directory_files(base_dir_path: str, output_dir_path: str, group_key_resource_counter: Dict):
+    :param file_path: The source file path
+    :return: list of safe source file ids
+    """
+    if is_archive(file_path):
+        file_names = [os.path.basename(m) for m in list_archive_members(file_path)]
+    else:
+        file_names = [os.path.basename(file_path)]
+    return sorted({get_safe_source_file_id(f) for f in file_names})
+
+
+def _remove_previous_output(writer: ResourceWriter,
+                            manifest: ConversionManifest,
+                            file_path: str,
+                            source_file_ids: List[str]):
+    """
+    Removes the output files written for a source file by a previous conversion, so that resources which are no
+    longer converted from the source file are not left in the output directory.
+
+    :param writer: The resource writer
+    :param manifest: The conversion manifest, which contains the source file ids of the previous conversion
+    :param file_path: The source file path
+    :param source_file_ids: The source file ids of the current conversion
+    """
+    entry = manifest.get_entry(file_path)
+    if entry is None:
+        return
+
+    previous_ids = set(entry.get("sourceFileIds") or []) | set(source_file_ids)
+    removed_count = writer.remove_source_file_output(sorted(previous_ids))
+    if removed_count:
+        print(f"Removed {removed_count} previous output file(s) for file = {file_path}")
+
+
+def _convert_directory_files(base_dir_path: str,
+                             output_dir_path: str,
+                             writer: ResourceWriter,
+                             dedup_index: Optional[DedupIndex] = None,
+                             manifest: Optional[ConversionManifest] = None,
+                             force: bool = False,
+                             checkpoint: Optional[ConversionCheckpoint] = None) -> bool:
     """
     Converts all source files within a standard directory layout.
 
     Input files are parsed from <base dir path>/input.
     Config file are parsed from <base dir path>/config.
 
+    When a checkpoint is used, conversion stops at the first source file with errors, so that the checkpoint
+    records its progress.
+
     :param base_dir_path: The base directory path used for the conversion process.
     :param output_dir_path: The path to the output directory where FHIR resources are generated.
-    :param group_key_resource_counter: Keeps a running count of resource counts per group key. Used for generating file
-        names.
+    :param writer: The resource writer used to write converted resources
+    :param dedup_index: Optional index used to suppress repeated referenced resources across files.
+    :param manifest: Optional manifest used to skip source files which are unchanged since they were converted.
+    :param force: Converts all source files, including unchanged files, if True.
+    :param checkpoint: Optional checkpoint used to record and resume conversion progress.
+    :return: True if all source files were converted without errors
     :raises FileNotFoundError: if directory paths are not found
     """
     input_dir_path = f"{base_dir_path}/input"
     config_dir_path = f"{base_dir_path}/config"
 
-    paths = [input_dir_path, config_dir_path, output_dir_path]
+    paths = [input_dir_path, config_dir_path]
+    if output_dir_path:
+        paths.append(output_dir_path)
     validate_paths(paths, raise_exception=True)
 
     print(f"Base directory = {base_dir_path}")  # base directory
@@ -97,12 +202,78 @@ def _convert_directory_files(base_dir_path: str, output_dir_path: str, group_key
     filtered_files = _filter_input_files(input_files, config_dir_path)
     print(f"Processing {len(filtered_files)} file(s)")
 
+    contract_hash = hash_directory(config_dir_path) if manifest is not None else None
+
+    is_all_converted = True
     for file_path in filtered_files:
+        if checkpoint is not None and checkpoint.is_completed(file_path):
+            print(f"Skipping file completed before checkpoint = {file_path}")
+            continue
+
+        source_hash = None
+        if manifest is not None:
+            source_hash = hash_file(file_path)
+            if not force and manifest.is_current(file_path, source_hash, contract_hash):
+                print(f"Skipping unchanged file = {file_path}")
+                manifest.skip(file_path)
+                continue
+
         print(f"Processing file = {file_path}")
 
-        _convert_source_file(group_key_resource_counter, output_dir_path, file_path, config_dir_path)
+        source_file_ids = None
+        if manifest is not None:
+            source_file_ids = _get_source_file_ids(file_path)
+            if checkpoint is None or not checkpoint.get_start_row(file_path):
+                _remove_previous_output(writer, manifest, file_path, source_file_ids)
+
+        is_converted = _convert_source_file(writer, file_path, config_dir_path, dedup_index, checkpoint)
+        if is_converted and manifest is not None:
+            manifest.record(file_path, source_hash, contract_hash, source_file_ids)
+
+        if not is_converted:
+            is_all_converted = False
+            if checkpoint is not None:
+                print(f"Stopping at file with errors = {file_path}")
+                break
 
     print("Processing complete")
+    return is_all_converted
+
+
+def create_output_writer(args, output_dir_path: Optional[str]) -> ResourceWriter:
+    """
+    Creates the resource writer for parsed command line output arguments.
+
+    :param args: Parsed command line arguments
+    :param output_dir_path: The output directory path, which is not used if resources are posted to a FHIR server
+    :return: ResourceWriter
+    """
+    if getattr(args, "post_to", None):
+        group_across_files = getattr(args, "group_across_files", False)
+        writer = HttpBundleWriter(create_loader(args),
+                                  getattr(args, "bundle_max_entries", DEFAULT_BUNDLE_MAX_ENTRIES),
+                                  max_open_bundles=1 if group_across_files else DEFAULT_MAX_OPEN_BUNDLES)
+        if group_across_files:
+            writer = GroupedResourceWriter(writer,
+                                           getattr(args, "sort_buffer_records", DEFAULT_SORT_BUFFER_RECORDS),
+                                           getattr(args, "sort_temp_dir", None))
+    else:
+        writer = create_writer(output_dir_path,
+                               getattr(args, "output_format", "json"),
+                               getattr(args, "ndjson_partition", "resource-type"),
+                               getattr(args, "max_records", None),
+                               getattr(args, "max_bytes", None),
+                               getattr(args, "compression", None),
+                               getattr(args, "compression_level", None),
+                               getattr(args, "compression_thread", False),
+                               getattr(args, "writer_threads", 0),
+                               getattr(args, "writer_queue_size", DEFAULT_WRITER_QUEUE_SIZE),
+                               getattr(args, "bundle_max_entries", DEFAULT_BUNDLE_MAX_ENTRIES),
+                               getattr(args, "group_across_files", False),
+                               getattr(args, "sort_buffer_records", DEFAULT_SORT_BUFFER_RECORDS),
+                               getattr(args, "sort_temp_dir", None))
+
+    return writer
 
 
 def convert_to_fhir(args):
@@ -123,96 +294,168 @@ def convert_to_fhir(args):
     FHIR resources are stored within the output directory under "group key subdirectories", which follow the naming
     standard [group key]-[resource type]-[auto-increment-number].json
 
+    The "--output-format ndjson" flag writes FHIR Bulk Data style NDJSON files to the output directory instead, one
+    per resource type, or per resource type and source file with "--ndjson-partition source-file". Files are rotated
+    using "--max-records" and "--max-bytes".
+
+    The "--output-format bundle" flag writes PUT transaction Bundles, grouped by group key, with at most
+    "--bundle-max-entries" entries per Bundle. Bundles are written as they are completed.
+
+    The "--group-across-files" flag groups resources by group key across all source files, so that the resources for
+    a group key, such as a patient, are written together: a Bundle per group key with "--output-format bundle", or an
+    NDJSON file per group key with "--ndjson-partition group-key". Resources are grouped with an on-disk external sort,
+    holding at most "--sort-buffer-records" resources in memory, using "--sort-temp-dir" for sort files.
+
+    The "--post-to" flag posts PUT transaction Bundles, grouped by group key, to a FHIR server base url rather than
+    writing output files. See load_to_fhir for the options used to post bundles. If a post fails, the checkpoint is
+    not updated past the failed bundle, and the command exits with a non-zero status.
+
+    The "--compression" flag compresses output files using gzip, bz2, or xz, with an optional "--compression-level".
+    "--compression-thread" compresses NDJSON output on background threads, overlapping compression with conversion.
+
+    The "--writer-threads" flag writes output on background threads, so that conversion is not blocked by output I/O.
+    Pending result batches are bounded by "--writer-queue-size" per thread. The queue depth statistics printed after
+    conversion indicate whether conversion (an empty queue) or output I/O (a full queue) is the bottleneck.
+
+    In directory mode, source files which are unchanged since they were last converted are skipped. A manifest,
+    stored in the base directory or at the "--manifest" path, records the hash of each converted source file, the
+    hash of the configuration directory, and the output location. A file is reconverted if any of these change, or if
+    the "--force" flag is used. Skipped files are reported after conversion. The previous output files of a
+    reconverted source file are removed before it is converted, so that resources it no longer converts are removed.
+
+    The "--checkpoint" flag writes checkpoints to the checkpoint path every checkpoint_interval chunks (see
+    ConverterConfig), recording the source rows which were fully written and the writer state. A failed conversion
+    is continued from the last checkpoint with "--resume", skipping completed files and the rows already written.
+    In directory mode, conversion stops at the first file with errors. The checkpoint is removed once every file is
+    converted without errors.
+
+    The optional "--dedup" flag suppresses repeated referenced resources once per group key ("group") or once per
+    run ("run"). Defaults to the converter configuration's dedup_scope.
+
     :param args: Parsed command line arguments
     :raise: FileNotFoundError if the profile or output directories do not exist
     :raise: ArgumentError if neither -d or -f is received
+    :raise: ValueError if checkpoints are not supported by the output writer
     """
-    # provides a counter for each group key resource
-    group_key_resource_counter = {}
-
     # determine if we're running in directory or file mode
     is_directory_mode = bool(args.d)
-    output_dir_path = os.path.expandvars(args.o)
+    output_dir_path = os.path.expandvars(args.o) if args.o else None
+
+    # the config directory is set before the converter config is read
+    config_dir_path = f"{os.path.expandvars(args.d)}/config" if is_directory_mode else os.path.expandvars(args.c)
+    set_mapping_config_directory(config_dir_path)
+    dedup_index = create_dedup_index(get_converter_config(), getattr(args, "dedup", None))
+
+    writer = create_output_writer(args, output_dir_path)
 
+    checkpoint = None
+    if getattr(args, "checkpoint", None):
+        if not writer.supports_checkpoint:
+            raise ValueError("checkpoints are not supported when grouping across files")
+
+        checkpoint = ConversionCheckpoint(os.path.expandvars(args.checkpoint))
+        if getattr(args, "resume", False):
+            if checkpoint.load():
+                writer.restore(checkpoint.writer_state)
+                print(f"Resuming from checkpoint = {checkpoint.checkpoint_path}")
+            else:
+                print(f"Checkpoint {checkpoint.checkpoint_path} not found, converting all files")
+
+    manifest = None
     if is_directory_mode:
-        base_dir_path = os.path.expandvars(args.d)
-        _convert_directory_files(base_dir_path, output_dir_path, group_key_resource_counter)
-    else:
-        file_path = os.path.expandvars(args.f)
-        config_dir_path = os.path.expandvars(args.c)
-        _convert_single_file(file_path, config_dir_path, output_dir_path, group_key_resource_counter)
+        manifest = _create_manifest(args, os.path.expandvars(args.d), output_dir_path)
+
+    with writer:
+        if is_directory_mode:
+            base_dir_path = os.path.expandvars(args.d)
+            is_all_converted = _convert_directory_files(base_dir_path,
+                                                        output_dir_path,
+                                                        writer,
+                                                        dedup_index,
+                                                        manifest,
+                                                        getattr(args, "force", False),
+                                                        checkpoint)
+        else:
+            file_path = os.path.expandvars(args.f)
+            is_all_converted = _convert_single_file(file_path,
+                                                    config_dir_path,
+                                                    output_dir_path,
+                                                    writer,
+                                                    dedup_index,
+                                                    checkpoint)
+
+    # bundles which were not accepted by the FHIR server fail the conversion
+    loader = getattr(getattr(writer, "writer", writer), "loader", None)
+    if loader is not None:
+        print(f"Load complete: {loader.stats}")
+        if loader.stats.failures:
+            is_all_converted = False
+
+    if checkpoint is not None:
+        # the checkpoint is removed once the output is complete, and is kept to resume a conversion with errors
+        if is_all_converted:
+            checkpoint.remove()
+        else:
+            print(f"Conversion errors occurred, keeping checkpoint = {checkpoint.checkpoint_path}")
+
+    if isinstance(writer, QueuedResourceWriter):
+        print(f"Writer queue: {writer.stats}")
+
+    if manifest is not None:
+        # the manifest is saved once the output is complete
+        manifest.save()
+        print(f"Skipped {len(manifest.skipped)} unchanged file(s)")
+        for file_path in manifest.skipped:
+            print(f"  {file_path}")
+
+    if dedup_index is not None:
+        print(f"Suppressed {dedup_index.suppressed} duplicate resource(s)")
+
+    if loader is not None and loader.stats.failures:
+        sys.exit(f"Load failed: {loader.stats.failures} request(s) failed")
 
 
 def _convert_source_file(
-        group_key_resource_counter: dict,
-        output_dir: str,
+        writer: ResourceWriter,
         source_file_path: str,
-        config_dir_path: str):
+        config_dir_path: str,
+        dedup_index: Optional[DedupIndex] = None,
+        checkpoint: Optional[ConversionCheckpoint] = None) -> bool:
     """
     Converts a delimited source file to FHIR resources.
 
-    :param group_key_resource_counter: a dictionary counter used to track group key FHIR resources.
-    :param output_dir: directory to place output folders and files
+    :param writer: The resource writer used to write converted resources
     :param source_file_path: source file path
     :param config_dir_path: the path to the configuration directory
+    :param dedup_index: Optional index used to suppress repeated referenced resources.
+    :param checkpoint: Optional checkpoint used to record and resume conversion progress.
+    :return: True if the source file was converted without errors
     """
-    os.environ["MAPPING_CONFIG_DIRECTORY"] = config_dir_path
-
-    for error, group_key, resources in convert(source_file_path):
-        if error:
-            print(f"Error processing Group Key = {group_key} in File = {source_file_path}")
-            return
-
-        if group_key not in group_key_resource_counter:
-            group_key_resource_counter[group_key] = defaultdict(int)
-
-        group_key_dir = f"{output_dir}/{group_key}"
-        if not os.path.exists(group_key_dir):
-            os.mkdir(group_key_dir)
-
-        try:
-            resources_data: List[Dict] = [json.loads(r) for r in resources]
-            _write_fhir_resources(resources_data, group_key, group_key_dir, group_key_resource_counter)
-        except json.JSONDecodeError as je:
-            print(f"Error decoding FHIR resource Group Key = {group_key} in File = {source_file_path}")
-            print(f"{je}")
-            return
-
-
-def _write_fhir_resources(
-        resources_data: List[Dict],
-        group_key: str,
-        group_key_dir: str,
-        group_key_resource_counter: dict):
-    """
-    Writes FHIR resources to disk, within the "group key" directory.
-
-    :param resources_data: list of resources to write
-    :param group_key: group_key the fixture file is mapped to in the group_key_resource_counter
-    :param group_key_dir: directory of group where the file will be written
-    :param group_key_resource_counter: a dictionary map of resources for each group_key
-    """
-    for r in resources_data:
-        resource_type = r.get("resourceType")
-        source_file_id = _get_safe_file_id_and_line_number(r.get("meta", []))
-        # Use a combination of resource_type with origination file name (source file id) to count up
-        combo_resource_type_and_source_file_id = resource_type + "-" + source_file_id
-        resource_count = group_key_resource_counter[group_key][combo_resource_type_and_source_file_id] + 1
-        group_key_resource_counter[group_key][combo_resource_type_and_source_file_id] = resource_count
-        resource_count_display = str(resource_count).zfill(5)
-
-        fixture_file_name = f"{group_key}-{resource_type}-{source_file_id}-{resource_count_display}.json"
-        fixture_path = os.path.join(group_key_dir, fixture_file_name)
-
-        with open_file(fixture_path, "w") as w:
-            w.write(json.dumps(r, indent=4, sort_keys=True))
-
-
-def _get_safe_file_id_and_line_number(extension: List[Dict]) -> str:
-    inner_ext = extension.get("extension", [])
-    for ext in inner_ext:
-        if ext["url"] is not None and "source-file-id" in ext["url"]:
-            value_sans_line_number = ext["valueString"].split(":")[0]
-            value_sans_line_number = value_sans_line_number.split(".csv")[0]
-            return re.sub(r"[^A-Za-z0-9\-]", "_", value_sans_line_number)
-    return ""
+    if os.environ.get("MAPPING_CONFIG_DIRECTORY") != config_dir_path:
+        set_mapping_config_directory(config_dir_path)
+
+    start_row = 0
+    checkpoint_callback = None
+    if checkpoint is not None:
+        start_row = checkpoint.get_start_row(source_file_path)
+
+        def checkpoint_callback(rows_emitted: int):
+            checkpoint.update(source_file_path, rows_emitted, writer.checkpoint())
+
+    results = convert(source_file_path, writer.input_format, dedup_index, start_row, checkpoint_callback)
+    try:
+        for error, group_key, resources in results:
+            if error:
+                print(f"Error processing Group Key = {group_key} in File = {source_file_path}")
+                return False
+
+            writer.write(group_key, resources)
+
+        if checkpoint is not None:
+            checkpoint.complete(source_file_path, writer.checkpoint())
+    except FhirLoaderException as ex:
+        # the checkpoint is not updated past bundles which were not delivered
+        print(f"Load failed for File = {source_file_path}: {ex}")
+        return False
+
+    return True
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+from typing import Dict, Iterator, List
+
+from linuxforhealth.csvtofhir.bundle import DEFAULT_BUNDLE_MAX_ENTRIES, create_transaction_bundle_data
+from linuxforhealth.csvtofhir.loader import FhirLoader
+from linuxforhealth.csvtofhir.serialization import dumps
+from linuxforhealth.csvtofhir.support import COMPRESSION_EXTENSIONS, open_file
+
+
+def create_loader(args) -> FhirLoader:
+    """
+    Creates a FhirLoader from parsed command line arguments.
+
+    :param args: Parsed command line arguments
+    :return: FhirLoader
+    """
+    headers: Dict[str, str] = {}
+    for header in getattr(args, "post_header", None) or []:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+
+    return FhirLoader(args.post_to,
+                      concurrency=args.post_concurrency,
+                      max_retries=args.post_max_retries,
+                      headers=headers)
+
+
+def _get_compression(file_path: str) -> str:
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if file_path.endswith(extension):
+            return compression
+    return "none"
+
+
+def _strip_compression_extension(file_name: str) -> str:
+    for extension in COMPRESSION_EXTENSIONS.values():
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+
+def _find_output_files(input_dir_path: str) -> List[str]:
+    """
+    Returns the JSON and NDJSON files, which may be compressed, within a directory and its subdirectories.
+    Hidden files and directories, such as state files written by the csvtofhir commands, are excluded.
+
+    :param input_dir_path: The directory path
+    :return: sorted list of file paths
+    """
+    output_files = []
+    for dir_path, dir_names, file_names in os.walk(input_dir_path):
+        dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+        for file_name in file_names:
+            if file_name.startswith("."):
+                continue
+            base_name = _strip_compression_extension(file_name)
+            if base_name.endswith(".json") or base_name.endswith(".ndjson"):
+                output_files.append(os.path.join(dir_path, file_name))
+    return sorted(output_files)
+
+
+def _read_resources(file_path: str) -> Iterator[Dict]:
+    """
+    Reads FHIR resources from a JSON file, containing a single resource, or an NDJSON file.
+
+    :param file_path: The file path
+    :return: iterator of FHIR resource dictionaries
+    """
+    with open_file(file_path, "rt", encoding="utf-8", compression=_get_compression(file_path)) as f:
+        # JSON files may be pretty printed, and are parsed as a whole
+        if _strip_compression_extension(file_path).endswith(".json"):
+            yield json.load(f)
+            return
+
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_to_fhir(args):
+    """
+    Loads converted FHIR resources to a FHIR server.
+
+    The "-i" flag specifies the directory containing converted resources, written by the convert command in any
+    output format. Transaction Bundles are posted as-is. Other resources are packed into PUT transaction Bundles with
+    at most "--bundle-max-entries" entries.
+
+    The "--post-to" flag specifies the FHIR server base url. Bundles are posted with "--post-concurrency" concurrent
+    requests over persistent connections, and requests which fail with a 429 or 5xx status are retried up to
+    "--post-max-retries" times with exponential backoff. The command exits with a non-zero status if any request
+    failed.
+
+    :param args: Parsed command line arguments
+    :raise: FileNotFoundError if the input directory does not exist
+    :raise: SystemExit if any request failed
+    """
+    input_dir_path = os.path.expandvars(args.i)
+    if not os.path.isdir(input_dir_path):
+        raise FileNotFoundError(f"input directory {input_dir_path} not found")
+
+    max_entries = getattr(args, "bundle_max_entries", DEFAULT_BUNDLE_MAX_ENTRIES)
+    input_files = _find_output_files(input_dir_path)
+    print(f"Loading {len(input_files)} file(s) to {args.post_to}")
+
+    with create_loader(args) as loader:
+        resources: List[Dict] = []
+        for file_path in input_files:
+            for r in _read_resources(file_path):
+                if r.get("resourceType") == "Bundle":
+                    loader.submit(dumps(r), len(r.get("entry", [])))
+                    continue
+
+                resources.append(r)
+                if len(resources) >= max_entries:
+                    loader.submit(dumps(create_transaction_bundle_data(resources)), len(resources))
+                    resources = []
+
+        if resources:
+            loader.submit(dumps(create_transaction_bundle_data(resources)), len(resources))
+
+    print(f"Load complete: {loader.stats}")
+    if loader.stats.failures:
+        sys.exit(f"Load failed: {loader.stats.failures} request(s) failed")
@@ -2,22 +2,161 @@ import argparse
 import sys
 from typing import List
 
-from linuxforhealth.csvtofhir.cli.convert import convert_to_fhir
-from linuxforhealth.csvtofhir.cli.validate import validate_data_contract
 
 CLI_DESCRIPTION = """
 CSVToFHIR converts custom delimited records to FHIR Resources (JSON).
 The CLI supports:
 - DataContract Validation
 - Source Record Conversion
+- Watching a directory for live source records
+- A local conversion service
+- Loading converted resources to a FHIR server
 """
 
 
+# Commands import their implementation when they run, so that starting the CLI does not import the converter,
+# pandas, and the FHIR models which are used by a single command.
+
+
+def validate_data_contract(args):
+    """Runs the validate command"""
+    from linuxforhealth.csvtofhir.cli.validate import validate_data_contract as run_command
+    run_command(args)
+
+
+def convert_to_fhir(args):
+    """Runs the convert command"""
+    from linuxforhealth.csvtofhir.cli.convert import convert_to_fhir as run_command
+    run_command(args)
+
+
+def watch_directory(args):
+    """Runs the watch command"""
+    from linuxforhealth.csvtofhir.cli.watch import watch_directory as run_command
+    run_command(args)
+
+
+def serve(args):
+    """Runs the serve command"""
+    from linuxforhealth.csvtofhir.cli.serve import serve as run_command
+    run_command(args)
+
+
+def load_to_fhir(args):
+    """Runs the load command"""
+    from linuxforhealth.csvtofhir.cli.load import load_to_fhir as run_command
+    run_command(args)
+
+
+def add_loader_arguments(parser: argparse.ArgumentParser, post_to_required: bool):
+    """
+    Adds the arguments used to post transaction Bundles to a FHIR server.
+
+    :param parser: The sub-parser
+    :param post_to_required: True if the FHIR server url is required
+    """
+    parser.add_argument("--post-to",
+                        default=None,
+                        help="The FHIR server base url. Transaction Bundles are posted to the base url.",
+                        required=post_to_required)
+
+    parser.add_argument("--post-concurrency",
+                        type=int,
+                        default=4,
+                        help="The number of concurrent requests, and persistent connections, to the FHIR server.",
+                        required=False)
+
+    parser.add_argument("--post-max-retries",
+                        type=int,
+                        default=5,
+                        help="The maximum number of retries for 429 and 5xx responses and connection errors.",
+                        required=False)
+
+    parser.add_argument("--post-header",
+                        action="append",
+                        default=None,
+                        help="A request header, formatted as 'name: value'. May be repeated.",
+                        required=False)
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the arguments used to write converted resources to output files.
+
+    :param parser: The sub-parser
+    """
+    parser.add_argument("-o", help="The Fixture Output Directory", required=False)
+
+    parser.add_argument("--output-format",
+                        choices=["json", "ndjson", "bundle"],
+                        default="json",
+                        help="json writes a file per resource. ndjson writes FHIR Bulk Data NDJSON files. "
+                             "bundle writes transaction Bundles grouped by group key.",
+                        required=False)
+
+    parser.add_argument("--bundle-max-entries",
+                        type=int,
+                        default=100,
+                        help="The maximum number of entries per transaction Bundle.",
+                        required=False)
+
+    parser.add_argument("--ndjson-partition",
+                        choices=["resource-type", "source-file", "group-key"],
+                        default="resource-type",
+                        help="Writes an NDJSON file per resource type, per resource type and source file, "
+                             "or per group key.",
+                        required=False)
+
+    parser.add_argument("--max-records",
+                        type=int,
+                        default=None,
+                        help="The maximum number of records per NDJSON file.",
+                        required=False)
+
+    parser.add_argument("--max-bytes",
+                        type=int,
+                        default=None,
+                        help="The maximum number of bytes per NDJSON file.",
+                        required=False)
+
+    parser.add_argument("--compression",
+                        choices=["none", "gzip", "bz2", "xz"],
+                        default="none",
+                        help="Compresses output files.",
+                        required=False)
+
+    parser.add_argument("--compression-level",
+                        type=int,
+                        default=None,
+                        help="The compression level. Defaults to the compression format's default.",
+                        required=False)
+
+    parser.add_argument("--compression-thread",
+                        action="store_true",
+                        help="Compresses NDJSON output on background threads.",
+                        required=False)
+
+    parser.add_argument("--writer-threads",
+                        type=int,
+                        default=0,
+                        help="The number of background writer threads. Defaults to 0, writing on the main thread.",
+                        required=False)
+
+    parser.add_argument("--writer-queue-size",
+                        type=int,
+                        default=64,
+                        help="The maximum number of pending result batches per writer thread.",
+                        required=False)
+
+
 def create_arg_parser():
     """
     Creates argument parsers for the following programs/sub-parsers:
     - validation
     - convert
+    - watch
+    - serve
+    - load
     :return: The argument parser
     """
     arg_parser = argparse.ArgumentParser(
@@ -46,10 +185,144 @@ def create_arg_parser():
                          help="The config directory location. Required if -f is used.",
                          required=False)
 
-    convert.add_argument("-o", help="The Fixture Output Directory", required=False)
+    add_output_arguments(convert)
+
+    convert.add_argument("--group-across-files",
+                         action="store_true",
+                         help="Groups resources by group key across source files using an on-disk sort.",
+                         required=False)
+
+    convert.add_argument("--sort-buffer-records",
+                         type=int,
+                         default=100000,
+                         help="The maximum number of resources held in memory when grouping across files.",
+                         required=False)
+
+    convert.add_argument("--sort-temp-dir",
+                         default=None,
+                         help="The directory used for sort files. Defaults to the system temp directory.",
+                         required=False)
+
+    convert.add_argument("--force",
+                         action="store_true",
+                         help="Converts all source files in directory mode, including files which are unchanged.",
+                         required=False)
+
+    convert.add_argument("--manifest",
+                         default=None,
+                         help="The conversion manifest path. Defaults to .csvtofhir-manifest.json in the base "
+                              "directory.",
+                         required=False)
+
+    convert.add_argument("--checkpoint",
+                         default=None,
+                         help="Writes conversion checkpoints to the checkpoint path, so that a failed conversion may "
+                              "be resumed.",
+                         required=False)
+
+    convert.add_argument("--resume",
+                         action="store_true",
+                         help="Resumes a failed conversion from the --checkpoint path.",
+                         required=False)
+
+    convert.add_argument("--dedup",
+                         choices=["none", "group", "run"],
+                         default=None,
+                         help="Suppresses repeated referenced resources once per group key or once per run.",
+                         required=False)
+
+    add_loader_arguments(convert, post_to_required=False)
 
     convert.set_defaults(func=convert_to_fhir)
 
+    # watch
+    watch = sub_parsers.add_parser("watch", help="Convert source records to FHIR as they are delivered")
+    watch.add_argument("-d", help="Specifies the base processing directory.", required=True)
+
+    add_output_arguments(watch)
+
+    watch.add_argument("--poll-interval",
+                       type=float,
+                       default=2.0,
+                       help="The number of seconds between polls of the input directory.",
+                       required=False)
+
+    watch.add_argument("--settle-seconds",
+                       type=float,
+                       default=2.0,
+                       help="The number of seconds a file must be unchanged before it is converted.",
+                       required=False)
+
+    watch.add_argument("--ready-marker",
+                       default=None,
+                       help="A marker file suffix, such as .done. Files are converted once their marker exists.",
+                       required=False)
+
+    watch.add_argument("--dedup",
+                       choices=["none", "group", "run"],
+                       default=None,
+                       help="Suppresses repeated referenced resources once per group key or once per run.",
+                       required=False)
+
+    add_loader_arguments(watch, post_to_required=False)
+
+    watch.set_defaults(func=watch_directory)
+
+    # serve
+    serve_parser = sub_parsers.add_parser("serve", help="Run a local conversion service")
+    serve_parser.add_argument("-c", help="The config directory location.", required=True)
+
+    serve_parser.add_argument("--host",
+                              default="127.0.0.1",
+                              help="The host address. Defaults to 127.0.0.1.",
+                              required=False)
+
+    serve_parser.add_argument("--port",
+                              type=int,
+                              default=8080,
+                              help="The port. Defaults to 8080.",
+                              required=False)
+
+    serve_parser.add_argument("--unix-socket",
+                              default=None,
+                              help="Listens on a unix domain socket path rather than a host and port.",
+                              required=False)
+
+    serve_parser.add_argument("--workers",
+                              type=int,
+                              default=1,
+                              help="The number of worker processes.",
+                              required=False)
+
+    serve_parser.add_argument("--max-concurrent-requests",
+                              type=int,
+                              default=4,
+                              help="The maximum number of requests converted concurrently by each worker process.",
+                              required=False)
+
+    serve_parser.add_argument("--path-root",
+                              action="append",
+                              default=None,
+                              help="A directory which files may be converted from with /convert?path=. May be "
+                                   "repeated. Path requests are refused if no path root is specified.",
+                              required=False)
+
+    serve_parser.set_defaults(func=serve)
+
+    # load
+    load = sub_parsers.add_parser("load", help="Load converted FHIR resources to a FHIR server")
+    load.add_argument("-i", help="The directory containing converted resources", required=True)
+
+    load.add_argument("--bundle-max-entries",
+                      type=int,
+                      default=100,
+                      help="The maximum number of entries per transaction Bundle.",
+                      required=False)
+
+    add_loader_arguments(load, post_to_required=True)
+
+    load.set_defaults(func=load_to_fhir)
+
     return arg_parser
 
 
@@ -71,6 +344,23 @@ def main(received_arguments: List[str] = None):
                 # parser error exits the CLI
                 parser.error("-c is required when -f is used")
 
+            if not getattr(args, "o", None) and not getattr(args, "post_to", None):
+                parser.error("-o is required unless --post-to is used")
+
+            if getattr(args, "resume", False) and not getattr(args, "checkpoint", None):
+                parser.error("--checkpoint is required when --resume is used")
+
+            if getattr(args, "checkpoint", None) and getattr(args, "group_across_files", False):
+                parser.error("--checkpoint is not supported with --group-across-files")
+
+        if "watch" in args.func.__name__:
+            if not getattr(args, "o", None) and not getattr(args, "post_to", None):
+                parser.error("-o is required unless --post-to is used")
+
+        if getattr(args, "compression_thread", False) and \
+                (getattr(args, "output_format", None) != "ndjson" or getattr(args, "post_to", None)):
+            parser.error("--compression-thread is only supported with --output-format ndjson")
+
         # execute CLI
         args.func(args)
     else:
@@ -0,0 +1,299 @@
+import multiprocessing
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from linuxforhealth.csvtofhir.config import set_mapping_config_directory
+from linuxforhealth.csvtofhir.converter import (ConverterDefinitionLookupException, convert, convert_stream,
+                                                load_resource_converters, validate_contract)
+from linuxforhealth.csvtofhir.serialization import OutputFormat, dumps
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# default maximum number of requests converted concurrently by a worker process
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# read size used when streaming request bodies
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Converts source records to FHIR resources, streaming the resources as NDJSON.
+
+    Endpoints:
+    - POST /convert?fileName=<file name>: converts the CSV request body. The file name selects the FileDefinition.
+    - POST /convert?path=<file path>: converts a source file within one of the server's path roots.
+    - GET /health: returns the server status.
+
+    CSV payloads are converted as they are received, without writing them to a file. Resources are returned as they
+    are converted using a chunked response, one resource per line. A record which
+    fails to convert is returned as an OperationOutcome line. Requests which exceed the concurrency limit receive a
+    503 response, and paths outside of the path roots receive a 403 response.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, data: Any, headers: Optional[List[Tuple[str, str]]] = None):
+        body = dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers or []:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": f"{self.path} not found"})
+            return
+        self._send_json(200, {"status": "ok"})
+
+    def _read_body(self, content_length: int) -> Iterator[bytes]:
+        remaining = content_length
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, BODY_CHUNK_SIZE))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def do_POST(self):
+        request_url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(request_url.query).items()}
+        body_chunks = self._read_body(int(self.headers.get("Content-Length") or 0))
+
+        if request_url.path != "/convert":
+            error = (404, {"error": f"{request_url.path} not found"})
+        elif not params.get("fileName") and not params.get("path"):
+            error = (400, {"error": "the fileName or path query parameter is required"})
+        elif params.get("path") and not is_allowed_path(params["path"], self.server.path_roots):
+            error = (403, {"error": f"{params['path']} is not within a path root"})
+        elif not self.server.request_slots.acquire(blocking=False):
+            error = (503, {"error": "the maximum number of concurrent requests are in progress"})
+        else:
+            error = None
+
+        if error is not None:
+            for _ in body_chunks:
+                pass
+            self._send_json(*error, [("Retry-After", "1")] if error[0] == 503 else None)
+            return
+
+        try:
+            if params.get("path"):
+                file_path = params["path"]
+                self._convert(convert(file_path, OutputFormat.BYTES), file_path)
+            else:
+                # the payload is converted as it is read. The file name selects the FileDefinition.
+                file_name = params["fileName"]
+                self._convert(convert_stream(body_chunks, file_name, OutputFormat.BYTES), file_name)
+        finally:
+            self.server.request_slots.release()
+            # the unread request body is discarded, so that the connection may be reused
+            for _ in body_chunks:
+                pass
+
+    def _convert(self, results: Iterator, file_path: str):
+        """
+        Streams converted resources.
+
+        :param results: The conversion results
+        :param file_path: The source file path, or the logical name of a stream
+        """
+        try:
+            # the file definition lookup occurs when the first result is requested
+            first_result = next(results, None)
+        except ConverterDefinitionLookupException as ex:
+            self._send_json(400, {"error": str(ex)})
+            return
+        except FileNotFoundError as ex:
+            self._send_json(404, {"error": str(ex)})
+            return
+        except Exception as ex:
+            logger.error(f"Convert failed with {ex.__class__.__name__} for file_path={file_path}")
+            self._send_json(500, {"error": str(ex)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", NDJSON_CONTENT_TYPE)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            if first_result is not None:
+                self._write_result(*first_result)
+                for result in results:
+                    self._write_result(*result)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client disconnected while converting file_path={file_path}")
+            return
+        except Exception as ex:
+            # the response status has been sent, so the error is returned within the response
+            logger.error(f"Convert failed with {ex.__class__.__name__} for file_path={file_path}")
+            self._send_chunk(_create_operation_outcome(ex, f"converting {os.path.basename(file_path)}"))
+        self._send_chunk(b"")
+
+    def _write_result(self, processing_exception: Optional[Exception], group_by_key: str, resources: List):
+        if processing_exception:
+            self._send_chunk(_create_operation_outcome(processing_exception, f"converting group by key {group_by_key}"))
+        elif resources:
+            self._send_chunk(b"".join(r.resource + b"\n" for r in resources))
+
+    def log_message(self, format: str, *args):
+        logger.debug(format % args)
+
+
+def is_allowed_path(file_path: str, path_roots: List[str]) -> bool:
+    """
+    Returns True if a file path is within one of the path roots. Symbolic links and relative path segments are
+    resolved before the path is compared.
+
+    :param file_path: The requested file path
+    :param path_roots: The directories which may be converted from. Path requests are not allowed if empty.
+    :return: True if the file path is within a path root
+    """
+    real_path = os.path.realpath(file_path)
+    for root in path_roots:
+        real_root = os.path.realpath(root)
+        if os.path.commonpath([real_path, real_root]) == real_root:
+            return True
+    return False
+
+
+def _create_operation_outcome(ex: Exception, context: str) -> bytes:
+    """
+    Creates an OperationOutcome NDJSON line for a conversion error.
+
+    :param ex: The conversion error
+    :param context: Describes the conversion which failed
+    :return: the OperationOutcome line
+    """
+    outcome = {"resourceType": "OperationOutcome",
+               "issue": [{"severity": "error",
+                          "code": "processing",
+                          "diagnostics": f"{ex.__class__.__name__} {context}: {ex}"}]}
+    return dumps(outcome) + b"\n"
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    Serves conversion requests over TCP. Requests are handled on threads, and at most max_concurrent_requests are
+    converted concurrently.
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 server_address: Tuple[str, int],
+                 max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 path_roots: Optional[List[str]] = None):
+        """
+        :param server_address: The host and port. Port 0 selects an available port.
+        :param max_concurrent_requests: The maximum number of requests converted concurrently
+        :param path_roots: The directories which files may be converted from. Path requests are refused if None.
+        """
+        super().__init__(server_address, ConversionRequestHandler)
+        self.request_slots = threading.BoundedSemaphore(max_concurrent_requests)
+        self.path_roots = path_roots or []
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """
+        Serves conversion requests over a unix domain socket. Requests are handled on threads, and at most
+        max_concurrent_requests are converted concurrently.
+        """
+
+        daemon_threads = True
+
+        def __init__(self,
+                     socket_path: str,
+                     max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                     path_roots: Optional[List[str]] = None):
+            """
+            :param socket_path: The unix domain socket path
+            :param max_concurrent_requests: The maximum number of requests converted concurrently
+            :param path_roots: The directories which files may be converted from. Path requests are refused if None.
+            """
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            super().__init__(socket_path, ConversionRequestHandler)
+            self.request_slots = threading.BoundedSemaphore(max_concurrent_requests)
+            self.path_roots = path_roots or []
+
+        def get_request(self):
+            request, _ = super().get_request()
+            # BaseHTTPRequestHandler expects a host and port client address
+            return request, ("unix", 0)
+
+        def server_close(self):
+            super().server_close()
+            if os.path.exists(self.server_address):
+                os.remove(self.server_address)
+
+
+def serve(args):
+    """
+    Runs a local conversion service, which converts source records to FHIR resources without starting a process for
+    each conversion.
+
+    The "-c" flag specifies the configuration directory. The data contract is validated, and the resource converters
+    which it uses are imported, once when the service starts. The data contract is reloaded if it is modified.
+
+    The service listens on "--host" and "--port", or on the "--unix-socket" path. CSV payloads are posted to
+    /convert?fileName=<file name>, and files within a "--path-root" directory are converted with
+    /convert?path=<file path>. Path requests are refused if no "--path-root" is specified. Converted resources are
+    streamed as NDJSON.
+
+    "--workers" starts worker processes which share the listening socket, and "--max-concurrent-requests" limits the
+    number of requests converted concurrently by each worker. Additional requests receive a 503 response.
+
+    :param args: Parsed command line arguments
+    :raise: FileNotFoundError if the data contract is not found
+    :raise: ValueError if worker processes or unix domain sockets are not supported by the platform
+    """
+    set_mapping_config_directory(os.path.expandvars(args.c))
+    # converters are imported before worker processes are started, so that workers do not import them per request
+    load_resource_converters(validate_contract())
+    path_roots = [os.path.expandvars(p) for p in args.path_root or []]
+
+    if args.unix_socket:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise ValueError("unix domain sockets are not supported by the platform")
+        server = UnixConversionServer(args.unix_socket, args.max_concurrent_requests, path_roots)
+        address = args.unix_socket
+    else:
+        server = ConversionServer((args.host, args.port), args.max_concurrent_requests, path_roots)
+        address = f"http://{server.server_address[0]}:{server.server_address[1]}"
+
+    workers: List[multiprocessing.Process] = []
+    if args.workers > 1:
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("worker processes require the fork start method, which is not supported by the platform")
+
+        # workers inherit the listening socket and the loaded converter
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=server.serve_forever, daemon=True) for _ in range(args.workers - 1)]
+        for w in workers:
+            w.start()
+
+    print(f"Serving conversions on {address} with {max(args.workers, 1)} worker(s), press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for w in workers:
+            w.terminate()
+        server.server_close()
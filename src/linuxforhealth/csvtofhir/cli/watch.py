@@ -0,0 +1,232 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from linuxforhealth.csvtofhir.cli.convert import _convert_source_file, _filter_input_files, create_output_writer
+from linuxforhealth.csvtofhir.cli.writers import ResourceWriter
+from linuxforhealth.csvtofhir.config import get_converter_config, set_mapping_config_directory
+from linuxforhealth.csvtofhir.converter import load_resource_converters
+from linuxforhealth.csvtofhir.dedup import DedupIndex, create_dedup_index
+from linuxforhealth.csvtofhir.model.contract import DataStreamType, load_data_contract
+from linuxforhealth.csvtofhir.support import get_logger, validate_paths
+
+logger = get_logger(__name__)
+
+# default number of seconds between polls of the input directory
+DEFAULT_POLL_INTERVAL = 2.0
+
+# default number of seconds a file's size and modification time must be unchanged before it is converted
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# default writer state file name, within the base directory so that it is not loaded with the output
+DEFAULT_STATE_FILE_NAME = ".csvtofhir-watch-state.json"
+
+# suffixes used by producers for files which are still being written
+PARTIAL_FILE_SUFFIXES = (".tmp", ".part", ".partial")
+
+
+class DirectoryWatcher:
+    """
+    Converts source files as they are delivered to a standard directory layout, for live data streams.
+
+    The input directory is polled for completed files. A file is complete once its ready marker, [file name][ready
+    marker], exists, if a ready marker is configured. Otherwise, a file is complete once its size and modification time
+    are unchanged for settle_seconds. Hidden files, and files with a partial file suffix such as .tmp, are ignored.
+
+    Completed files are converted, and moved to <base dir>/processed, or to <base dir>/failed if conversion fails.
+    Output is flushed after each file. The writer, the dedup index, and the loaded contract are reused across files,
+    so that each file does not pay the converter startup cost. The writer state is saved to the state path after each
+    file, and restored when watching is restarted, so that later output does not replace earlier output files.
+    """
+
+    def __init__(self,
+                 base_dir_path: str,
+                 writer: ResourceWriter,
+                 dedup_index: Optional[DedupIndex] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 ready_marker: Optional[str] = None,
+                 state_path: Optional[str] = None):
+        """
+        :param base_dir_path: The base directory, containing the input and config directories
+        :param writer: The resource writer used to write converted resources
+        :param dedup_index: Optional index used to suppress repeated referenced resources across files
+        :param settle_seconds: The number of seconds a file must be unchanged before it is converted
+        :param ready_marker: Optional ready marker suffix, such as ".done". Files are only converted once their
+        ready marker exists, if provided.
+        :param state_path: Optional path used to save and restore the writer state
+        """
+        self.input_dir_path = os.path.join(base_dir_path, "input")
+        self.config_dir_path = os.path.join(base_dir_path, "config")
+        self.processed_dir_path = os.path.join(base_dir_path, "processed")
+        self.failed_dir_path = os.path.join(base_dir_path, "failed")
+        self.writer = writer
+        self.dedup_index = dedup_index
+        self.settle_seconds = settle_seconds
+        self.ready_marker = ready_marker
+        self.state_path = state_path
+        self.processed_count = 0
+        self.failed_count = 0
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+
+        validate_paths([self.input_dir_path, self.config_dir_path], raise_exception=True)
+        os.makedirs(self.processed_dir_path, exist_ok=True)
+        os.makedirs(self.failed_dir_path, exist_ok=True)
+
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.writer.restore(json.load(f))
+
+    def _save_state(self):
+        """Flushes the writer output, and saves the writer state"""
+        writer_state = self.writer.checkpoint()
+        if not self.state_path:
+            return
+
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(writer_state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _is_candidate(self, file_name: str) -> bool:
+        if file_name.startswith(".") or file_name.endswith(PARTIAL_FILE_SUFFIXES):
+            return False
+        return not (self.ready_marker and file_name.endswith(self.ready_marker))
+
+    def _find_completed_files(self) -> List[str]:
+        """
+        Returns the input files which are complete.
+
+        :return: sorted list of file paths
+        """
+        now = time.monotonic()
+        completed_files = []
+        file_names = set(os.listdir(self.input_dir_path))
+
+        for file_name in sorted(f for f in file_names if self._is_candidate(f)):
+            file_path = os.path.join(self.input_dir_path, file_name)
+            if not os.path.isfile(file_path):
+                continue
+
+            if self.ready_marker:
+                if file_name + self.ready_marker in file_names:
+                    completed_files.append(file_path)
+                continue
+
+            stat = os.stat(file_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            pending = self._pending.get(file_path)
+            if pending is None or pending[:2] != signature:
+                self._pending[file_path] = signature + (now,)
+            elif now - pending[2] >= self.settle_seconds:
+                completed_files.append(file_path)
+
+        # files which were removed are no longer tracked
+        self._pending = {k: v for k, v in self._pending.items() if os.path.basename(k) in file_names}
+        return completed_files
+
+    def _move(self, file_path: str, target_dir_path: str):
+        self._pending.pop(file_path, None)
+        shutil.move(file_path, os.path.join(target_dir_path, os.path.basename(file_path)))
+        if self.ready_marker and os.path.exists(file_path + self.ready_marker):
+            os.remove(file_path + self.ready_marker)
+
+    def poll(self) -> List[str]:
+        """
+        Converts the input files which are complete.
+
+        :return: list of the converted file paths
+        """
+        completed_files = self._find_completed_files()
+        if not completed_files:
+            return []
+
+        converted_files = []
+        contract_files = _filter_input_files(completed_files, self.config_dir_path)
+        for file_path in completed_files:
+            if file_path not in contract_files:
+                print(f"File {file_path} did not match a DataContract FileDefinition")
+                self.failed_count += 1
+                self._move(file_path, self.failed_dir_path)
+                continue
+
+            print(f"Processing file = {file_path}")
+            try:
+                is_converted = _convert_source_file(self.writer, file_path, self.config_dir_path, self.dedup_index)
+                # output is flushed, so that the file's resources are available once it is processed
+                self._save_state()
+            except Exception as ex:
+                logger.error(f"Convert failed with {ex.__class__.__name__} for file_path={file_path}")
+                is_converted = False
+
+            if is_converted:
+                self.processed_count += 1
+                converted_files.append(file_path)
+                self._move(file_path, self.processed_dir_path)
+            else:
+                self.failed_count += 1
+                self._move(file_path, self.failed_dir_path)
+
+        return converted_files
+
+    def run(self, poll_interval: float = DEFAULT_POLL_INTERVAL, stop_event: Optional[threading.Event] = None):
+        """
+        Imports the data contract's resource converters, and polls the input directory until the stop event is set.
+
+        :param poll_interval: The number of seconds between polls
+        :param stop_event: Optional event used to stop watching. Defaults to None, watching until interrupted.
+        """
+        # the contract's converters are imported once, rather than when the first file is converted
+        load_resource_converters(load_data_contract(os.path.join(self.config_dir_path, "data-contract.json")))
+
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.poll()
+            stop_event.wait(poll_interval)
+
+
+def watch_directory(args):
+    """
+    Watches a standard directory layout, converting source files to FHIR resources as they are delivered.
+
+    The "-d" flag specifies the base directory. Source files are read from <directory>/input and configuration
+    from <directory>/config. Converted files are moved to <directory>/processed, and files which fail to convert are
+    moved to <directory>/failed.
+
+    Files are converted once they are complete. The "--ready-marker" flag specifies a marker suffix, such as ".done",
+    which producers create once a file is complete. Otherwise, a file is complete once it is unchanged for
+    "--settle-seconds". The input directory is polled every "--poll-interval" seconds.
+
+    Output is written with the same options as the convert command. Output files are flushed after each source
+    file is converted, and the writer state is saved to .csvtofhir-watch-state.json in the base directory.
+
+    :param args: Parsed command line arguments
+    :raise: FileNotFoundError if the base directory layout does not exist
+    """
+    base_dir_path = os.path.expandvars(args.d)
+    output_dir_path = os.path.expandvars(args.o) if args.o else None
+    config_dir_path = os.path.join(base_dir_path, "config")
+
+    contract = load_data_contract(os.path.join(config_dir_path, "data-contract.json"))
+    if contract.general.streamType != DataStreamType.LIVE:
+        print(f"The DataContract streamType is not {DataStreamType.LIVE.value}, watching for files")
+
+    set_mapping_config_directory(config_dir_path)
+    dedup_index = create_dedup_index(get_converter_config(), getattr(args, "dedup", None))
+
+    with create_output_writer(args, output_dir_path) as writer:
+        watcher = DirectoryWatcher(base_dir_path,
+                                   writer,
+                                   dedup_index,
+                                   args.settle_seconds,
+                                   args.ready_marker,
+                                   os.path.join(base_dir_path, DEFAULT_STATE_FILE_NAME))
+        print(f"Watching {watcher.input_dir_path}, press Ctrl+C to stop")
+        try:
+            watcher.run(args.poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+    print(f"Watch complete: processed={watcher.processed_count} failed={watcher.failed_count}")
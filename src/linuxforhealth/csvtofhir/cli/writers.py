@@ -0,0 +1,855 @@
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fhir.resources.bundle import Bundle
+
+from linuxforhealth.csvtofhir.bundle import (DEFAULT_BUNDLE_MAX_ENTRIES, DEFAULT_MAX_OPEN_BUNDLES, BundleBuilder,
+                                             serialize_bundle)
+from linuxforhealth.csvtofhir.external_sort import DEFAULT_SORT_BUFFER_RECORDS, ExternalGroupSort
+from linuxforhealth.csvtofhir.loader import FhirLoader, FhirLoaderException
+from linuxforhealth.csvtofhir.serialization import ConvertedResource, OutputFormat
+from linuxforhealth.csvtofhir.support import COMPRESSION_EXTENSIONS, ThreadedWriter, get_logger, open_file
+
+logger = get_logger(__name__)
+
+# buffer size used for batched output files
+DEFAULT_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# maximum number of pending result batches per writer thread
+DEFAULT_WRITER_QUEUE_SIZE = 64
+
+
+class OutputFileFormat(str, Enum):
+    """
+    Identifies the CLI output file format.
+
+    - json: each resource is written to its own file within a group key directory
+    - ndjson: resources are written to FHIR Bulk Data style newline delimited JSON files
+    - bundle: resources are written to PUT transaction Bundles, grouped by group key
+    """
+    JSON = "json"
+    NDJSON = "ndjson"
+    BUNDLE = "bundle"
+
+
+class NdjsonPartition(str, Enum):
+    """
+    Identifies how NDJSON output files are partitioned.
+
+    - resource-type: a file per resource type
+    - source-file: a file per resource type and source file
+    - group-key: a file per group key, containing all resource types
+    """
+    RESOURCE_TYPE = "resource-type"
+    SOURCE_FILE = "source-file"
+    GROUP_KEY = "group-key"
+
+
+class ResourceWriter(ABC):
+    """
+    Base class for CLI resource writers.
+    Writers receive converted resources, in the writer's input_format, for a group key.
+
+    Writers which support concurrent writes for different group keys set group_key_thread_safe to True.
+
+    Writers which support checkpoints flush buffered output in checkpoint, returning the state used to continue
+    writing, with restore, when a conversion is resumed. Output written after a checkpoint is written again, to the
+    same files, when a conversion is resumed.
+    """
+
+    group_key_thread_safe = False
+    input_format = OutputFormat.BYTES
+    supports_checkpoint = True
+
+    def __init__(self, output_dir: str, compression: Optional[str] = None, compression_level: Optional[int] = None):
+        """
+        :param output_dir: The output directory
+        :param compression: Optional compression format, gzip, bz2, or xz
+        :param compression_level: Optional compression level
+        """
+        self.output_dir = output_dir
+        self.compression = None if compression == "none" else compression
+        self.compression_level = compression_level
+        self.file_extension = COMPRESSION_EXTENSIONS[self.compression] if self.compression else ""
+        self.resource_count = 0
+
+    def _open_file(self, file_path: str):
+        """
+        Opens a binary output file, using streaming compression if configured
+
+        :param file_path: The file path
+        :return: file object
+        """
+        return open_file(file_path, "wb", compression=self.compression, compresslevel=self.compression_level)
+
+    @abstractmethod
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        """
+        Writes converted resources
+
+        :param group_key: The group key for the resources
+        :param resources: The converted resources
+        """
+        pass
+
+    def checkpoint(self) -> Dict:
+        """
+        Flushes buffered output, and returns the writer state.
+
+        :return: the writer state, which supports JSON serialization
+        """
+        return {}
+
+    def restore(self, state: Dict):
+        """
+        Restores the writer state returned by checkpoint.
+
+        :param state: The writer state
+        """
+        pass
+
+    def remove_source_file_output(self, source_file_ids: List[str]) -> int:
+        """
+        Removes the output files written for source files by a previous conversion, before the source files are
+        converted again. Writers which do not write output files for each source file do not remove any files.
+
+        :param source_file_ids: The safe source file ids, see get_safe_file_id
+        :return: the number of output files removed
+        """
+        return 0
+
+    def close(self):
+        """Flushes and closes open output files"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FileResourceWriter(ResourceWriter):
+    """
+    Writes each FHIR resource to its own file, within a "group key" directory.
+    Files are named [group key]-[resource type]-[source file id]-[auto-increment-number].json, with the compression
+    extension appended if the output is compressed.
+
+    Group key directories are created once, when a group key is first written, rather than checked per write.
+    Counters are updated under a lock, so that group keys may be written concurrently.
+
+    Checkpoints contain the counters for the source files written since the previous checkpoint, since only the
+    current source file's resources are written again when a conversion is resumed. The counters for other source
+    files are restored from the output files, when a group key is first written after a restore.
+    """
+
+    group_key_thread_safe = True
+
+    def __init__(self, output_dir: str, compression: Optional[str] = None, compression_level: Optional[int] = None):
+        super().__init__(output_dir, compression, compression_level)
+        # provides a counter for each group key resource
+        self.group_key_resource_counter: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        # group keys by source file id, and the source file ids included in checkpoints
+        self._source_file_group_keys: Dict[str, Set[str]] = defaultdict(set)
+        self._written_source_file_ids: Set[str] = set()
+        self._checkpoint_source_file_ids: Set[str] = set()
+        # group keys with restored counters, which are completed from the output files when written
+        self._is_restored = False
+        self._unscanned_group_keys: Set[str] = set()
+
+    def _count_output_files(self, group_key: str, group_key_dir: str) -> Dict[str, int]:
+        """
+        Returns the resource counters for a group key from its output files.
+
+        :param group_key: The group key
+        :param group_key_dir: The group key directory
+        :return: the highest file number for each resource type and source file id combination
+        """
+        resource_counter = defaultdict(int)
+        if not os.path.isdir(group_key_dir):
+            return resource_counter
+
+        file_pattern = re.compile(re.escape(f"{group_key}-") + r"(.+)-(\d+)\.json" + re.escape(self.file_extension))
+        for file_name in os.listdir(group_key_dir):
+            match = file_pattern.fullmatch(file_name)
+            if match:
+                resource_counter[match.group(1)] = max(resource_counter[match.group(1)], int(match.group(2)))
+        return resource_counter
+
+    def _get_resource_counter(self, group_key: str, group_key_dir: str) -> Dict[str, int]:
+        resource_counter = self.group_key_resource_counter.get(group_key)
+        if resource_counter is None:
+            resource_counter = defaultdict(int)
+            if self._is_restored:
+                resource_counter = self._count_output_files(group_key, group_key_dir)
+            self.group_key_resource_counter[group_key] = resource_counter
+            os.makedirs(group_key_dir, exist_ok=True)
+        elif group_key in self._unscanned_group_keys:
+            # restored counters take precedence, since output files may have been written after the checkpoint
+            resource_counter.update({k: v for k, v in self._count_output_files(group_key, group_key_dir).items()
+                                     if k not in resource_counter})
+            self._unscanned_group_keys.discard(group_key)
+        return resource_counter
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        group_key_dir = f"{self.output_dir}/{group_key}"
+        with self._lock:
+            resource_counter = self._get_resource_counter(group_key, group_key_dir)
+
+        for r in resources:
+            source_file_id = get_safe_file_id(r.meta)
+            # Use a combination of resource_type with origination file name (source file id) to count up
+            combo_resource_type_and_source_file_id = r.resource_type + "-" + source_file_id
+            with self._lock:
+                resource_count = resource_counter[combo_resource_type_and_source_file_id] + 1
+                resource_counter[combo_resource_type_and_source_file_id] = resource_count
+                self._source_file_group_keys[source_file_id].add(group_key)
+                self._written_source_file_ids.add(source_file_id)
+                self.resource_count += 1
+            resource_count_display = str(resource_count).zfill(5)
+
+            fixture_file_name = f"{group_key}-{r.resource_type}-{source_file_id}-{resource_count_display}.json"
+            fixture_path = os.path.join(group_key_dir, fixture_file_name + self.file_extension)
+
+            with self._open_file(fixture_path) as w:
+                w.write(r.resource)
+
+    def checkpoint(self) -> Dict:
+        with self._lock:
+            if self._written_source_file_ids:
+                self._checkpoint_source_file_ids = self._written_source_file_ids
+                self._written_source_file_ids = set()
+
+            group_key_resource_counter: Dict[str, Dict[str, int]] = defaultdict(dict)
+            for source_file_id in self._checkpoint_source_file_ids:
+                for group_key in self._source_file_group_keys[source_file_id]:
+                    for combo, resource_count in self.group_key_resource_counter[group_key].items():
+                        # resource types do not contain "-", so the source file id follows the first "-"
+                        if combo.partition("-")[2] == source_file_id:
+                            group_key_resource_counter[group_key][combo] = resource_count
+            return {"groupKeyResourceCounter": dict(group_key_resource_counter)}
+
+    def remove_source_file_output(self, source_file_ids: List[str]) -> int:
+        if not source_file_ids or not os.path.isdir(self.output_dir):
+            return 0
+
+        source_file_id_pattern = "|".join(re.escape(i) for i in source_file_ids)
+        removed_count = 0
+        with self._lock:
+            for group_key in os.listdir(self.output_dir):
+                group_key_dir = os.path.join(self.output_dir, group_key)
+                if not os.path.isdir(group_key_dir):
+                    continue
+
+                file_pattern = re.compile(re.escape(f"{group_key}-") +
+                                          rf"[A-Za-z]+-({source_file_id_pattern})-\d+\.json" +
+                                          re.escape(self.file_extension))
+                for file_name in os.listdir(group_key_dir):
+                    if file_pattern.fullmatch(file_name):
+                        os.remove(os.path.join(group_key_dir, file_name))
+                        removed_count += 1
+
+            # counters for the removed files start again from the first file
+            for source_file_id in source_file_ids:
+                for group_key in self._source_file_group_keys.pop(source_file_id, set()):
+                    resource_counter = self.group_key_resource_counter.get(group_key, {})
+                    for combo in [c for c in resource_counter if c.partition("-")[2] == source_file_id]:
+                        del resource_counter[combo]
+        return removed_count
+
+    def restore(self, state: Dict):
+        self.group_key_resource_counter = {k: defaultdict(int, v)
+                                           for k, v in state.get("groupKeyResourceCounter", {}).items()}
+        self._source_file_group_keys = defaultdict(set)
+        for group_key, resource_counter in self.group_key_resource_counter.items():
+            for combo in resource_counter:
+                self._source_file_group_keys[combo.partition("-")[2]].add(group_key)
+        self._checkpoint_source_file_ids = set(self._source_file_group_keys)
+        self._written_source_file_ids = set()
+        self._is_restored = True
+        self._unscanned_group_keys = set(self.group_key_resource_counter)
+
+
+class _NdjsonFile:
+    """
+    An open NDJSON output file. Records are buffered and written in batches.
+
+    A file may be suspended, which writes buffered records and closes the file object, completing the compressed
+    stream if the file is compressed. The file is reopened for append when records are next written, so that a
+    compressed file continues with a new stream.
+    """
+
+    def __init__(self,
+                 file_path: str,
+                 open_file: Callable[[str, str], Any],
+                 buffer_size: int,
+                 record_count: int = 0,
+                 byte_count: int = 0):
+        """
+        :param file_path: The file path
+        :param open_file: Opens a binary file object for a file path and mode
+        :param buffer_size: The write buffer size in bytes
+        :param record_count: The number of records within an existing file
+        :param byte_count: The uncompressed size of the records within an existing file
+        """
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.record_count = record_count
+        self.byte_count = byte_count
+        self._open_file = open_file
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        # existing files are appended to, when records are written
+        self.file_obj = open_file(file_path, "wb") if record_count == 0 else None
+
+    def write(self, record: bytes):
+        self._pending.append(record)
+        self._pending.append(b"\n")
+        self._pending_size += len(record) + 1
+        self.record_count += 1
+        self.byte_count += len(record) + 1
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            if self.file_obj is None:
+                self.file_obj = self._open_file(self.file_path, "ab")
+            self.file_obj.write(b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def suspend(self) -> Dict:
+        """
+        Writes buffered records, and closes the file object until records are next written.
+
+        :return: the file state, containing the record count, uncompressed byte count, and file size
+        """
+        self.flush()
+        if self.file_obj is not None:
+            self.file_obj.close()
+            self.file_obj = None
+        return {"records": self.record_count, "bytes": self.byte_count, "offset": os.path.getsize(self.file_path)}
+
+    def close(self):
+        self.flush()
+        if self.file_obj is not None:
+            self.file_obj.close()
+            self.file_obj = None
+
+
+class NdjsonResourceWriter(ResourceWriter):
+    """
+    Writes FHIR resources to FHIR Bulk Data style NDJSON files, one resource per line.
+
+    Files are partitioned by resource type, by resource type and source file, or by group key, and are named
+    [resource type]-[part number].ndjson, [resource type]-[source file id]-[part number].ndjson, or
+    [group key]-[part number].ndjson. When partitioned by group key, files for other group keys are closed when a
+    new group key is written, so input should be grouped by group key.
+    A new part is started when the current part reaches max_records or max_bytes. max_bytes applies to the
+    uncompressed size.
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 partition: NdjsonPartition = NdjsonPartition.RESOURCE_TYPE,
+                 max_records: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 buffer_size: int = DEFAULT_WRITE_BUFFER_SIZE,
+                 compression: Optional[str] = None,
+                 compression_level: Optional[int] = None,
+                 compression_thread: bool = False):
+        """
+        :param output_dir: The output directory
+        :param partition: Partitions files by resource type, or resource type and source file
+        :param max_records: The maximum number of records per file. Defaults to None (unlimited).
+        :param max_bytes: The maximum number of bytes per file. Defaults to None (unlimited).
+        :param buffer_size: The write buffer size in bytes
+        :param compression: Optional compression format, gzip, bz2, or xz
+        :param compression_level: Optional compression level
+        :param compression_thread: Writes, and compresses, each file on a background thread if True
+        """
+        super().__init__(output_dir, compression, compression_level)
+        self.partition = NdjsonPartition(partition)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.compression_thread = compression_thread
+        self._files: Dict[str, _NdjsonFile] = {}
+        self._parts: Dict[str, int] = defaultdict(int)
+
+    def _get_partition_key(self, group_key: str, resource: ConvertedResource) -> str:
+        if self.partition == NdjsonPartition.GROUP_KEY:
+            return str(group_key)
+        if self.partition == NdjsonPartition.SOURCE_FILE:
+            return f"{resource.resource_type}-{get_safe_file_id(resource.meta)}"
+        return resource.resource_type
+
+    def _is_full(self, ndjson_file: _NdjsonFile) -> bool:
+        return ((self.max_records is not None and ndjson_file.record_count >= self.max_records) or
+                (self.max_bytes is not None and ndjson_file.byte_count >= self.max_bytes))
+
+    def _get_part_path(self, partition_key: str) -> str:
+        part_display = str(self._parts[partition_key]).zfill(5)
+        return os.path.join(self.output_dir, f"{partition_key}-{part_display}.ndjson{self.file_extension}")
+
+    def _open_part_file(self, file_path: str, mode: str):
+        file_obj = open_file(file_path, mode, compression=self.compression, compresslevel=self.compression_level)
+        if self.compression_thread:
+            file_obj = ThreadedWriter(file_obj)
+        return file_obj
+
+    def _open(self, partition_key: str) -> _NdjsonFile:
+        self._parts[partition_key] += 1
+        return _NdjsonFile(self._get_part_path(partition_key), self._open_part_file, self.buffer_size)
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        if self.partition == NdjsonPartition.GROUP_KEY and resources and str(group_key) not in self._files:
+            self.close()
+
+        for r in resources:
+            partition_key = self._get_partition_key(group_key, r)
+            ndjson_file = self._files.get(partition_key)
+
+            if ndjson_file is not None and self._is_full(ndjson_file):
+                ndjson_file.close()
+                ndjson_file = None
+
+            if ndjson_file is None:
+                ndjson_file = self._open(partition_key)
+                self._files[partition_key] = ndjson_file
+
+            ndjson_file.write(r.resource)
+            self.resource_count += 1
+
+    def checkpoint(self) -> Dict:
+        # open parts are suspended, and continue with later resources
+        open_parts = {k: f.suspend() for k, f in self._files.items()}
+        return {"parts": dict(self._parts), "openParts": open_parts}
+
+    def restore(self, state: Dict):
+        self._parts = defaultdict(int, state.get("parts", {}))
+        self._files.clear()
+        for partition_key, part_state in state.get("openParts", {}).items():
+            file_path = self._get_part_path(partition_key)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) < part_state["offset"]:
+                # the part does not match the checkpoint, and later resources are written to the next part
+                logger.warning(f"NDJSON part {file_path} does not match the checkpoint, continuing with a new part")
+                continue
+
+            # resources written after the checkpoint are removed, and are written again
+            with open(file_path, "r+b") as f:
+                f.truncate(part_state["offset"])
+            self._files[partition_key] = _NdjsonFile(file_path,
+                                                     self._open_part_file,
+                                                     self.buffer_size,
+                                                     part_state["records"],
+                                                     part_state["bytes"])
+
+    def remove_source_file_output(self, source_file_ids: List[str]) -> int:
+        # only files partitioned by source file contain the resources of a single source file
+        if self.partition != NdjsonPartition.SOURCE_FILE or not source_file_ids or not os.path.isdir(self.output_dir):
+            return 0
+
+        file_pattern = re.compile(r"([A-Za-z]+-(" + "|".join(re.escape(i) for i in source_file_ids) + r"))" +
+                                  r"-\d+\.ndjson" + re.escape(self.file_extension))
+        removed_count = 0
+        for file_name in os.listdir(self.output_dir):
+            match = file_pattern.fullmatch(file_name)
+            if match:
+                ndjson_file = self._files.pop(match.group(1), None)
+                if ndjson_file is not None:
+                    ndjson_file.close()
+                self._parts.pop(match.group(1), None)
+                os.remove(os.path.join(self.output_dir, file_name))
+                removed_count += 1
+        return removed_count
+
+    def close(self):
+        for ndjson_file in self._files.values():
+            ndjson_file.close()
+        self._files.clear()
+
+
+class BundleResourceWriter(ResourceWriter):
+    """
+    Writes converted resources to PUT transaction Bundles, grouped by group key, within a "group key" directory.
+    Files are named [group key]-Bundle-[auto-increment-number].json, with the compression extension appended if the
+    output is compressed.
+
+    Bundles are written as they are completed, when they reach max_entries or when the open bundle limit is reached.
+    """
+
+    input_format = OutputFormat.MODEL
+
+    def __init__(self,
+                 output_dir: str,
+                 max_entries: int = DEFAULT_BUNDLE_MAX_ENTRIES,
+                 max_open_bundles: int = DEFAULT_MAX_OPEN_BUNDLES,
+                 compression: Optional[str] = None,
+                 compression_level: Optional[int] = None):
+        """
+        :param output_dir: The output directory
+        :param max_entries: The maximum number of entries per bundle
+        :param max_open_bundles: The maximum number of group keys with an open bundle
+        :param compression: Optional compression format, gzip, bz2, or xz
+        :param compression_level: Optional compression level
+        """
+        super().__init__(output_dir, compression, compression_level)
+        self.builder = BundleBuilder(max_entries, max_open_bundles)
+        self.group_key_bundle_counter: Dict[str, int] = {}
+
+    def _write_bundles(self, bundles: List[Tuple[str, Bundle]]):
+        for group_key, bundle in bundles:
+            group_key_dir = f"{self.output_dir}/{group_key}"
+            if group_key not in self.group_key_bundle_counter:
+                os.makedirs(group_key_dir, exist_ok=True)
+                self.group_key_bundle_counter[group_key] = 0
+
+            self.group_key_bundle_counter[group_key] += 1
+            bundle_count_display = str(self.group_key_bundle_counter[group_key]).zfill(5)
+            bundle_path = os.path.join(group_key_dir,
+                                       f"{group_key}-Bundle-{bundle_count_display}.json{self.file_extension}")
+
+            with self._open_file(bundle_path) as w:
+                w.write(serialize_bundle(bundle))
+            self.resource_count += len(bundle.entry)
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        self._write_bundles(self.builder.add(group_key, resources))
+
+    def checkpoint(self) -> Dict:
+        self._write_bundles(self.builder.flush())
+        return {"groupKeyBundleCounter": self.group_key_bundle_counter}
+
+    def restore(self, state: Dict):
+        self.group_key_bundle_counter = dict(state.get("groupKeyBundleCounter", {}))
+
+    def close(self):
+        self._write_bundles(self.builder.flush())
+
+
+class HttpBundleWriter(ResourceWriter):
+    """
+    Posts converted resources to a FHIR server as PUT transaction Bundles, grouped by group key.
+    Bundles are posted as they are completed using a FhirLoader.
+
+    A checkpoint waits for pending posts, and fails if any post has failed, so that a checkpoint does not record
+    progress past Bundles which were not delivered.
+    """
+
+    input_format = OutputFormat.MODEL
+
+    def __init__(self,
+                 loader: FhirLoader,
+                 max_entries: int = DEFAULT_BUNDLE_MAX_ENTRIES,
+                 max_open_bundles: int = DEFAULT_MAX_OPEN_BUNDLES):
+        """
+        :param loader: The FhirLoader used to post bundles
+        :param max_entries: The maximum number of entries per bundle
+        :param max_open_bundles: The maximum number of group keys with an open bundle
+        """
+        super().__init__(None)
+        self.loader = loader
+        self.builder = BundleBuilder(max_entries, max_open_bundles)
+
+    def _post_bundles(self, bundles: List[Tuple[str, Bundle]]):
+        for _, bundle in bundles:
+            self.loader.submit(serialize_bundle(bundle), len(bundle.entry))
+            self.resource_count += len(bundle.entry)
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        self._post_bundles(self.builder.add(group_key, resources))
+
+    def checkpoint(self) -> Dict:
+        """
+        Posts open bundles and waits for pending posts.
+
+        :return: the writer state, which is empty
+        :raise: FhirLoaderException if a post has failed
+        """
+        self._post_bundles(self.builder.flush())
+        self.loader.wait()
+        if self.loader.stats.failures:
+            raise FhirLoaderException(f"{self.loader.stats.failures} request(s) to {self.loader.base_url} failed")
+        return {}
+
+    def close(self):
+        try:
+            self._post_bundles(self.builder.flush())
+        finally:
+            self.loader.close()
+
+
+class GroupedResourceWriter(ResourceWriter):
+    """
+    Groups converted resources by group key across source files before they are written.
+
+    Resources are added to an on-disk external sort as they are converted, so memory use is bounded by the sort
+    buffer. When the writer is closed, the resources for each group key are written with a single write, in group
+    key order. Checkpoints are not supported, since no output is written until the writer is closed.
+    """
+
+    supports_checkpoint = False
+
+    def __init__(self,
+                 writer: ResourceWriter,
+                 sort_buffer_records: int = DEFAULT_SORT_BUFFER_RECORDS,
+                 sort_temp_dir: Optional[str] = None):
+        """
+        :param writer: The resource writer used to write grouped resources
+        :param sort_buffer_records: The maximum number of resources held in memory by the external sort
+        :param sort_temp_dir: The directory used for external sort files. Defaults to the system temp directory.
+        """
+        super().__init__(writer.output_dir)
+        self.writer = writer
+        self.input_format = writer.input_format
+        self.sorter = ExternalGroupSort(sort_buffer_records, sort_temp_dir)
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        for r in resources:
+            self.sorter.add(group_key, r)
+
+    def close(self):
+        try:
+            with self.writer:
+                for group_key, resources in self.sorter.groups():
+                    self.writer.write(group_key, resources)
+        finally:
+            self.sorter.close()
+        self.resource_count = self.writer.resource_count
+
+
+class WriterQueueStats:
+    """
+    Queue metrics for a QueuedResourceWriter.
+
+    A queue which is usually full, with producer wait time, indicates that output I/O is the bottleneck. A queue
+    which is usually empty, with consumer wait time, indicates that conversion is the bottleneck.
+    """
+
+    def __init__(self, max_queue_size: int):
+        self.max_queue_size = max_queue_size
+        self.batch_count = 0
+        self.total_queue_depth = 0
+        self.max_queue_depth = 0
+        self.producer_wait_seconds = 0.0
+        self.consumer_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_put(self, queue_depth: int, wait_seconds: float):
+        self.batch_count += 1
+        self.total_queue_depth += queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.producer_wait_seconds += wait_seconds
+
+    def record_get(self, wait_seconds: float):
+        with self._lock:
+            self.consumer_wait_seconds += wait_seconds
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return self.total_queue_depth / self.batch_count if self.batch_count else 0.0
+
+    def __str__(self) -> str:
+        return (f"batches={self.batch_count} "
+                f"mean queue depth={self.mean_queue_depth:.1f}/{self.max_queue_size} "
+                f"max queue depth={self.max_queue_depth} "
+                f"producer wait={self.producer_wait_seconds:.3f}s "
+                f"writer wait={self.consumer_wait_seconds:.3f}s")
+
+
+class QueuedResourceWriter(ResourceWriter):
+    """
+    Writes converted resources on background writer threads, decoupling conversion from output I/O.
+
+    Result batches are placed on a bounded queue per writer thread. Batches are routed to threads by group key, so
+    the writes for a group key are applied in order. Writers which are not group_key_thread_safe use a single
+    writer thread. Errors raised by a writer thread are raised from the next write or close.
+    """
+
+    def __init__(self,
+                 writer: ResourceWriter,
+                 writer_threads: int = 1,
+                 max_queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        """
+        :param writer: The resource writer used by the writer threads
+        :param writer_threads: The number of writer threads
+        :param max_queue_size: The maximum number of pending result batches per writer thread
+        """
+        super().__init__(writer.output_dir)
+        self.writer = writer
+        self.input_format = writer.input_format
+        self.supports_checkpoint = writer.supports_checkpoint
+        if writer_threads > 1 and not writer.group_key_thread_safe:
+            logger.info(f"{type(writer).__name__} does not support concurrent writes, using one writer thread")
+            writer_threads = 1
+
+        self.stats = WriterQueueStats(max_queue_size * writer_threads)
+        self._error: Optional[BaseException] = None
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=max_queue_size) for _ in range(writer_threads)]
+        self._threads: List[threading.Thread] = [threading.Thread(target=self._drain, args=(q,), daemon=True)
+                                                 for q in self._queues]
+        for t in self._threads:
+            t.start()
+
+    def _drain(self, batch_queue: queue.Queue):
+        while True:
+            start = time.perf_counter()
+            batch: Optional[Tuple[str, List[ConvertedResource]]] = batch_queue.get()
+            self.stats.record_get(time.perf_counter() - start)
+            if batch is None:
+                batch_queue.task_done()
+                break
+            if self._error is None:
+                try:
+                    self.writer.write(*batch)
+                except BaseException as ex:
+                    self._error = ex
+            batch_queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    @property
+    def resource_count(self) -> int:
+        return self.writer.resource_count
+
+    @resource_count.setter
+    def resource_count(self, value: int):
+        # the wrapped writer maintains the resource count
+        pass
+
+    def write(self, group_key: str, resources: List[ConvertedResource]):
+        self._raise_error()
+        batch_queue = self._queues[zlib.crc32(str(group_key).encode()) % len(self._queues)]
+
+        start = time.perf_counter()
+        batch_queue.put((group_key, resources))
+        self.stats.record_put(sum(q.qsize() for q in self._queues), time.perf_counter() - start)
+
+    def checkpoint(self) -> Dict:
+        # pending batches are written before the wrapped writer is checkpointed
+        for q in self._queues:
+            q.join()
+        self._raise_error()
+        return self.writer.checkpoint()
+
+    def restore(self, state: Dict):
+        self.writer.restore(state)
+
+    def remove_source_file_output(self, source_file_ids: List[str]) -> int:
+        # pending batches are written before output files are removed
+        for q in self._queues:
+            q.join()
+        self._raise_error()
+        return self.writer.remove_source_file_output(source_file_ids)
+
+    def close(self):
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+        try:
+            self.writer.close()
+        finally:
+            logger.info(f"Writer queue stats: {self.stats}")
+        self._raise_error()
+
+
+def create_writer(output_dir: str,
+                  output_format: OutputFileFormat = OutputFileFormat.JSON,
+                  ndjson_partition: NdjsonPartition = NdjsonPartition.RESOURCE_TYPE,
+                  max_records: Optional[int] = None,
+                  max_bytes: Optional[int] = None,
+                  compression: Optional[str] = None,
+                  compression_level: Optional[int] = None,
+                  compression_thread: bool = False,
+                  writer_threads: int = 0,
+                  writer_queue_size: int = DEFAULT_WRITER_QUEUE_SIZE,
+                  bundle_max_entries: int = DEFAULT_BUNDLE_MAX_ENTRIES,
+                  group_across_files: bool = False,
+                  sort_buffer_records: int = DEFAULT_SORT_BUFFER_RECORDS,
+                  sort_temp_dir: Optional[str] = None) -> ResourceWriter:
+    """
+    Creates a resource writer for the CLI output format.
+
+    :param output_dir: The output directory
+    :param output_format: The output file format
+    :param ndjson_partition: Partitions NDJSON files by resource type, or resource type and source file
+    :param max_records: The maximum number of records per NDJSON file
+    :param max_bytes: The maximum number of bytes per NDJSON file
+    :param compression: Optional compression format, gzip, bz2, or xz
+    :param compression_level: Optional compression level
+    :param compression_thread: Compresses batched output files on a background thread if True
+    :param writer_threads: The number of background writer threads. 0 writes on the calling thread.
+    :param writer_queue_size: The maximum number of pending result batches per writer thread
+    :param bundle_max_entries: The maximum number of entries per transaction Bundle
+    :param group_across_files: Groups resources by group key across source files if True
+    :param sort_buffer_records: The maximum number of resources held in memory when grouping across files
+    :param sort_temp_dir: The directory used for external sort files when grouping across files
+    :return: ResourceWriter
+    """
+    output_format = OutputFileFormat(output_format)
+    if output_format == OutputFileFormat.BUNDLE:
+        # grouped input completes each group key's bundle when the next group key is written
+        writer = BundleResourceWriter(output_dir,
+                                      bundle_max_entries,
+                                      max_open_bundles=1 if group_across_files else DEFAULT_MAX_OPEN_BUNDLES,
+                                      compression=compression,
+                                      compression_level=compression_level)
+    elif output_format == OutputFileFormat.NDJSON:
+        writer = NdjsonResourceWriter(output_dir,
+                                      ndjson_partition,
+                                      max_records,
+                                      max_bytes,
+                                      compression=compression,
+                                      compression_level=compression_level,
+                                      compression_thread=compression_thread)
+    else:
+        writer = FileResourceWriter(output_dir, compression, compression_level)
+
+    if group_across_files:
+        writer = GroupedResourceWriter(writer, sort_buffer_records, sort_temp_dir)
+
+    if writer_threads > 0:
+        return QueuedResourceWriter(writer, writer_threads, writer_queue_size)
+    return writer
+
+
+def get_safe_file_id(meta: Dict) -> str:
+    """
+    Returns the source file id from a resource's meta, without the line number and file extension, and with
+    characters which are not safe for file names replaced.
+
+    :param meta: The resource meta
+    :return: the source file id, or an empty string if it is not found
+    """
+    inner_ext = meta.get("extension", [])
+    for ext in inner_ext:
+        if ext["url"] is not None and "source-file-id" in ext["url"]:
+            return get_safe_source_file_id(ext["valueString"])
+    return ""
+
+
+def get_safe_source_file_id(source_file_id: str) -> str:
+    """
+    Returns a source file id, or source file name, without the line number and file extension, and with characters
+    which are not safe for file names replaced.
+
+    :param source_file_id: The source file id, [file name]:[line number], or the source file name
+    :return: the safe source file id
+    """
+    value_sans_line_number = source_file_id.split(":")[0]
+    value_sans_line_number = value_sans_line_number.split(".csv")[0]
+    return re.sub(r"[^A-Za-z0-9\-]", "_", value_sans_line_number)
@@ -0,0 +1,258 @@
+import shutil
+import tempfile
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from linuxforhealth.csvtofhir.model.contract import FileType
+from linuxforhealth.csvtofhir.serialization import TransformFormat
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# read size used when a non-seekable source is copied to a temporary file
+SPOOL_BUFFER_SIZE = 1024 * 1024
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, which is an optional dependency.
+    pyarrow is imported when it is used, since it is costly to import.
+
+    :return: the pyarrow module
+    :raise: ImportError if pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError as ex:
+        raise ImportError("Arrow and Parquet input and output require pyarrow. "
+                          "Install with pip install linuxforhealth-csvtofhir[columnar]") from ex
+
+
+def derive_schema(data_frame: DataFrame) -> Any:
+    """
+    Derives an Arrow schema from a DataFrame.
+    List-valued columns are preserved as Arrow list columns. Columns which only contain null values are typed as
+    strings, so that the schema remains valid for later chunks which contain values.
+
+    :param data_frame: The DataFrame
+    :return: pyarrow.Schema
+    """
+    pa = _import_pyarrow()
+    schema = pa.Schema.from_pandas(data_frame, preserve_index=False)
+    for index, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(index, field.with_type(pa.string()))
+    return schema.remove_metadata()
+
+
+def dataframe_to_record_batch(data_frame: DataFrame, schema: Optional[Any] = None) -> Any:
+    """
+    Converts a DataFrame to an Arrow RecordBatch.
+
+    When a schema is provided, such as the schema of an earlier chunk, the DataFrame is converted with its own
+    inferred types and each column is cast to the schema's type. Value types inferred by pandas may differ between
+    chunks, for example a column which only contains null values in the first chunk is typed as a string.
+
+    :param data_frame: The DataFrame
+    :param schema: Optional pyarrow.Schema. Derived from the DataFrame if not provided.
+    :return: pyarrow.RecordBatch
+    :raise: pyarrow.ArrowInvalid if a column's values cannot be cast to the schema's type
+    """
+    pa = _import_pyarrow()
+    record_batch = pa.RecordBatch.from_pandas(data_frame, schema=derive_schema(data_frame), preserve_index=False)
+    if schema is None or record_batch.schema == schema:
+        return record_batch
+
+    arrays = [record_batch.column(field.name).cast(field.type) for field in schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ColumnarReader:
+    """
+    Reads Parquet or Arrow IPC (Feather) records as DataFrame chunks, in place of a pandas CSV reader.
+
+    Records are read as Arrow record batches, so that text parsing is not required. Parquet files are read one row
+    group at a time, in chunks of at most chunksize records, and row groups which are skipped are not read. Arrow IPC
+    files are read one record batch at a time, and are memory mapped when read from a path. Only the selected columns
+    are read. Non-seekable sources, such as request bodies, are copied to a temporary file before they are read, since
+    file footers are read first.
+
+    Chunks have the same index and value types as the CSV reader. Values are converted to strings if dtype is str,
+    and missing values, or values within na_values, are NaN.
+    """
+
+    def __init__(self,
+                 source: Any,
+                 file_type: FileType,
+                 chunksize: int,
+                 columns: Optional[List[str]] = None,
+                 dtype: Optional[type] = None,
+                 na_values: Optional[List[str]] = None,
+                 skiprows: int = 0):
+        """
+        :param source: The file path, or a binary file-like object
+        :param file_type: The file type, parquet or arrow
+        :param chunksize: The maximum number of records per chunk
+        :param columns: Optional list of the columns read. Defaults to all columns.
+        :param dtype: Optional value type. str converts all values to strings.
+        :param na_values: Optional values which are converted to NaN
+        :param skiprows: The number of records to skip, used to resume a conversion
+        :raise: ImportError if pyarrow is not installed
+        :raise: ValueError if the file type is not a columnar file type
+        """
+        if FileType(file_type) not in (FileType.PARQUET, FileType.ARROW):
+            raise ValueError(f"Unsupported columnar file type {file_type}")
+
+        self._pa = _import_pyarrow()
+        self.file_type = FileType(file_type)
+        self.chunksize = chunksize
+        self.columns = columns
+        self.dtype = dtype
+        self.na_values = na_values
+        self.skiprows = skiprows
+        self._source = source
+        self._opened_files: List[Any] = []
+
+    def _open_source(self) -> Any:
+        if isinstance(self._source, str):
+            if self.file_type == FileType.PARQUET:
+                return self._source
+            source = self._pa.memory_map(self._source, "r")
+            self._opened_files.append(source)
+            return source
+
+        # Parquet and IPC file footers are read first, which requires a seekable source
+        if hasattr(self._source, "seekable") and not self._source.seekable():
+            return self._spool_source()
+        return self._source
+
+    def _spool_source(self) -> Any:
+        """
+        Copies a non-seekable source to a temporary file, one block at a time, so that the source is not held in
+        memory. The temporary file is removed when the reader is closed.
+
+        :return: the temporary file, positioned at the start of the source
+        """
+        spool_file = tempfile.TemporaryFile(prefix="csvtofhir-columnar-")
+        self._opened_files.append(spool_file)
+        shutil.copyfileobj(self._source, spool_file, SPOOL_BUFFER_SIZE)
+        spool_file.seek(0)
+        return spool_file
+
+    def _read_parquet_batches(self, source: Any) -> Iterator[Any]:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        self._opened_files.append(parquet_file)
+
+        # row groups which only contain skipped records are not read
+        row_groups = []
+        remaining_skiprows = self.skiprows
+        for index in range(parquet_file.metadata.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(index).num_rows
+            if not row_groups and remaining_skiprows >= num_rows:
+                remaining_skiprows -= num_rows
+                continue
+            row_groups.append(index)
+
+        if row_groups:
+            batches = parquet_file.iter_batches(batch_size=self.chunksize, row_groups=row_groups, columns=self.columns)
+            yield from self._slice_batches(batches, remaining_skiprows)
+
+    def _read_ipc_batches(self, source: Any) -> Iterator[Any]:
+        try:
+            reader = self._pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except self._pa.ArrowInvalid:
+            # the IPC streaming format does not include a footer
+            source.seek(0)
+            batches = iter(self._pa.ipc.open_stream(source))
+
+        if self.columns:
+            batches = (self._pa.RecordBatch.from_arrays([b.column(c) for c in self.columns], names=self.columns)
+                       for b in batches)
+        yield from self._slice_batches(batches, self.skiprows)
+
+    def _slice_batches(self, batches: Iterator[Any], skiprows: int) -> Iterator[Any]:
+        for batch in batches:
+            if skiprows >= batch.num_rows:
+                skiprows -= batch.num_rows
+                continue
+            for offset in range(skiprows, batch.num_rows, self.chunksize):
+                yield batch.slice(offset, self.chunksize)
+            skiprows = 0
+
+    def _to_data_frame(self, batch: Any, start_index: int) -> DataFrame:
+        pa = self._pa
+        if self.dtype is str:
+            arrays = [c if pa.types.is_nested(c.type) else c.cast(pa.string()) for c in batch.columns]
+            batch = pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+        data_frame = batch.to_pandas()
+        if self.dtype is str:
+            data_frame = data_frame.where(data_frame.notna(), np.nan)
+        if self.na_values:
+            data_frame = data_frame.replace(self.na_values, np.nan)
+
+        # the index continues across chunks, as with the CSV reader
+        data_frame.index = range(start_index, start_index + len(data_frame))
+        return data_frame
+
+    def __iter__(self) -> Iterator[DataFrame]:
+        source = self._open_source()
+        if self.file_type == FileType.PARQUET:
+            batches = self._read_parquet_batches(source)
+        else:
+            batches = self._read_ipc_batches(source)
+
+        start_index = 0
+        for batch in batches:
+            yield self._to_data_frame(batch, start_index)
+            start_index += batch.num_rows
+
+    def close(self):
+        """Closes the files opened by the reader. File-like sources are not closed."""
+        for f in self._opened_files:
+            if hasattr(f, "close"):
+                f.close()
+        self._opened_files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def write_parquet(file_path: str, output_path: str, compression: str = "snappy") -> int:
+    """
+    Transforms a source file and writes the processed records to a Parquet file, one row group per processed chunk.
+
+    :param file_path: The path to the source file
+    :param output_path: The path to the Parquet file
+    :param compression: The Parquet compression codec
+    :return: the number of records written
+    :raise: ImportError if pyarrow is not installed
+    """
+    from linuxforhealth.csvtofhir.converter import transform
+
+    _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    writer = None
+    record_count = 0
+    try:
+        for _, _, record_batch in transform(file_path, TransformFormat.ARROW):
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, record_batch.schema, compression=compression)
+            writer.write_batch(record_batch)
+            record_count += record_batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    logger.info(f"Wrote {record_count} records to {output_path}")
+    return record_count
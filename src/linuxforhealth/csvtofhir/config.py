@@ -1,5 +1,7 @@
 
+import os
 from functools import cache
+from typing import List, Optional
 
 from pydantic import BaseSettings, Field
 
@@ -24,6 +26,73 @@ class ConverterConfig(BaseSettings):
         description="The csvtofhir mapping file name."
     )
 
+    json_serializer: str = Field(
+        default="auto",
+        description="The JSON serialization backend: auto, json, or orjson. auto uses orjson if it is installed."
+    )
+
+    dedup_scope: str = Field(
+        default="none",
+        description="Suppresses repeated referenced resources once per group key (group) or once per run (run)"
+    )
+
+    dedup_resource_types: List[str] = Field(
+        default=["Encounter", "Location", "Organization", "Patient", "Practitioner", "PractitionerRole"],
+        description="The referenced resource types eligible for dedup"
+    )
+
+    dedup_content_hash: bool = Field(
+        default=True,
+        description="Only suppresses referenced resources with identical content (excluding meta) when True. " +
+                    "Encounters are always compared by content, so that Encounter fragments are consolidated"
+    )
+
+    dedup_max_entries: int = Field(
+        default=100000,
+        description="The maximum number of resources tracked by the dedup index"
+    )
+
+    encounter_consolidation: str = Field(
+        default="none",
+        description="Consolidates Encounter fragments within a chunk (chunk) or across chunks of input sorted by " +
+                    "the group by key (sorted)"
+    )
+
+    encounter_consolidation_max_pending: int = Field(
+        default=10000,
+        description="The maximum number of results held for Encounter fragments which may be merged, for a group " +
+                    "by key, when encounter_consolidation is sorted"
+    )
+
+    change_capture_directory: Optional[str] = Field(
+        default=None,
+        description="The directory containing row fingerprint stores. When set, only new and changed rows are " +
+                    "converted to FHIR resources."
+    )
+
+    csv_memory_map: bool = Field(
+        default=False,
+        description="Memory maps local CSV source files, so that the CSV parser reads records directly from the " +
+                    "mapped file rather than through buffered reads"
+    )
+
+    prefetch_buffer_size: int = Field(
+        default=8 * 1024 * 1024,
+        description="The number of bytes read ahead from remote source files, such as s3 or http URIs, on a " +
+                    "background thread. 0 disables read-ahead."
+    )
+
+    archive_max_workers: int = Field(
+        default=4,
+        description="The maximum number of zip archive members converted in parallel, one worker per member"
+    )
+
+    checkpoint_interval: int = Field(
+        default=10,
+        description="The number of chunks processed between conversion checkpoints, when a checkpoint callback " +
+                    "is provided. 0 disables checkpoints."
+    )
+
     @property
     def configuration_path(self):
         """returns the full path to the converter configuration file"""
@@ -38,3 +107,14 @@ class ConverterConfig(BaseSettings):
 def get_converter_config() -> "ConverterConfig":
     """Returns the ConverterConfig"""
     return ConverterConfig()
+
+
+def set_mapping_config_directory(config_dir_path: str):
+    """
+    Sets the mapping configuration directory, and clears the cached ConverterConfig so that the directory is used by
+    the next conversion.
+
+    :param config_dir_path: The configuration directory path
+    """
+    os.environ["MAPPING_CONFIG_DIRECTORY"] = config_dir_path
+    get_converter_config.cache_clear()
@@ -0,0 +1,170 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from fhir.resources.encounter import Encounter
+
+from linuxforhealth.csvtofhir.serialization import ConvertedResource, OutputFormat, format_resource
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConsolidationMode(str, Enum):
+    """
+    Identifies how Encounter fragments, created from records such as Conditions, are consolidated.
+
+    - none: Encounter fragments are not consolidated
+    - chunk: Encounter fragments are consolidated within a processing chunk
+    - sorted: Encounter fragments are consolidated across chunks. Requires input sorted by the group by key.
+    """
+    NONE = "none"
+    CHUNK = "chunk"
+    SORTED = "sorted"
+
+
+def _merge_encounter(target: Encounter, source: Encounter):
+    """
+    Merges the diagnosis and reasonReference elements from a source Encounter into a target Encounter.
+    Elements already present in the target are skipped.
+
+    :param target: The Encounter which is retained
+    :param source: The Encounter fragment which is merged and discarded
+    """
+    if source.diagnosis:
+        target.diagnosis = target.diagnosis or []
+        diagnosis_keys = {(d.id, d.condition.reference if d.condition else None) for d in target.diagnosis}
+        for d in source.diagnosis:
+            diagnosis_key = (d.id, d.condition.reference if d.condition else None)
+            if diagnosis_key not in diagnosis_keys:
+                target.diagnosis.append(d)
+                diagnosis_keys.add(diagnosis_key)
+
+    if source.reasonReference:
+        target.reasonReference = target.reasonReference or []
+        references = {r.reference for r in target.reasonReference}
+        for r in source.reasonReference:
+            if r.reference not in references:
+                target.reasonReference.append(r)
+                references.add(r.reference)
+
+
+def _format_results(results: List[Tuple[Any, str, List[ConvertedResource]]],
+                    output_format: OutputFormat) -> List[Tuple[Any, str, List]]:
+    if output_format == OutputFormat.MODEL:
+        return results
+
+    return [(e, k, [format_resource(r.resource, output_format, r.group_by_key, r.row_num) for r in resources])
+            for e, k, resources in results]
+
+
+class SortedEncounterConsolidator:
+    """
+    Consolidates Encounter fragments across chunks of input sorted by the group by key.
+
+    A result is held while it contains an Encounter which later fragments for the same group by key may be merged
+    into, and is returned once the group by key changes. Other results, such as results whose Encounter fragments
+    were merged, are returned immediately, so that only the results which contain an Encounter are held. Results
+    within a group by key may therefore be returned out of record order.
+
+    Held results are bounded by max_pending. When the bound is exceeded the held results are returned, and later
+    fragments for the group by key are consolidated separately.
+    """
+
+    def __init__(self, output_format: OutputFormat, max_pending: int):
+        """
+        :param output_format: The output format for the consolidated results
+        :param max_pending: The maximum number of held results
+        """
+        self.output_format = output_format
+        self.max_pending = max_pending
+        self.merged_count = 0
+        self._group_by_key: Optional[str] = None
+        self._encounters: Dict[str, Encounter] = {}
+        self._pending: List[Tuple[Any, str, List[ConvertedResource]]] = []
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def add(self, results: List[Tuple[Any, str, List[ConvertedResource]]]) -> List[Tuple[Any, str, List]]:
+        """
+        Adds conversion results for consecutive records.
+
+        :param results: The conversion results. Resources are ConvertedResources in the model output format.
+        :return: the consolidated results which are complete
+        """
+        completed = []
+        for processing_exception, group_by_key, resources in results:
+            if group_by_key != self._group_by_key:
+                completed.extend(self.flush())
+                self._group_by_key = group_by_key
+
+            retained = []
+            is_held = False
+            for r in resources:
+                if r.resource_type == "Encounter" and r.id:
+                    if r.id in self._encounters:
+                        _merge_encounter(self._encounters[r.id], r.resource)
+                        self.merged_count += 1
+                        continue
+                    self._encounters[r.id] = r.resource
+                    is_held = True
+                retained.append(r)
+
+            if is_held:
+                self._pending.append((processing_exception, group_by_key, retained))
+            else:
+                completed.extend(_format_results([(processing_exception, group_by_key, retained)],
+                                                 self.output_format))
+
+            if len(self._pending) > self.max_pending:
+                logger.warning(f"More than {self.max_pending} results with Encounters are pending for a group by "
+                               f"key. Later Encounter fragments for the group by key are consolidated separately.")
+                completed.extend(self.flush())
+
+        return completed
+
+    def flush(self) -> List[Tuple[Any, str, List]]:
+        """
+        Returns the held results, once their Encounters are complete.
+
+        :return: the held consolidated results
+        """
+        completed = _format_results(self._pending, self.output_format)
+        self._pending = []
+        self._encounters = {}
+        return completed
+
+
+def consolidate_encounters(results: List[Tuple[Any, str, List[ConvertedResource]]],
+                           output_format: OutputFormat) -> List[Tuple[Any, str, List]]:
+    """
+    Consolidates Encounter fragments which share a group by key and id into a single Encounter and formats the
+    converted resources.
+
+    The consolidated Encounter is returned with the first record which produced it, and the diagnosis and
+    reasonReference elements from later fragments are merged into it. Later fragments are removed.
+
+    :param results: The conversion results. Resources are ConvertedResources in the model output format.
+    :param output_format: The output format for the consolidated results
+    :return: the consolidated conversion results
+    """
+    encounters: Dict[Tuple[str, str], Encounter] = {}
+    consolidated = []
+    merged_count = 0
+
+    for processing_exception, group_by_key, resources in results:
+        retained = []
+        for r in resources:
+            if r.resource_type == "Encounter" and r.id:
+                encounter_key = (group_by_key, r.id)
+                if encounter_key in encounters:
+                    _merge_encounter(encounters[encounter_key], r.resource)
+                    merged_count += 1
+                    continue
+                encounters[encounter_key] = r.resource
+            retained.append(r)
+        consolidated.append((processing_exception, group_by_key, retained))
+
+    logger.debug(f"Consolidated {merged_count} Encounter fragments into {len(encounters)} Encounters")
+    return _format_results(consolidated, output_format)
@@ -1,6 +1,13 @@
+import asyncio
 import os
+import queue
 import re
-from typing import Any, Dict, Generator, List, Optional, Tuple
+import threading
+import zipfile
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
 
 import pandas as pd
 from fhir.resources.meta import Meta
@@ -8,18 +15,28 @@ from numpy import integer
 from pandas import DataFrame, Series
 from linuxforhealth.csvtofhir.support import parse_uri_scheme
 
-from linuxforhealth.csvtofhir.model.contract import FileType
+from linuxforhealth.csvtofhir.model.contract import COLUMNAR_FILE_TYPES, FileType
 
 from linuxforhealth.csvtofhir import support
+from linuxforhealth.csvtofhir.columnar import ColumnarReader, dataframe_to_record_batch
 from linuxforhealth.csvtofhir.config import ConverterConfig, get_converter_config
-from linuxforhealth.csvtofhir.fhirrs import meta
+from linuxforhealth.csvtofhir.consolidation import (ConsolidationMode, SortedEncounterConsolidator,
+                                                    consolidate_encounters)
+from linuxforhealth.csvtofhir.dedup import DedupIndex, create_dedup_index
+from linuxforhealth.csvtofhir.fhirrs import conversion_by_resource, meta
+from linuxforhealth.csvtofhir.fingerprint import create_fingerprint_store
+from linuxforhealth.csvtofhir.fixed_width import read_fixed_width
 from linuxforhealth.csvtofhir.fhirrs.converter import convert_to_fhir
 from linuxforhealth.csvtofhir.model.contract import (DataContract, FileDefinition,
                                                      GeneralSection, Task, load_data_contract)
 from linuxforhealth.csvtofhir.pipeline.operations import execute
+from linuxforhealth.csvtofhir.serialization import OutputFormat, TransformFormat
 
 logger = support.get_logger(__name__)
 
+# default number of result batches converted ahead of an aconvert consumer
+DEFAULT_PREFETCH_BATCHES = 2
+
 
 class ConverterDefinitionLookupException(Exception):
     """
@@ -43,10 +60,39 @@ def validate_contract() -> DataContract:
         logger.error(msg)
         raise FileNotFoundError(msg)
 
+    if parse_uri_scheme(config.configuration_path) == 'file':
+        # long running processes reuse the contract until the contract file is modified
+        modified_time = os.stat(config.configuration_path).st_mtime_ns
+        return _load_file_data_contract(config.configuration_path, modified_time)
+
     contract: DataContract = load_data_contract(config.configuration_path)
     return contract
 
 
+def load_resource_converters(contract: DataContract):
+    """
+    Imports the resource converters used by a data contract's file definitions, so that long running processes do not
+    import them when the first record is converted. Resource types without a converter are skipped, and fail when a
+    record is converted.
+
+    :param contract: The data contract
+    """
+    resource_types = {f.resourceType for f in contract.fileDefinitions.values()}
+    conversion_by_resource.load(sorted(r for r in resource_types if r in conversion_by_resource))
+
+
+@lru_cache(maxsize=16)
+def _load_file_data_contract(file_path: str, modified_time: int) -> DataContract:
+    """
+    Loads a data contract from a local file, caching the contract by file path and modification time.
+
+    :param file_path: The data contract file path
+    :param modified_time: The data contract file modification time, in nanoseconds
+    :return: the DataContract model
+    """
+    return load_data_contract(file_path)
+
+
 def _create_processing_tasks(general: GeneralSection,
                              file_definition: FileDefinition,
                              file_path: str) -> List[Task]:
@@ -94,7 +140,12 @@ def _create_processing_tasks(general: GeneralSection,
     return processing_tasks
 
 
-def convert(file_path: str) -> Generator[Tuple[Any, str, List[str]], None, None]:
+def convert(file_path: str,
+            output_format: OutputFormat = OutputFormat.JSON,
+            dedup_index: Optional[DedupIndex] = None,
+            start_row: int = 0,
+            checkpoint_callback: Optional[Callable[[int], None]] = None) \
+        -> Generator[Tuple[Any, str, List[Any]], None, None]:
     """
     Converts file-based CSV records to FHIR Resources.
 
@@ -107,27 +158,286 @@ def convert(file_path: str) -> Generator[Tuple[Any, str, List[str]], None, None]
 
     - processing_exception: Contains the exception, if any, which occurred while processing the data record.
     - group_by_key: An identifier used to group converted FHIR resource(s) together.
-    - fhir_resources: A list of JSON (string) converted FHIR resource(s).
+    - fhir_resources: A list of converted FHIR resource(s).
+
+    The format of the converted FHIR resources is set using output_format:
+
+    - json: JSON (string) resources. The strings are SerializedResources which carry the resource type and meta.
+    - dict: ConvertedResources containing the resource as a dictionary.
+    - model: ConvertedResources containing the fhir.resources model.
+    - bytes: ConvertedResources containing the resource as JSON bytes.
+
+    ConvertedResources include the resource type, id, meta, source row number, and group by key.
+
+    Referenced resources, such as Practitioner and Location, which were already emitted are suppressed when a
+    DedupIndex is provided, or when the converter configuration's dedup_scope is "group" or "run". A DedupIndex may
+    be shared across convert calls to suppress resources across files.
+
+    Encounter fragments, such as the Encounters created for each Condition record, are consolidated into a single
+    Encounter when the converter configuration's encounter_consolidation is "chunk" or "sorted". In sorted mode,
+    results which contain an Encounter are returned once their group by key is complete.
+
+    Long running conversions may be checkpointed and resumed. checkpoint_callback is called with the number of source
+    rows which were fully emitted, once the results for those rows have been consumed, every checkpoint_interval
+    chunks. A conversion is resumed from that point with start_row, which skips the emitted rows without converting
+    them. Source row numbers are preserved when a conversion is resumed.
+
+    Compressed files, such as patient.csv.gz, are decompressed based on their extension. The source files within a
+    zip archive are converted in parallel, one worker per member up to archive_max_workers, and each member is matched
+    to a FileDefinition using its own file name. Members which do not match a FileDefinition are skipped. Archive
+    conversions are not checkpointed, and results from different members are interleaved.
 
     :param file_path: The path to the CSV file.
+    :param output_format: The format of the converted FHIR resources. Defaults to json.
+    :param dedup_index: Optional index used to suppress referenced resources which were already emitted.
+    :param start_row: The number of source data rows to skip, used to resume a conversion. Defaults to 0.
+    :param checkpoint_callback: Optional callable which receives the number of source rows fully emitted.
     :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and FHIR resources
     :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the CSV file_path
+    :raise: ValueError if the output_format is not supported, or if an archive is resumed from a start row
     """
-    yield from _convert(file_path, True)
+    if support.is_archive(file_path) and parse_uri_scheme(file_path) == "file":
+        if start_row:
+            raise ValueError("conversions of archives cannot be resumed from a start row")
+        yield from _convert_archive(file_path, OutputFormat(output_format), dedup_index)
+        return
+
+    yield from _convert(file_path, True, OutputFormat(output_format), dedup_index,
+                        start_row=start_row, checkpoint_callback=checkpoint_callback)
 
 
-def transform(file_path: str) -> Generator[Tuple[Any, str, List[str]], None, None]:
+def _convert_archive(file_path: str,
+                     output_format: OutputFormat,
+                     dedup_index: Optional[DedupIndex] = None) -> Generator[Tuple[Any, str, List[Any]], None, None]:
+    """
+    Converts the source files within a zip archive, converting members in parallel on worker threads.
+
+    Each member is read from its own archive handle, so that members are decompressed concurrently. The member's
+    logical file path is [archive path]/[member name]. Results are passed to the caller through a bounded queue, and
+    workers stop once the caller stops iterating.
+
+    :param file_path: The zip archive path
+    :param output_format: The format of the converted FHIR resources
+    :param dedup_index: Optional index used to suppress referenced resources, shared by all members
+    :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and FHIR resources
+    :raise: ConverterDefinitionLookupException if no archive member matches a FileDefinition
+    """
+    contract: DataContract = validate_contract()
+    config = get_converter_config()
+
+    members = []
+    for member_name in support.list_archive_members(file_path):
+        try:
+            _find_file_definition(contract, member_name)
+            members.append(member_name)
+        except ConverterDefinitionLookupException:
+            logger.info(f"Skipping member {member_name} of {file_path} which does not match a FileDefinition")
+
+    if not members:
+        msg = f"Unable to load definition for any member of {file_path}"
+        logger.error(msg)
+        raise ConverterDefinitionLookupException(msg)
+
+    if dedup_index is None:
+        dedup_index = create_dedup_index(config)
+
+    # members which share a FileDefinition share change capture fingerprints, and are converted sequentially
+    max_workers = 1 if config.change_capture_directory else max(min(len(members), config.archive_max_workers), 1)
+    result_queue: queue.Queue = queue.Queue(maxsize=config.csv_buffer_size)
+    stop_event = threading.Event()
+    member_complete = object()
+
+    def _put(item: Any) -> bool:
+        # blocks the worker while the queue is full, until the caller stops iterating
+        while not stop_event.is_set():
+            try:
+                result_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _convert_member(member_name: str):
+        if stop_event.is_set():
+            return
+        try:
+            with zipfile.ZipFile(file_path) as archive, archive.open(member_name) as member_file:
+                results = _convert(os.path.join(file_path, member_name), True, output_format, dedup_index,
+                                   stream=member_file)
+                try:
+                    for result in results:
+                        if not _put(result):
+                            return
+                finally:
+                    results.close()
+        except Exception as ex:
+            _put(ex)
+            return
+        _put(member_complete)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="archive-member")
+    try:
+        for member_name in members:
+            executor.submit(_convert_member, member_name)
+
+        remaining_members = len(members)
+        while remaining_members:
+            item = result_queue.get()
+            if item is member_complete:
+                remaining_members -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True)
+
+
+def convert_stream(stream: Any,
+                   logical_name: str,
+                   output_format: OutputFormat = OutputFormat.JSON,
+                   dedup_index: Optional[DedupIndex] = None) -> Generator[Tuple[Any, str, List[Any]], None, None]:
+    """
+    Converts CSV records from a stream to FHIR Resources, without writing the stream to a file.
+
+    The logical name is used in place of a file path. It selects the FileDefinition, and is recorded in the resource
+    Meta and the filePath column. The stream is read as it is converted, and is not closed.
+
+    Usage:
+    with urllib.request.urlopen("https://example.org/extracts/patient.csv") as response:
+        for processing_exception, group_by_key, fhir_resources in convert_stream(response, "patient.csv"):
+            pass
+
+    :param stream: A binary or text file-like object, bytes, or an iterable of byte chunks
+    :param logical_name: The logical file name or path of the stream, such as "patient.csv"
+    :param output_format: The format of the converted FHIR resources. Defaults to json.
+    :param dedup_index: Optional index used to suppress referenced resources which were already emitted.
+    :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and FHIR resources
+    :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the logical_name
+    :raise: TypeError if the stream is not a supported stream source
+    :raise: ValueError if the output_format is not supported
+    """
+    yield from _convert(logical_name, True, OutputFormat(output_format), dedup_index,
+                        stream=support.open_stream(stream))
+
+
+async def aconvert(source: Any,
+                   output_format: OutputFormat = OutputFormat.JSON,
+                   dedup_index: Optional[DedupIndex] = None,
+                   executor: Optional[Executor] = None,
+                   prefetch_batches: int = DEFAULT_PREFETCH_BATCHES,
+                   logical_name: Optional[str] = None) \
+        -> AsyncGenerator[Tuple[Any, str, List[Any]], None]:
+    """
+    Converts file-based CSV records to FHIR Resources without blocking the event loop.
+
+    Returns the same results as convert(). Records are read and converted on an executor thread, so that the event
+    loop may run other tasks, such as network I/O, during conversion. Results are passed to the event loop in batches
+    of up to csv_buffer_size results. At most prefetch_batches batches are converted ahead of the consumer, so memory
+    use remains bounded when the consumer is slower than conversion. Conversion stops if the consumer stops iterating.
+
+    The source is a file path, or a stream converted with convert_stream() if a logical name is provided.
+
+    Usage:
+    async for processing_exception, group_by_key, fhir_resources in aconvert("/data/patient.csv"):
+        pass
+
+    :param source: The path to the CSV file, or a stream if logical_name is provided.
+    :param output_format: The format of the converted FHIR resources. Defaults to json.
+    :param dedup_index: Optional index used to suppress referenced resources which were already emitted.
+    :param executor: Optional thread pool executor used for conversion. Defaults to the event loop's default executor.
+    :param prefetch_batches: The maximum number of result batches converted ahead of the consumer.
+    :param logical_name: The logical file name of a stream source. See convert_stream().
+    :return: Async generator yielding a tuple containing: processing errors (optional), grouping key, and FHIR
+    resources
+    :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the source
+    :raise: ValueError if the output_format is not supported or prefetch_batches is less than 1
+    """
+    if prefetch_batches < 1:
+        raise ValueError("prefetch_batches must be greater than 0")
+
+    loop = asyncio.get_running_loop()
+    batch_queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch_batches)
+    batch_size = get_converter_config().csv_buffer_size
+    stop_event = threading.Event()
+
+    def _put(item: Any):
+        # blocks the executor thread while the queue is full
+        if not stop_event.is_set():
+            asyncio.run_coroutine_threadsafe(batch_queue.put(item), loop).result()
+
+    def _produce():
+        if logical_name is None:
+            results = convert(source, output_format, dedup_index)
+        else:
+            results = convert_stream(source, logical_name, output_format, dedup_index)
+        batch = []
+        try:
+            for result in results:
+                if stop_event.is_set():
+                    return
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    _put(batch)
+                    batch = []
+        except Exception as ex:
+            _put(ex)
+            return
+        finally:
+            results.close()
+
+        if batch:
+            _put(batch)
+        _put(None)
+
+    producer = loop.run_in_executor(executor, _produce)
+    try:
+        while True:
+            item = await batch_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            for result in item:
+                yield result
+        await producer
+    finally:
+        stop_event.set()
+        # the producer may be waiting to add a batch to a full queue. Once stopped, it does not add further batches.
+        while not batch_queue.empty():
+            batch_queue.get_nowait()
+        await asyncio.wait({producer})
+        if not producer.cancelled() and producer.exception() is not None:
+            error_name = producer.exception().__class__.__name__
+            logger.error(f"Conversion of {logical_name or source} failed with {error_name}")
+
+
+def transform(file_path: str,
+              transform_format: TransformFormat = TransformFormat.JSON) -> Generator[Tuple[Any, str, Any], None, None]:
     """
     Same as the convert method except it skips the last step of converting the final dataframe into a fhir resource.
 
+    TransformFormat.JSON returns each record as a JSON string. TransformFormat.ARROW returns each processed chunk as a
+    pyarrow RecordBatch, with a None grouping key, and requires the optional pyarrow dependency. The RecordBatch schema
+    is derived from the first chunk, and later chunks are cast to it.
+
     :param file_path: The path to the CSV file.
-    :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and FHIR resources
+    :param transform_format: The format of the transformed records. Defaults to json.
+    :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and transformed records
     :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the CSV file_path
     """
-    yield from _convert(file_path, False)
+    yield from _convert(file_path, False, transform_format=TransformFormat(transform_format))
 
 
-def _convert(file_path: str, create_fhir_resources: bool) -> Generator[Tuple[Any, str, List[str]], None, None]:
+def _convert(file_path: str,
+             create_fhir_resources: bool,
+             output_format: OutputFormat = OutputFormat.JSON,
+             dedup_index: Optional[DedupIndex] = None,
+             transform_format: TransformFormat = TransformFormat.JSON,
+             start_row: int = 0,
+             checkpoint_callback: Optional[Callable[[int], None]] = None,
+             stream: Optional[Any] = None) -> Generator[Tuple[Any, str, Any], None, None]:
     """
     Transforms file-based CSV records to either a FHIR Resources or a different data model based on the configuration
     and the create_fhir_resource flag.
@@ -145,8 +455,17 @@ def _convert(file_path: str, create_fhir_resources: bool) -> Generator[Tuple[Any
 
     :param file_path: The path to the CSV file.
     :param create_fhir_resources: Flag to indicate if final dataframe should be converted to a fhir resource
+    :param output_format: The format of the converted FHIR resources. Defaults to json.
+    :param dedup_index: Optional index used to suppress referenced resources. Created from the converter
+        configuration if not provided.
+    :param transform_format: The format of transformed records, used if create_fhir_resources is False.
+    :param start_row: The number of source data rows to skip, used to resume a conversion.
+    :param checkpoint_callback: Optional callable which receives the number of source rows fully emitted.
+    :param stream: Optional file-like object which is read in place of the file path. The file path is the stream's
+        logical name.
     :return: Generator yielding a tuple containing: processing errors (optional),  grouping key, and FHIR resources
     :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the CSV file_path
+    :raise: ValueError if a stream is resumed from a start row
     """
 
     def _append_row_num_to_file_meta(resource_meta: Meta, num: integer) -> Meta:
@@ -182,12 +501,16 @@ def _convert(file_path: str, create_fhir_resources: bool) -> Generator[Tuple[Any
                 groupByKey = row.groupByKey
             logger.debug((f"Converting groupByKey={groupByKey} resourceType={row.configResourceType}"))
             logger.info((f"Converting row {row.rowNum} file_path={row.filePath} "))
+            # resources which are not serialized immediately require their own meta
+            row_meta = resource_meta.copy(deep=True) if copy_meta else resource_meta
             result = convert_to_fhir(
                 groupByKey,
                 row.to_dict(),
                 _append_row_num_to_file_meta(
-                    resource_meta,
-                    row.rowNum))
+                    row_meta,
+                    row.rowNum),
+                row_output_format,
+                dedup_index)
             logger.info(f"Finished converting row {row.rowNum} file_path={row.filePath} " \
                         + (f"  Number of resources created: {len(result)}  The following resourceTypes were created: ") \
                         + ', '.join(support.get_fhir_resource_types(result)))
@@ -202,35 +525,79 @@ def _convert(file_path: str, create_fhir_resources: bool) -> Generator[Tuple[Any
     contract: DataContract = validate_contract()
 
     file_name = os.path.basename(file_path)
-    file_definition_lookup = os.path.splitext(file_name)[0]
-    file_definition: Optional[FileDefinition] = None
-
-    for k, v in contract.fileDefinitions.items():
-        if contract.general.regexFilenames:
-            if re.search(k, file_definition_lookup):
-                file_definition = v
-                break
-        else:
-            if k.lower() in file_definition_lookup.lower():
-                file_definition = v
-                break
-
-    if not file_definition:
-        msg = f"Unable to load definition {file_definition} for {file_definition_lookup}"
-        logger.error(msg)
-        raise ConverterDefinitionLookupException(msg)
+    try:
+        file_definition_name, file_definition = _find_file_definition(contract, file_path)
+    except ConverterDefinitionLookupException as ex:
+        logger.error(str(ex))
+        raise
+
+    if create_fhir_resources and dedup_index is None:
+        dedup_index = create_dedup_index(get_converter_config())
+
+    # converts new and changed rows only, when change capture is enabled
+    fingerprint_store = None
+    if create_fhir_resources:
+        fingerprint_store = create_fingerprint_store(get_converter_config().change_capture_directory,
+                                                     file_definition_name,
+                                                     file_definition.recordIdField)
+
+    # consolidated resources are formatted after Encounter fragments are merged
+    consolidation_mode = ConsolidationMode(get_converter_config().encounter_consolidation)
+    row_output_format = OutputFormat.MODEL if consolidation_mode != ConsolidationMode.NONE else output_format
+    copy_meta = row_output_format == OutputFormat.MODEL
+    sorted_consolidator = None
+    if consolidation_mode == ConsolidationMode.SORTED:
+        sorted_consolidator = SortedEncounterConsolidator(output_format,
+                                                          get_converter_config().encounter_consolidation_max_pending)
+    transform_schema = None
 
     resource_meta: Meta = meta.create_meta(file_name, file_definition.resourceType, contract.general.dict())
     chunk_tasks = _create_processing_tasks(contract.general, file_definition, file_path)
-    csv_reader_params = build_csv_reader_params(get_converter_config(), contract.general, file_definition)
 
-    if file_definition.fileType == FileType.FW:
-        pd_read_function = pd.read_fwf
+    if file_definition.fileType in COLUMNAR_FILE_TYPES:
+        csv_reader_params = build_columnar_reader_params(get_converter_config(), contract.general, file_definition)
+        pd_read_function = ColumnarReader
     else:
-        pd_read_function = pd.read_csv
+        csv_reader_params = build_csv_reader_params(get_converter_config(), contract.general, file_definition)
+        pd_read_function = read_fixed_width if file_definition.fileType == FileType.FW else pd.read_csv
+
+        # only local files are memory mapped. Rows skipped on resume are discarded from the mapped file without copies.
+        if stream is not None or parse_uri_scheme(file_path) != "file":
+            csv_reader_params.pop("memory_map", None)
 
-    with pd_read_function(file_path, **csv_reader_params) as buffer:
+    if start_row and stream is not None:
+        raise ValueError("conversions of streams cannot be resumed from a start row")
+
+    if start_row:
+        if pd_read_function is ColumnarReader:
+            # columnar files do not contain a header row, and skipped records are not converted to DataFrames
+            csv_reader_params["skiprows"] = start_row
+        else:
+            csv_reader_params = _build_resume_params(pd_read_function, file_path, csv_reader_params, start_row)
+        chunk_tasks[0] = Task(name="add_row_num", params={"starting_index": start_row + 1})
+        logger.info(f"Resuming conversion of {file_path} after row {start_row}")
+
+    checkpoint_interval = get_converter_config().checkpoint_interval if checkpoint_callback else 0
+    rows_read = start_row
+    chunks_read = 0
+
+    # remote files are read ahead while earlier chunks are converted
+    remote_file = _open_remote_file(file_path) if stream is None else None
+    if stream is None:
+        stream = remote_file
+
+    with remote_file or nullcontext(), \
+            pd_read_function(file_path if stream is None else stream, **csv_reader_params) as buffer:
         for chunk in buffer:
+            # the results of the chunks read have been consumed once the next chunk is read
+            if checkpoint_interval and chunks_read and chunks_read % checkpoint_interval == 0 \
+                    and not (sorted_consolidator is not None and sorted_consolidator.has_pending):
+                if fingerprint_store is not None:
+                    fingerprint_store.save()
+                checkpoint_callback(rows_read)
+            rows_read += len(chunk)
+            chunks_read += 1
+
             chunk: DataFrame = execute(chunk_tasks, chunk)
 
             # increment the source row number for the next chunk/buffer processed
@@ -239,13 +606,131 @@ def _convert(file_path: str, create_fhir_resources: bool) -> Generator[Tuple[Any
             chunk_tasks[0] = Task(name="add_row_num", params={"starting_index": starting_row_num})
 
             if create_fhir_resources:
+                if fingerprint_store is not None:
+                    chunk = fingerprint_store.filter_changed(chunk)
+                    if chunk.empty:
+                        continue
+
                 chunk: Series = chunk.apply(_convert_row_to_fhir, axis=1)
 
-                for processing_exception, group_by_key, fhir_resources in chunk:
-                    yield processing_exception, group_by_key, fhir_resources
-            else:
-                for index, row in chunk.iterrows():
-                    yield None, row.groupByKey, row.to_json()
+                if consolidation_mode == ConsolidationMode.NONE:
+                    for processing_exception, group_by_key, fhir_resources in chunk:
+                        yield processing_exception, group_by_key, fhir_resources
+                elif sorted_consolidator is not None:
+                    # Encounters for the trailing group key may continue in the next chunk
+                    yield from sorted_consolidator.add(list(chunk))
+                else:
+                    yield from consolidate_encounters(list(chunk), output_format)
+
+                # rows which failed are not fingerprinted, so that they are converted again by later runs
+                if fingerprint_store is not None:
+                    converted = [processing_exception is None for processing_exception, _, _ in chunk]
+                    fingerprint_store.commit(chunk.index[converted])
+            elif transform_format == TransformFormat.ARROW:
+                record_batch = dataframe_to_record_batch(chunk, transform_schema)
+                transform_schema = record_batch.schema
+                yield None, None, record_batch
+            elif not chunk.empty:
+                # serialize the chunk at once, rather than creating a Series for each row
+                records = chunk.to_json(orient="records", lines=True).rstrip("\n").split("\n")
+                for group_by_key, record in zip(chunk["groupByKey"], records):
+                    yield None, group_by_key, record
+
+    if sorted_consolidator is not None:
+        yield from sorted_consolidator.flush()
+
+    if dedup_index is not None:
+        dedup_index.log_summary()
+
+    # fingerprints are saved once all results have been returned
+    if fingerprint_store is not None:
+        fingerprint_store.save()
+        fingerprint_store.log_summary()
+
+
+def _find_file_definition(contract: DataContract, file_path: str) -> Tuple[str, FileDefinition]:
+    """
+    Finds the FileDefinition for a source file, using the source file name without its extension.
+
+    :param contract: The data contract
+    :param file_path: The source file path, or logical name
+    :return: tuple containing the FileDefinition name and FileDefinition
+    :raise: ConverterDefinitionLookupException if a FileDefinition cannot be found for the file path
+    """
+    file_definition_lookup = os.path.splitext(os.path.basename(file_path))[0]
+
+    for k, v in contract.fileDefinitions.items():
+        if contract.general.regexFilenames:
+            if re.search(k, file_definition_lookup):
+                return k, v
+        else:
+            if k.lower() in file_definition_lookup.lower():
+                return k, v
+
+    raise ConverterDefinitionLookupException(f"Unable to load definition for {file_definition_lookup}")
+
+
+def _open_remote_file(file_path: str) -> Optional[support.PrefetchReader]:
+    """
+    Opens a remote source file with a read-ahead buffer, so that network reads overlap with conversion.
+
+    :param file_path: The source file path or URI
+    :return: the prefetching reader, or None if the file is local, prefetching is disabled, or the URI scheme is not
+    supported. The file path is read directly if None is returned.
+    """
+    buffer_size = get_converter_config().prefetch_buffer_size
+    # zip archives are not decompressed by the remote file reader, and are read by pandas
+    if buffer_size <= 0 or parse_uri_scheme(file_path) == "file" or support.is_archive(file_path):
+        return None
+
+    remote_file = support.open_remote_file(file_path)
+    if remote_file is None:
+        return None
+    logger.info(f"Reading {file_path} with a {buffer_size} byte read-ahead buffer")
+    return support.PrefetchReader(remote_file, buffer_size)
+
+
+def _build_resume_params(pd_read_function: Callable,
+                         file_path: str,
+                         csv_reader_params: Dict[str, Any],
+                         start_row: int) -> Dict[str, Any]:
+    """
+    Builds reader parameters which skip the data rows emitted before a conversion was resumed.
+
+    Rows are skipped with an integer skiprows, which the pandas tokenizer discards without parsing them into
+    DataFrames. A header row is read first, and supplied as column names, so that it is not skipped.
+
+    :param pd_read_function: The pandas reader function
+    :param file_path: The path to the CSV file
+    :param csv_reader_params: The reader parameters
+    :param start_row: The number of data rows to skip
+    :return: the updated reader parameters
+    """
+    params = dict(csv_reader_params)
+    skiprows = params.pop("skiprows", None) or 0
+    header_rows = 0
+
+    if "names" not in params:
+        header_params = {k: v for k, v in params.items() if k != "chunksize"}
+        params["names"] = list(pd_read_function(file_path, nrows=0, skiprows=skiprows, **header_params).columns)
+        params["header"] = None
+        header_rows = 1
+
+    if isinstance(skiprows, int):
+        params["skiprows"] = skiprows + header_rows + start_row
+    else:
+        # skipped line indexes are followed by the header, if present, and the emitted data rows
+        skipped = set(skiprows)
+        line_index = 0
+        remaining = header_rows + start_row
+        while remaining:
+            if line_index not in skipped:
+                skipped.add(line_index)
+                remaining -= 1
+            line_index += 1
+        params["skiprows"] = sorted(skipped)
+
+    return params
 
 
 def build_csv_reader_params(
@@ -301,6 +786,38 @@ def build_csv_reader_params(
     if file_definition.skiprows:
         params["skiprows"] = file_definition.skiprows
 
+    if config.csv_memory_map and file_definition.fileType == FileType.CSV:
+        params["memory_map"] = True
+
     logger.debug(f"Parsed parameters for CSV Reader {params}")
 
     return params
+
+
+def build_columnar_reader_params(config: ConverterConfig,
+                                 general_section: GeneralSection,
+                                 file_definition: FileDefinition) -> Dict[str, Any]:
+    """
+    Builds the ColumnarReader parameters, used for parquet and arrow files, based on converter and file definition
+    settings. The file definition headers select the columns which are read.
+
+    :param config: The converter configuration
+    :param general_section: The DataContract general section/settings
+    :param file_definition: The current file definition
+    :return: Dictionary of settings
+    """
+    params = {
+        "file_type": file_definition.fileType,
+        "chunksize": config.csv_buffer_size,
+        "columns": file_definition.headers
+    }
+
+    if file_definition.convertColumnsToString:
+        params["dtype"] = str
+
+    if general_section.emptyFieldValues:
+        params["na_values"] = general_section.emptyFieldValues
+
+    logger.debug(f"Parsed parameters for Columnar Reader {params}")
+
+    return params
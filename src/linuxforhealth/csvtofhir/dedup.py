@@ -0,0 +1,151 @@
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from fhir.resources.resource import Resource
+
+from linuxforhealth.csvtofhir.config import ConverterConfig
+from linuxforhealth.csvtofhir.serialization import dumps
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# referenced resources which are commonly repeated across source records
+DEFAULT_DEDUP_RESOURCE_TYPES = ConverterConfig.__fields__["dedup_resource_types"].default
+
+# resources which are converted as fragments sharing an id, such as Encounters carrying a single diagnosis, and
+# consolidated later. Their content is always included in the index key, so that fragments are not suppressed.
+CONTENT_HASH_RESOURCE_TYPES = {"Encounter"}
+
+
+class DedupScope(str, Enum):
+    """
+    Identifies the scope used to suppress repeated referenced resources.
+    """
+    NONE = "none"
+    GROUP = "group"
+    RUN = "run"
+
+
+class DedupIndex:
+    """
+    A bounded, least recently used index of the referenced resources emitted within a conversion run.
+
+    Resources are keyed on resource type and id, and optionally a hash of the resource's content (excluding meta).
+    When content hashing is enabled, a resource is only suppressed if an identical resource was already emitted,
+    so resources which share an id but carry different data are retained. Encounter fragments, which are consolidated
+    after conversion, are always keyed on their content.
+    The GROUP scope adds the group by key to the index key, emitting a resource once per group key.
+    """
+
+    def __init__(self,
+                 scope: DedupScope = DedupScope.RUN,
+                 resource_types: Optional[List[str]] = None,
+                 content_hash: bool = True,
+                 max_entries: int = 100000):
+        """
+        :param scope: The dedup scope, GROUP or RUN
+        :param resource_types: The resource types eligible for dedup. Defaults to DEFAULT_DEDUP_RESOURCE_TYPES.
+        :param content_hash: Includes a hash of the resource content in the index key if True.
+        :param max_entries: The maximum number of index entries. Least recently used entries are evicted first.
+        """
+        self.scope = DedupScope(scope)
+        self.resource_types = set(resource_types if resource_types is not None else DEFAULT_DEDUP_RESOURCE_TYPES)
+        self.content_hash = content_hash
+        self.max_entries = max_entries
+        self.suppressed_by_type: Dict[str, int] = defaultdict(int)
+        self._index: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def suppressed(self) -> int:
+        """Returns the total number of suppressed resources"""
+        return sum(self.suppressed_by_type.values())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _create_key(self, group_by_key: str, resource: Resource) -> Tuple:
+        """
+        Creates the index key for a resource.
+
+        :param group_by_key: The source record group by key
+        :param resource: The FHIR resource
+        :return: the index key
+        """
+        key = (resource.resource_type, resource.id)
+
+        if self.scope == DedupScope.GROUP:
+            key += (group_by_key,)
+
+        if self.content_hash or resource.resource_type in CONTENT_HASH_RESOURCE_TYPES:
+            data = resource.dict()
+            data.pop("meta", None)
+            digest = hashlib.blake2b(dumps(data, default=resource.__json_encoder__, sort_keys=True),
+                                     digest_size=16).digest()
+            key += (digest,)
+
+        return key
+
+    def is_duplicate(self, group_by_key: str, resource: Resource) -> bool:
+        """
+        Returns True if the resource was already emitted within the dedup scope, recording the resource otherwise.
+        Resources without an id, or with a resource type which is not eligible, are never duplicates.
+
+        :param group_by_key: The source record group by key
+        :param resource: The FHIR resource
+        :return: True if the resource is a duplicate, otherwise False
+        """
+        if resource.resource_type not in self.resource_types or not resource.id:
+            return False
+
+        key = self._create_key(group_by_key, resource)
+        # the index may be shared by threads, such as the workers converting archive members
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+                self.suppressed_by_type[resource.resource_type] += 1
+                return True
+
+            self._index[key] = None
+            if len(self._index) > self.max_entries:
+                self._index.popitem(last=False)
+            return False
+
+    def filter(self, group_by_key: str, resources: List[Resource], primary_resource_type: str = None) \
+            -> List[Resource]:
+        """
+        Removes duplicate referenced resources from a list of converted resources.
+
+        :param group_by_key: The source record group by key
+        :param resources: The converted FHIR resources
+        :param primary_resource_type: The resource type produced by the source record, which is not filtered
+        :return: the filtered resources
+        """
+        return [r for r in resources
+                if r.resource_type == primary_resource_type or not self.is_duplicate(group_by_key, r)]
+
+    def log_summary(self):
+        """Logs the number of suppressed resources per resource type"""
+        logger.info(f"Suppressed {self.suppressed} duplicate resources: " +
+                    ", ".join(f"{k}={v}" for k, v in sorted(self.suppressed_by_type.items())))
+
+
+def create_dedup_index(config: ConverterConfig, scope: Optional[DedupScope] = None) -> Optional[DedupIndex]:
+    """
+    Creates a DedupIndex using converter configuration settings.
+
+    :param config: The converter configuration
+    :param scope: Optional scope which overrides the configured scope
+    :return: DedupIndex, or None if the dedup scope is "none"
+    """
+    scope = DedupScope(scope or config.dedup_scope)
+    if scope == DedupScope.NONE:
+        return None
+
+    return DedupIndex(scope=scope,
+                      resource_types=config.dedup_resource_types,
+                      content_hash=config.dedup_content_hash,
+                      max_entries=config.dedup_max_entries)
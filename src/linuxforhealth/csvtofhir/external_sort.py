@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Generator, Iterable, Iterator, List, Optional, Tuple
+
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# maximum number of records held in memory before a sorted run is written to disk
+DEFAULT_SORT_BUFFER_RECORDS = 100000
+
+# maximum number of run files merged at once
+DEFAULT_MAX_MERGE_FILES = 64
+
+
+def _sort_key(record: Tuple[Any, Any]) -> str:
+    return str(record[0])
+
+
+def _read_run(run_path: str) -> Iterator[Tuple[Any, Any]]:
+    with open(run_path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class ExternalGroupSort:
+    """
+    Groups records by key using an on-disk external sort, so that memory use is bounded by the buffer size rather
+    than the size of the dataset.
+
+    Records are buffered in memory. When the buffer is full it is sorted by key and written to a run file. Runs are
+    merged when groups are read, using at most max_merge_files open files. Sorts are stable, so records for a key are
+    returned in the order they were added.
+
+    Usage:
+    with ExternalGroupSort() as sorter:
+        sorter.add("patient-1", record)
+        for key, records in sorter.groups():
+            pass
+    """
+
+    def __init__(self,
+                 buffer_records: int = DEFAULT_SORT_BUFFER_RECORDS,
+                 temp_dir: Optional[str] = None,
+                 max_merge_files: int = DEFAULT_MAX_MERGE_FILES):
+        """
+        :param buffer_records: The maximum number of records held in memory
+        :param temp_dir: The parent directory for run files. Defaults to the system temp directory.
+        :param max_merge_files: The maximum number of run files merged at once
+        :raise: ValueError if buffer_records is less than 1 or max_merge_files is less than 2
+        """
+        if buffer_records < 1 or max_merge_files < 2:
+            raise ValueError("buffer_records must be greater than 0 and max_merge_files must be greater than 1")
+
+        self.buffer_records = buffer_records
+        self.max_merge_files = max_merge_files
+        self.record_count = 0
+        self._buffer: List[Tuple[Any, Any]] = []
+        self._runs: List[str] = []
+        self._run_number = 0
+        self._run_dir = tempfile.mkdtemp(prefix="csvtofhir-sort-", dir=temp_dir)
+
+    @property
+    def run_count(self) -> int:
+        return len(self._runs)
+
+    def _write_run(self, records: Iterable[Tuple[Any, Any]]) -> str:
+        self._run_number += 1
+        run_path = os.path.join(self._run_dir, f"run-{self._run_number:06}")
+        with open(run_path, "wb") as f:
+            for record in records:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return run_path
+
+    def _spill(self):
+        if self._buffer:
+            self._buffer.sort(key=_sort_key)
+            self._runs.append(self._write_run(self._buffer))
+            self._buffer = []
+
+    def add(self, key: Any, record: Any):
+        """
+        Adds a record.
+
+        :param key: The group key
+        :param record: The record, which must support pickling
+        """
+        self._buffer.append((key, record))
+        self.record_count += 1
+        if len(self._buffer) >= self.buffer_records:
+            self._spill()
+
+    def _merge(self, run_paths: List[str]) -> Iterator[Tuple[Any, Any]]:
+        # heapq.merge is stable, returning equal keys in run order
+        return heapq.merge(*[_read_run(p) for p in run_paths], key=_sort_key)
+
+    def groups(self) -> Generator[Tuple[Any, List[Any]], None, None]:
+        """
+        Returns the records grouped by key, in key order.
+        Only the records for the current group are held in memory.
+
+        :return: generator which returns (key, records) tuples
+        """
+        if not self._runs:
+            self._buffer.sort(key=_sort_key)
+            records = iter(self._buffer)
+        else:
+            self._spill()
+            # reduce the number of runs so that the final merge is within max_merge_files
+            while len(self._runs) > self.max_merge_files:
+                merge_paths, self._runs = self._runs[:self.max_merge_files], self._runs[self.max_merge_files:]
+                # the merged run precedes the remaining runs, which keeps the sort stable
+                self._runs.insert(0, self._write_run(self._merge(merge_paths)))
+                for p in merge_paths:
+                    os.remove(p)
+            records = self._merge(self._runs)
+
+        logger.debug(f"Merging {self.record_count} records from {len(self._runs)} runs")
+        for _, group in itertools.groupby(records, key=_sort_key):
+            group_records = list(group)
+            yield group_records[0][0], [r for _, r in group_records]
+
+    def close(self):
+        """Removes run files"""
+        self._buffer = []
+        self._runs = []
+        shutil.rmtree(self._run_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
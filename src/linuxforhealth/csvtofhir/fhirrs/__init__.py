@@ -1,44 +1,63 @@
-from linuxforhealth.csvtofhir.fhirrs.allergy_intolerance import \
-    convert_record as convert_allergy_intolerance
-from linuxforhealth.csvtofhir.fhirrs.condition import convert_record as convert_condition
-from linuxforhealth.csvtofhir.fhirrs.diagnostic_report import \
-    convert_record as convert_diagnostic_report
-from linuxforhealth.csvtofhir.fhirrs.document_reference import \
-    convert_record as convert_document_reference
-from linuxforhealth.csvtofhir.fhirrs.encounter import convert_record as convert_encounter
-from linuxforhealth.csvtofhir.fhirrs.immunization import convert_record as convert_immunization
-from linuxforhealth.csvtofhir.fhirrs.location import convert_record as convert_location
-from linuxforhealth.csvtofhir.fhirrs.medication_administration import \
-    convert_record as convert_medication_administration
-from linuxforhealth.csvtofhir.fhirrs.medication_request import \
-    convert_record as convert_medication_request
-from linuxforhealth.csvtofhir.fhirrs.medication_statement import \
-    convert_record as convert_medication_statement
-from linuxforhealth.csvtofhir.fhirrs.medication_use import \
-    convert_record as convert_medication_use
-from linuxforhealth.csvtofhir.fhirrs.observation import convert_record as convert_observation
-from linuxforhealth.csvtofhir.fhirrs.patient import convert_record as convert_patient
-from linuxforhealth.csvtofhir.fhirrs.practitioner import convert_record as convert_practitioner
-from linuxforhealth.csvtofhir.fhirrs.procedure import convert_record as convert_procedure
-from linuxforhealth.csvtofhir.fhirrs.unstructured import convert_record as convert_unstructured
-from linuxforhealth.csvtofhir.fhirrs.basic import convert_record as convert_basic
-
-conversion_by_resource = {
-    "AllergyIntolerance": convert_allergy_intolerance,
-    "Basic": convert_basic,
-    "Condition": convert_condition,
-    "DiagnosticReport": convert_diagnostic_report,
-    "DocumentReference": convert_document_reference,
-    "Encounter": convert_encounter,
-    "Immunization": convert_immunization,
-    "Location": convert_location,
-    "MedicationAdministration": convert_medication_administration,
-    "MedicationRequest": convert_medication_request,
-    "MedicationStatement": convert_medication_statement,
-    "MedicationUse": convert_medication_use,
-    "Observation": convert_observation,
-    "Patient": convert_patient,
-    "Practitioner": convert_practitioner,
-    "Procedure": convert_procedure,
-    "Unstructured": convert_unstructured
+from importlib import import_module
+from typing import Callable, Dict, Iterable, Iterator, Mapping
+
+# maps a resource type to the fhirrs module which implements its convert_record function
+CONVERTER_MODULES: Dict[str, str] = {
+    "AllergyIntolerance": "allergy_intolerance",
+    "Basic": "basic",
+    "Condition": "condition",
+    "DiagnosticReport": "diagnostic_report",
+    "DocumentReference": "document_reference",
+    "Encounter": "encounter",
+    "Immunization": "immunization",
+    "Location": "location",
+    "MedicationAdministration": "medication_administration",
+    "MedicationRequest": "medication_request",
+    "MedicationStatement": "medication_statement",
+    "MedicationUse": "medication_use",
+    "Observation": "observation",
+    "Patient": "patient",
+    "Practitioner": "practitioner",
+    "Procedure": "procedure",
+    "Unstructured": "unstructured"
 }
+
+
+class ConverterRegistry(Mapping):
+    """
+    Maps resource types to convert_record functions.
+
+    Converter modules import their fhir.resources models, which is costly, so modules are imported on first
+    lookup rather than when the fhirrs package is imported.
+    """
+
+    def __init__(self, converter_modules: Dict[str, str]):
+        self._converter_modules = converter_modules
+        self._converters: Dict[str, Callable] = {}
+
+    def __getitem__(self, resource_type: str) -> Callable:
+        converter = self._converters.get(resource_type)
+        if converter is None:
+            module_name = self._converter_modules[resource_type]
+            converter = import_module(f"{__name__}.{module_name}").convert_record
+            self._converters[resource_type] = converter
+        return converter
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._converter_modules)
+
+    def __len__(self) -> int:
+        return len(self._converter_modules)
+
+    def load(self, resource_types: Iterable[str]):
+        """
+        Imports the converters for the provided resource types.
+
+        :param resource_types: The resource types to load
+        :raise: KeyError if a resource type does not have a converter
+        """
+        for resource_type in resource_types:
+            self[resource_type]
+
+
+conversion_by_resource = ConverterRegistry(CONVERTER_MODULES)
@@ -1,23 +1,34 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
 
 from fhir.resources.meta import Meta
 from fhir.resources.resource import Resource
 
 from linuxforhealth.csvtofhir import support
+from linuxforhealth.csvtofhir.dedup import DedupIndex
 from linuxforhealth.csvtofhir.fhirrs import conversion_by_resource
+from linuxforhealth.csvtofhir.serialization import (ConvertedResource, OutputFormat, SerializedResource,
+                                                    format_resource)
 
 logger = support.get_logger(__name__)
 
 
 def convert_to_fhir(
-    group_by_key: str, record: Dict, resource_meta: Meta = None
-) -> List[str]:
+    group_by_key: str,
+    record: Dict,
+    resource_meta: Meta = None,
+    output_format: OutputFormat = OutputFormat.JSON,
+    dedup_index: Optional[DedupIndex] = None
+) -> List[Union[SerializedResource, ConvertedResource]]:
     """
     Converts a record into one or more FHIR resources.
-    Results are returned as a list containing "string encoded" FHIR resources.
+    By default, results are returned as a list containing "string encoded" FHIR resources. Each result is a
+    SerializedResource which also carries the resource type and meta. Other output formats return ConvertedResources.
 
     :param group_by_key: A value used to group the current record with other records within a CSV batch.
     :param record: The source record.
+    :param resource_meta: The FHIR Meta applied to converted resources.
+    :param output_format: The format of the converted resources. Defaults to OutputFormat.JSON.
+    :param dedup_index: Optional index used to suppress referenced resources which were already emitted.
     :return: List of converted FHIR Resources
     """
     resource_type: str = record.get("configResourceType")
@@ -26,10 +37,13 @@ def convert_to_fhir(
     fhir_resource_list: List[Resource] = conversion_func(
         group_by_key, record, resource_meta
     )
+    if dedup_index is not None and fhir_resource_list:
+        fhir_resource_list = dedup_index.filter(group_by_key, fhir_resource_list, resource_type)
     if not fhir_resource_list:
         return []
-    response_list: list = []
+    row_num = record.get("rowNum")
+    response_list: List[Union[SerializedResource, ConvertedResource]] = []
     for resource in fhir_resource_list:
-        response_list.append(resource.json())
+        response_list.append(format_resource(resource, output_format, group_by_key, row_num))
     logger.debug(f"Found {len(response_list)} resources.")
     return response_list
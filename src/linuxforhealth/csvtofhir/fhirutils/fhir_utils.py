@@ -107,6 +107,13 @@ def get_new_bundle_entry_put_resource(fhir_resource: Resource) -> BundleEntry:
     )
 
 
+def get_new_bundle_entry_post_resource(fhir_resource: Resource) -> BundleEntry:
+    entry = get_new_bundle_entry("POST", fhir_resource.resource_type, fhir_resource)
+    # resources without an id are assigned an id by the server, and have no resource url
+    entry.fullUrl = None
+    return entry
+
+
 def get_codeable_concept(system: str, code: str, display: str, text: str = None) \
         -> Optional[CodeableConcept]:
     '''
@@ -0,0 +1,231 @@
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# 128 bit blake2b hashes, compared as fixed width byte strings
+HASH_DTYPE = np.dtype("S16")
+
+# fixed width fingerprint records: a record key hash and a row content hash
+FINGERPRINT_DTYPE = np.dtype([("key", HASH_DTYPE), ("digest", HASH_DTYPE)])
+
+# store file extension. Stores written with 64 bit hashes used ".fingerprints", and are not read.
+FINGERPRINT_FILE_EXTENSION = ".fingerprints128"
+
+# columns which vary between deliveries of the same record, and are excluded from the row hash
+EXCLUDED_COLUMNS = ("rowNum", "filePath")
+
+# characters used to join the values of a row when it is hashed
+VALUE_SEPARATOR = "\x1f"
+ESCAPE = "\x1e"
+
+# number of stored fingerprints read at once when updates are merged into the store file
+MERGE_BLOCK_SIZE = 1024 * 1024
+
+
+def _hash_columns(columns: List[pd.Series]) -> np.ndarray:
+    """
+    Hashes the values of string columns for each row.
+
+    Each row's values are joined with a separator. Separator and escape characters are escaped within the columns
+    which contain them, so that the joined text identifies the values.
+
+    :param columns: The string columns
+    :return: the 128 bit blake2b hash of each row
+    """
+    arrays = []
+    for column in columns:
+        values = column.to_numpy(dtype=object)
+        joined_values = "".join(values)
+        if VALUE_SEPARATOR in joined_values or ESCAPE in joined_values:
+            values = (column.str.replace(ESCAPE, ESCAPE * 2, regex=False)
+                      .str.replace(VALUE_SEPARATOR, ESCAPE + "s", regex=False)
+                      .to_numpy(dtype=object))
+        arrays.append(values)
+
+    hashes = b"".join([hashlib.blake2b(VALUE_SEPARATOR.join(r).encode(), digest_size=HASH_DTYPE.itemsize).digest()
+                       for r in zip(*arrays)])
+    return np.frombuffer(hashes, dtype=HASH_DTYPE)
+
+
+def hash_rows(data_frame: DataFrame, record_id_field: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes post-pipeline rows, returning a record key hash and a content hash for each row.
+
+    The record key is the group by key and record id field. If a record id field is not provided, the record key
+    includes the row content, so that changed rows are identified as new rows.
+
+    :param data_frame: The post-pipeline DataFrame
+    :param record_id_field: Optional field which identifies a source record within a group by key
+    :return: tuple containing the key hashes and the content hashes, as 128 bit hash arrays
+    """
+    value_columns = sorted(c for c in data_frame.columns if c not in EXCLUDED_COLUMNS)
+    # values are hashed as text, since object columns may contain unhashable values, such as lists
+    values = {c: data_frame[c].astype(str) for c in value_columns}
+
+    digests = _hash_columns(list(values.values()))
+    if not record_id_field:
+        return digests, digests
+
+    keys = _hash_columns([values["groupByKey"], values[record_id_field]])
+    return keys, digests
+
+
+class RowFingerprintStore:
+    """
+    Stores a fingerprint for each converted source record, so that unchanged records within re-delivered extracts are
+    not converted again.
+
+    Fingerprints are fixed width 32 byte records, containing a 128 bit record key hash and a 128 bit row content hash.
+    The store file is sorted by key and memory-mapped, so lookups use a binary search without loading the store.
+    A hash collision would identify a changed row as unchanged. With 128 bit hashes, the probability of any collision
+    among a billion records is below 10^-20.
+
+    Fingerprints for new and changed rows are pending until the rows are converted. Only the rows which converted
+    without errors are committed, so that rows which failed are converted again by later runs. Committed fingerprints
+    are held in memory until the store is saved, when they are merged into the store file in a single streaming pass.
+    Records which are removed from an extract are not tracked.
+    """
+
+    def __init__(self, store_path: str, record_id_field: Optional[str] = None):
+        """
+        :param store_path: The store file path. The store is created when it is saved if it does not exist.
+        :param record_id_field: Optional field which identifies a source record within a group by key
+        """
+        self.store_path = store_path
+        self.record_id_field = record_id_field
+        self.new_rows = 0
+        self.changed_rows = 0
+        self.unchanged_rows = 0
+        self._updates: List[np.ndarray] = []
+        self._pending_index: Optional[pd.Index] = None
+        self._pending: Optional[np.ndarray] = None
+
+        if os.path.exists(store_path) and os.path.getsize(store_path) > 0:
+            self._fingerprints = np.memmap(store_path, dtype=FINGERPRINT_DTYPE, mode="r")
+        else:
+            self._fingerprints = np.empty(0, dtype=FINGERPRINT_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def filter_changed(self, data_frame: DataFrame) -> DataFrame:
+        """
+        Returns the new and changed rows within a post-pipeline DataFrame. The rows' fingerprints are pending until
+        they are committed, and are replaced by the next call.
+
+        :param data_frame: The post-pipeline DataFrame
+        :return: DataFrame containing new and changed rows
+        """
+        self._pending_index = None
+        self._pending = None
+        if data_frame.empty:
+            return data_frame
+
+        keys, digests = hash_rows(data_frame, self.record_id_field)
+
+        stored_keys = self._fingerprints["key"]
+        positions = np.searchsorted(stored_keys, keys)
+        in_range = positions < len(stored_keys)
+        found = np.zeros(len(keys), dtype=bool)
+        found[in_range] = stored_keys[positions[in_range]] == keys[in_range]
+
+        unchanged = np.zeros(len(keys), dtype=bool)
+        unchanged[found] = self._fingerprints["digest"][positions[found]] == digests[found]
+        changed = ~unchanged
+
+        self.new_rows += int((~found).sum())
+        self.changed_rows += int((found & changed).sum())
+        self.unchanged_rows += int(unchanged.sum())
+
+        changed_rows = data_frame[changed]
+        self._pending_index = changed_rows.index
+        self._pending = np.empty(len(changed_rows), dtype=FINGERPRINT_DTYPE)
+        self._pending["key"] = keys[changed]
+        self._pending["digest"] = digests[changed]
+        return changed_rows
+
+    def commit(self, index: pd.Index):
+        """
+        Records the fingerprints of rows returned by filter_changed() which were converted.
+
+        :param index: The DataFrame index labels of the converted rows
+        """
+        if self._pending is None or len(index) == 0:
+            return
+        self._updates.append(self._pending[self._pending_index.isin(index)])
+
+    def save(self):
+        """
+        Merges committed fingerprints into the store file.
+
+        Updates are sorted, and merged with the store file one block at a time, so that the store is not loaded into
+        memory.
+        """
+        if not self._updates:
+            return
+
+        updates = _sort_unique(np.concatenate(self._updates))
+        update_keys = updates["key"]
+        update_start = 0
+
+        temp_path = f"{self.store_path}.tmp"
+        with open(temp_path, "wb") as f:
+            for block_start in range(0, len(self._fingerprints), MERGE_BLOCK_SIZE):
+                block = np.asarray(self._fingerprints[block_start:block_start + MERGE_BLOCK_SIZE])
+                # updates up to the block's last key are merged with the block
+                update_end = int(np.searchsorted(update_keys, block["key"][-1], side="right"))
+                _sort_unique(np.concatenate([block, updates[update_start:update_end]])).tofile(f)
+                update_start = update_end
+            updates[update_start:].tofile(f)
+
+        self._fingerprints = np.empty(0, dtype=FINGERPRINT_DTYPE)
+        os.replace(temp_path, self.store_path)
+
+        self._fingerprints = np.memmap(self.store_path, dtype=FINGERPRINT_DTYPE, mode="r")
+        self._updates = []
+
+    def log_summary(self):
+        logger.info(f"Change capture for {self.store_path}: new rows={self.new_rows} "
+                    f"changed rows={self.changed_rows} unchanged rows={self.unchanged_rows}")
+
+
+def _sort_unique(fingerprints: np.ndarray) -> np.ndarray:
+    """
+    Sorts fingerprints by key, keeping the last fingerprint for each key.
+
+    :param fingerprints: The fingerprints, where later fingerprints replace earlier fingerprints with the same key
+    :return: the sorted fingerprints
+    """
+    # a stable sort preserves the order of fingerprints with the same key
+    fingerprints = fingerprints[np.argsort(fingerprints["key"], kind="stable")]
+    is_last = np.append(fingerprints["key"][1:] != fingerprints["key"][:-1], True)
+    return fingerprints[is_last]
+
+
+def create_fingerprint_store(store_directory: Optional[str],
+                             file_definition_name: str,
+                             record_id_field: Optional[str] = None) -> Optional[RowFingerprintStore]:
+    """
+    Creates the fingerprint store for a file definition.
+
+    :param store_directory: The directory containing fingerprint stores. Change capture is disabled if None.
+    :param file_definition_name: The file definition name, used for the store file name
+    :param record_id_field: Optional field which identifies a source record within a group by key
+    :return: RowFingerprintStore, or None if change capture is disabled
+    """
+    if not store_directory:
+        return None
+    os.makedirs(store_directory, exist_ok=True)
+    store_path = os.path.join(store_directory, f"{file_definition_name}{FINGERPRINT_FILE_EXTENSION}")
+    previous_store_path = os.path.join(store_directory, f"{file_definition_name}.fingerprints")
+    if not os.path.exists(store_path) and os.path.exists(previous_store_path):
+        logger.info(f"Ignoring 64 bit fingerprint store {previous_store_path}, all rows are converted")
+    return RowFingerprintStore(store_path, record_id_field)
@@ -0,0 +1,174 @@
+import io
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pandas._libs.parsers import STR_NA_VALUES
+
+from linuxforhealth.csvtofhir.support import (ARCHIVE_EXTENSION, COMPRESSION_EXTENSIONS, get_logger,
+                                              parse_uri_scheme)
+
+logger = get_logger(__name__)
+
+# reader parameters supported by FixedWidthReader. Other parameters are read with pandas.read_fwf.
+SUPPORTED_PARAMS = {"widths", "names", "header", "dtype", "na_values", "skiprows", "chunksize", "encoding"}
+
+# characters stripped from field values, matching pandas.read_fwf
+FIELD_WHITESPACE = " \t"
+
+
+class FixedWidthReader:
+    """
+    Reads fixed width records as DataFrame chunks, in place of pandas.read_fwf.
+
+    Fields are sliced from each record using the column widths, rather than inferring column specifications and
+    tokenizing each record. A buffer of up to chunksize records is read at once, and each column is sliced from the
+    buffered records, so that the per field cost is a slice and a strip.
+
+    Chunks are the same as those returned by pandas.read_fwf with dtype=str: field values are stripped of spaces
+    and tabs, empty fields, missing fields, and pandas' default NA values or na_values are NaN, blank records are
+    skipped, and the index continues across chunks. skiprows refers to physical lines, including blank lines.
+    """
+
+    def __init__(self,
+                 source: Any,
+                 widths: List[int],
+                 names: List[str],
+                 chunksize: int,
+                 na_values: Optional[List[str]] = None,
+                 skiprows: Optional[Union[int, List[int]]] = None,
+                 encoding: Optional[str] = None):
+        """
+        :param source: The file path, or a binary or text file-like object
+        :param widths: The column widths, in characters
+        :param names: The column names
+        :param chunksize: The maximum number of records per chunk
+        :param na_values: Optional values which are converted to NaN, in addition to pandas' default NA values
+        :param skiprows: Optional number of lines to skip, or list of the line indexes (0 based) to skip
+        :param encoding: The source encoding. Defaults to utf-8.
+        :raise: ValueError if the number of widths and names differ
+        """
+        if len(widths) != len(names):
+            raise ValueError(f"Expected a width for each column, received {len(widths)} widths for {len(names)} names")
+
+        self.names = names
+        self.chunksize = chunksize
+        self.na_values: Set[str] = set(STR_NA_VALUES) | set(na_values or [])
+        self.skiprows = skiprows
+        self.encoding = encoding or "utf-8"
+        self._source = source
+        self._text_file: Optional[Any] = None
+
+        offsets = np.cumsum([0] + list(widths))
+        self._colspecs: List[Tuple[int, int]] = list(zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+
+    def _open_source(self):
+        if isinstance(self._source, str):
+            # utf-8-sig removes a byte order mark, as pandas does
+            encoding = "utf-8-sig" if self.encoding.lower().replace("_", "-") == "utf-8" else self.encoding
+            self._text_file = open(self._source, "r", encoding=encoding)
+            return self._text_file
+        if isinstance(self._source, io.TextIOBase):
+            return self._source
+
+        # binary file-like objects are not closed once read
+        self._text_file = io.TextIOWrapper(self._source, encoding=self.encoding)
+        return self._text_file
+
+    def _read_lines(self, text_file) -> Iterator[str]:
+        if isinstance(self.skiprows, int):
+            lines = islice(text_file, self.skiprows, None)
+        elif self.skiprows:
+            skipped = set(self.skiprows)
+            lines = (line for index, line in enumerate(text_file) if index not in skipped)
+        else:
+            lines = text_file
+
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line.strip(FIELD_WHITESPACE):
+                yield line
+
+    def _to_data_frame(self, lines: List[str], start_index: int) -> DataFrame:
+        data: Dict[str, List[str]] = {name: [line[start:end].strip(FIELD_WHITESPACE) for line in lines]
+                                      for name, (start, end) in zip(self.names, self._colspecs)}
+        data_frame = DataFrame(data, index=pd.RangeIndex(start_index, start_index + len(lines)), dtype=object)
+        return data_frame.mask(data_frame.isin(self.na_values))
+
+    def __iter__(self) -> Iterator[DataFrame]:
+        lines = self._read_lines(self._open_source())
+        start_index = 0
+        while True:
+            buffer = list(islice(lines, self.chunksize))
+            if not buffer:
+                break
+            yield self._to_data_frame(buffer, start_index)
+            start_index += len(buffer)
+
+    def close(self):
+        """Closes the file opened by the reader. File-like sources are not closed."""
+        if self._text_file is None:
+            return
+        if isinstance(self._source, str):
+            self._text_file.close()
+        else:
+            self._text_file.detach()
+        self._text_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _is_supported(source: Any, params: Dict[str, Any]) -> bool:
+    """
+    Returns True if a source and reader parameters are supported by FixedWidthReader.
+
+    :param source: The file path, or file-like object
+    :param params: The pandas.read_fwf parameters
+    :return: True if FixedWidthReader supports the source and parameters
+    """
+    if not set(params).issubset(SUPPORTED_PARAMS) or not params.get("chunksize") or \
+            not params.get("names") or not params.get("widths"):
+        return False
+
+    # value types are inferred by pandas unless dtype is str
+    if params.get("header", None) is not None or params.get("dtype") is not str:
+        return False
+
+    if params.get("na_values") is not None and not isinstance(params["na_values"], (list, tuple, set)):
+        return False
+
+    if isinstance(source, str):
+        # compressed, archived, and remote files are read with pandas
+        extensions = tuple(COMPRESSION_EXTENSIONS.values()) + (ARCHIVE_EXTENSION,)
+        return parse_uri_scheme(source) == "file" and not source.lower().endswith(extensions)
+
+    return hasattr(source, "read")
+
+
+def read_fixed_width(source: Any, **params) -> Any:
+    """
+    Reads fixed width records in chunks, with the same parameters and results as pandas.read_fwf.
+
+    FixedWidthReader is used for chunked reads of string values from local files and file-like objects. Other reads,
+    such as reads which infer value types, are delegated to pandas.read_fwf.
+
+    :param source: The file path, or file-like object
+    :param params: The pandas.read_fwf parameters
+    :return: FixedWidthReader, or the pandas.read_fwf result
+    """
+    if not _is_supported(source, params):
+        return pd.read_fwf(source, **params)
+
+    return FixedWidthReader(source,
+                            params["widths"],
+                            params["names"],
+                            params["chunksize"],
+                            params.get("na_values"),
+                            params.get("skiprows"),
+                            params.get("encoding"))
@@ -0,0 +1,212 @@
+import http.client
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from linuxforhealth.csvtofhir.support import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP status codes which are retried
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_TIMEOUT = 60.0
+
+
+class FhirLoaderException(Exception):
+    """
+    Raised when transaction Bundles were not accepted by the FHIR server.
+    """
+
+    pass
+
+
+class LoaderStats:
+    """
+    Request counters for a FhirLoader.
+
+    status_counts contains the count of final responses by HTTP status code. Connection errors which are not
+    resolved by retries are counted as failures.
+    """
+
+    def __init__(self):
+        self.status_counts: Counter = Counter()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.entries = 0
+        self._lock = threading.Lock()
+
+    def record_response(self, status: int, entry_count: int):
+        with self._lock:
+            self.requests += 1
+            self.status_counts[status] += 1
+            if 200 <= status < 300:
+                self.entries += entry_count
+            else:
+                self.failures += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+
+    def __str__(self) -> str:
+        status_display = ", ".join(f"{k}={v}" for k, v in sorted(self.status_counts.items()))
+        return (f"requests={self.requests} entries={self.entries} retries={self.retries} "
+                f"failures={self.failures} status=[{status_display}]")
+
+
+class FhirLoader:
+    """
+    Posts FHIR transaction Bundles to a FHIR server endpoint.
+
+    Requests are sent by a pool of worker threads. Each worker keeps a persistent HTTP connection, so connections
+    are reused across requests. Responses with a 429 or 5xx status, and connection errors, are retried with
+    exponential backoff. A Retry-After header, in seconds, takes precedence over the computed backoff.
+
+    Pending requests are bounded to twice the concurrency, so that callers are throttled to the server's pace.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        :param base_url: The FHIR server base url. Transaction Bundles are posted to the base url.
+        :param concurrency: The number of concurrent requests, and connections
+        :param max_retries: The maximum number of retries per request
+        :param backoff_factor: The initial backoff in seconds, which doubles for each retry
+        :param max_backoff: The maximum backoff in seconds
+        :param timeout: The connection and read timeout in seconds
+        :param headers: Optional request headers, such as Authorization
+        :raise: ValueError if the base url is not an http or https url
+        """
+        parsed_url = urlparse(base_url)
+        if parsed_url.scheme not in ("http", "https") or not parsed_url.netloc:
+            raise ValueError(f"Invalid FHIR server url {base_url}")
+
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.stats = LoaderStats()
+
+        self._scheme = parsed_url.scheme
+        self._netloc = parsed_url.netloc
+        self._path = parsed_url.path or "/"
+        self._headers = {"Content-Type": "application/fhir+json", "Accept": "application/fhir+json"}
+        self._headers.update(headers or {})
+
+        self._local = threading.local()
+        self._connections: List[http.client.HTTPConnection] = []
+        self._connections_lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(concurrency * 2)
+        self._futures: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fhir-loader")
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(self._netloc, timeout=self.timeout)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _get_backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.strip().isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+
+    def _post(self, payload: bytes, entry_count: int):
+        for attempt in range(self.max_retries + 1):
+            connection = self._get_connection()
+            retry_after = None
+            try:
+                connection.request("POST", self._path, body=payload, headers=self._headers)
+                response = connection.getresponse()
+                # the response is read in full so that the connection may be reused
+                response.read()
+                status = response.status
+                retry_after = response.getheader("Retry-After")
+                if response.will_close:
+                    connection.close()
+            except (http.client.HTTPException, OSError) as ex:
+                connection.close()
+                if attempt == self.max_retries:
+                    logger.error(f"Unable to post to {self.base_url}: {ex}")
+                    self.stats.record_failure()
+                    return
+                logger.warning(f"Connection error posting to {self.base_url}, retrying: {ex}")
+            else:
+                if status not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    self.stats.record_response(status, entry_count)
+                    if status >= 300:
+                        logger.error(f"Post to {self.base_url} failed with status {status}")
+                    return
+
+            self.stats.record_retry()
+            time.sleep(self._get_backoff(attempt, retry_after))
+
+    def _post_and_release(self, payload: bytes, entry_count: int):
+        try:
+            self._post(payload, entry_count)
+        finally:
+            self._pending.release()
+
+    def submit(self, payload: bytes, entry_count: int = 0):
+        """
+        Submits a transaction Bundle to be posted. Blocks while the maximum number of requests are pending.
+
+        :param payload: The serialized transaction Bundle
+        :param entry_count: The number of Bundle entries, used for statistics
+        """
+        self._pending.acquire()
+        self._futures.append(self._executor.submit(self._post_and_release, payload, entry_count))
+        self._futures = [f for f in self._futures if not f.done()]
+
+    def wait(self):
+        """
+        Waits for pending requests to complete.
+
+        :raise: the first error raised by a pending request
+        """
+        futures, self._futures = self._futures, []
+        for f in futures:
+            f.result()
+
+    def close(self):
+        """Waits for pending requests and closes connections"""
+        self._executor.shutdown(wait=True)
+        for f in self._futures:
+            f.result()
+        self._futures.clear()
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+        logger.info(f"FHIR loader stats: {self.stats}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
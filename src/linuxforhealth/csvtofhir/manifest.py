@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from linuxforhealth.csvtofhir.support import get_logger, open_file
+
+logger = get_logger(__name__)
+
+# default manifest file name, within the base directory so that it is not loaded with the output
+DEFAULT_MANIFEST_FILE_NAME = ".csvtofhir-manifest.json"
+
+# read size used when hashing files
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Returns the content hash of a file.
+
+    :param file_path: The file path
+    :return: the hex encoded blake2b digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open_file(file_path, "rb") as f:
+        for data in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def hash_directory(dir_path: str) -> str:
+    """
+    Returns the content hash of the files within a directory and its subdirectories.
+
+    Used to hash a configuration directory, which contains the data contract and the definitions it links to, such as
+    code map files and external file definitions. Hidden files are excluded.
+
+    :param dir_path: The directory path
+    :return: the hex encoded blake2b digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for current_dir, dir_names, file_names in os.walk(dir_path):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith("."))
+        for file_name in sorted(f for f in file_names if not f.startswith(".")):
+            file_path = os.path.join(current_dir, file_name)
+            digest.update(os.path.relpath(file_path, dir_path).encode())
+            digest.update(hash_file(file_path).encode())
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """
+    Records the source files converted by previous runs, so that unchanged files may be skipped.
+
+    Each entry contains the source file hash, the configuration directory hash, and the output location. A source file
+    is current if all three match. Entries also contain the source file ids written for the source file, which
+    identify its output files when it is converted again. Entries are recorded when a file is converted, and are
+    persisted by save, which should be called once the output has been written.
+    """
+
+    def __init__(self, manifest_path: str, output: Dict):
+        """
+        :param manifest_path: The manifest file path. The manifest is created if it does not exist.
+        :param output: The output location and settings, such as the output directory and output format
+        """
+        self.manifest_path = manifest_path
+        self.output = output
+        self.skipped: List[str] = []
+        self.is_modified = False
+        self._entries: Dict[str, Dict] = {}
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("files", {})
+
+    def get_entry(self, source_path: str) -> Optional[Dict]:
+        return self._entries.get(os.path.abspath(source_path))
+
+    def is_current(self, source_path: str, source_hash: str, contract_hash: str) -> bool:
+        """
+        Returns True if a source file was converted with the same content, configuration, and output.
+
+        :param source_path: The source file path
+        :param source_hash: The source file hash
+        :param contract_hash: The configuration directory hash
+        :return: True if the source file is current
+        """
+        entry = self.get_entry(source_path)
+        return (entry is not None and
+                entry["sourceHash"] == source_hash and
+                entry["contractHash"] == contract_hash and
+                entry["output"] == self.output)
+
+    def skip(self, source_path: str):
+        """
+        Records a source file which was skipped.
+
+        :param source_path: The source file path
+        """
+        self.skipped.append(source_path)
+        logger.info(f"Skipping unchanged file {source_path}")
+
+    def record(self, source_path: str, source_hash: str, contract_hash: str, source_file_ids: List[str]):
+        """
+        Records a converted source file.
+
+        :param source_path: The source file path
+        :param source_hash: The source file hash
+        :param contract_hash: The configuration directory hash
+        :param source_file_ids: The source file ids written for the source file
+        """
+        self._entries[os.path.abspath(source_path)] = {
+            "sourceHash": source_hash,
+            "contractHash": contract_hash,
+            "output": self.output,
+            "sourceFileIds": source_file_ids,
+            "convertedAt": datetime.now(timezone.utc).isoformat()
+        }
+        self.is_modified = True
+
+    def save(self):
+        """
+        Writes the manifest if entries were recorded.
+        The previous manifest is replaced once the new manifest is complete.
+        """
+        if not self.is_modified:
+            return
+
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self._entries}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+        self.is_modified = False
@@ -1,11 +1,12 @@
 import json
+import pkgutil
+from importlib.util import find_spec
 from os import path
 import pytz
 from enum import Enum
 from inspect import Parameter, signature
 from pydantic import Field, root_validator, validator
 from typing import Any, Dict, List, Optional, Union
-from fhir.resources.fhirtypesvalidators import MODEL_CLASSES
 
 from linuxforhealth.csvtofhir.config import get_converter_config
 from linuxforhealth.csvtofhir.model.base import ImmutableModel
@@ -14,8 +15,22 @@ from linuxforhealth.csvtofhir.support import get_logger, parse_uri_scheme, open_
 logger = get_logger(__name__)
 
 
+# fhir.resources modules which do not implement a FHIR model
+FHIR_NON_MODEL_MODULES = {"fhirresourcemodel", "fhirtypes", "fhirtypesvalidators"}
+
+
 def create_resource_list() -> List[str]:
-    return [k.lower() for k in MODEL_CLASSES.keys()] + [
+    """
+    Returns the lower case FHIR resource names supported in a DataContract.
+
+    fhir.resources implements each FHIR model in a module named for the lower case model name. Module names are read
+    from the package directory, which avoids importing fhir.resources and its models. Packages, such as the STU3 and
+    DSTU2 models, and modules which do not implement a model are excluded.
+    """
+    fhir_resources_spec = find_spec("fhir.resources")
+    fhir_modules = [m.name for m in pkgutil.iter_modules(fhir_resources_spec.submodule_search_locations)
+                    if not m.ispkg and m.name not in FHIR_NON_MODEL_MODULES]
+    return fhir_modules + [
         "unstructured",
         "medication_use"
     ]
@@ -45,10 +60,16 @@ class DataStreamType(str, Enum):
 
 class FileType(str, Enum):
     """
-    Identifies the file type that needs to parsed (CSV or Fixed Width.)
+    Identifies the file type that needs to parsed (CSV, Fixed Width, Parquet, or Arrow IPC/Feather.)
     """
     CSV = "csv"
     FW = "fixed-width"
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+
+# file types which are read as Arrow record batches, rather than parsed as text
+COLUMNAR_FILE_TYPES = (FileType.PARQUET, FileType.ARROW)
 
 
 class GeneralSection(ImmutableModel):
@@ -103,7 +124,7 @@ class FileDefinition(ImmutableModel):
     comment: Optional[str]
 
     fileType: FileType = Field(
-        description="Type of file to parse. Supported options are CSV or fixed width",
+        description="Type of file to parse. Supported options are CSV, fixed width, parquet, or arrow (IPC/Feather)",
         default = FileType.CSV
     )
     valueDelimiter: str = Field(
@@ -124,7 +145,8 @@ class FileDefinition(ImmutableModel):
     headers: Optional[Union[List[str], List[Dict[str, str]], Dict[str, int]]] = Field(
         description="List of header columns used to parse CSV records." +
                     "Used when a source file does not include a header." +
-                    "Required field when fileType = fixed width"
+                    "Required field when fileType = fixed width. " +
+                    "Selects the columns read when fileType = parquet or arrow"
     )
 
     skiprows: Optional[Union[int, List[int]]] = Field(
@@ -138,6 +160,12 @@ class FileDefinition(ImmutableModel):
         description="Tasks are used to transform CSV source records to the internal record format."
     )
 
+    recordIdField: Optional[str] = Field(
+        description="The internal record field which identifies a source record within a group by key, such as " +
+                    "patientSourceRecordId. Used by change data capture to detect changed records.",
+        default=None
+    )
+
     @validator("resourceType")
     def validate_resource_type(cls, v):
         """
@@ -213,6 +241,28 @@ class FileDefinition(ImmutableModel):
         
         return values
 
+    @root_validator
+    def validate_columnar_file_type(cls, values):
+        """
+        validates that if fileType is parquet or arrow, headers are a list of column names and skiprows is not used
+        """
+        if values.get("fileType") not in COLUMNAR_FILE_TYPES:
+            return values
+
+        file_type = values["fileType"].value
+        headers = values.get("headers", None)
+        if headers is not None and not (isinstance(headers, list) and all(isinstance(h, str) for h in headers)):
+            msg = f"Headers select the columns read when fileType is {file_type}, and should be a list of column names"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        if values.get("skiprows"):
+            msg = f"skiprows is not supported when fileType is {file_type}"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        return values
+
 
 class DataContract(ImmutableModel):
     """
@@ -1049,7 +1049,7 @@ def join_data(
     reader_params: Optional[Dict] = None
 ) -> DataFrame:
     """
-    takes a secondary file (csv or fixed width) and joins the supplimentary data with the primary
+    takes a secondary file (csv, fixed width, parquet, or arrow) and joins the supplimentary data with the primary
     dataframe based on some common joining key.
 
     Example:
@@ -1068,7 +1068,7 @@ def join_data(
     :param join_type: {'left', 'right', 'outer', 'inner', 'cross'} which correspond roughly to the join types in relational databases by the same name
     See "how" parameter of pandas.dataframe.merge function: https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.merge.html
     :param join_on: Key that will be used to corelate the two data sets. The Key has to be named exactly the same in both datasets
-    :param source_type: csv or fixed-width. default: csv
+    :param source_type: csv, fixed-width, parquet, or arrow. default: csv
     :param reader_params: any additional parameters that need to be passed to pandas for reading the secondary file. default: None
 
     :return: The updated DataFrame.
@@ -1086,6 +1086,10 @@ def join_data(
 
     if source_type_enum == FileType.CSV:
         right_df = pd.read_csv(filepath, **reader_params)
+    elif source_type_enum == FileType.PARQUET:
+        right_df = pd.read_parquet(filepath, **reader_params)
+    elif source_type_enum == FileType.ARROW:
+        right_df = pd.read_feather(filepath, **reader_params)
     else:
         right_df = pd.read_fwf(filepath, **reader_params)
     try:
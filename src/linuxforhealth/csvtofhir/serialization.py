@@ -0,0 +1,201 @@
+import json
+from enum import Enum
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from fhir.resources.resource import Resource
+
+from linuxforhealth.csvtofhir.config import get_converter_config
+
+# supported JSON serialization backends
+JSON_BACKEND = "json"
+ORJSON_BACKEND = "orjson"
+AUTO_BACKEND = "auto"
+JSON_BACKENDS = (AUTO_BACKEND, JSON_BACKEND, ORJSON_BACKEND)
+
+
+class OutputFormat(str, Enum):
+    """
+    Identifies the format of converted FHIR resources returned from the converter.
+    """
+    JSON = "json"
+    DICT = "dict"
+    MODEL = "model"
+    BYTES = "bytes"
+
+
+class TransformFormat(str, Enum):
+    """
+    Identifies the format of transformed records returned from transform().
+
+    - json: each record is returned as a JSON string
+    - arrow: each processed chunk is returned as a pyarrow RecordBatch
+    """
+    JSON = "json"
+    ARROW = "arrow"
+
+
+class SerializedResource(str):
+    """
+    A JSON encoded FHIR resource.
+
+    SerializedResource is a str, so existing consumers of the converter's "List[str]" results are unaffected.
+    The resource type and meta travel alongside the payload, so consumers do not need to parse the JSON to
+    route or name the resource.
+    """
+
+    def __new__(cls, payload: str, resource_type: str, meta: Optional[Dict] = None):
+        instance = super().__new__(cls, payload)
+        instance.resource_type = resource_type
+        instance.meta = meta or {}
+        return instance
+
+    def __reduce__(self):
+        return SerializedResource, (str(self), self.resource_type, self.meta)
+
+
+class ConvertedResource:
+    """
+    A converted FHIR resource in a requested OutputFormat, along with the fields consumers commonly need for
+    routing and naming, so that the resource does not need to be parsed.
+
+    - resource: The resource as a dictionary, FHIR resource model, or JSON bytes
+    - resource_type: The FHIR resource type
+    - id: The FHIR resource id
+    - meta: The FHIR resource meta as a dictionary
+    - row_num: The source record row number
+    - group_by_key: The source record group by key
+    """
+    __slots__ = ("resource", "resource_type", "id", "meta", "row_num", "group_by_key")
+
+    def __init__(self, resource: Any, resource_type: str, id: Optional[str], meta: Optional[Dict],
+                 row_num: Optional[int], group_by_key: str):
+        self.resource = resource
+        self.resource_type = resource_type
+        self.id = id
+        self.meta = meta or {}
+        self.row_num = row_num
+        self.group_by_key = group_by_key
+
+    def __repr__(self):
+        return (f"ConvertedResource(resource_type={self.resource_type!r}, id={self.id!r}, " +
+                f"row_num={self.row_num!r}, group_by_key={self.group_by_key!r})")
+
+
+@lru_cache(maxsize=None)
+def _resolve_json_backend(json_serializer: str) -> Tuple[str, Optional[ModuleType]]:
+    """
+    Resolves a configured JSON serializer once, so that serialization does not import the backend for each call.
+
+    :param json_serializer: The configured JSON serializer
+    :return: the JSON backend name, and the orjson module if the backend is orjson
+    :raise: ValueError if the serializer is not supported or not installed
+    """
+    backend = json_serializer.lower()
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unsupported JSON serializer {backend}. Expected one of {JSON_BACKENDS}")
+
+    if backend == JSON_BACKEND:
+        return JSON_BACKEND, None
+
+    try:
+        import orjson
+        return ORJSON_BACKEND, orjson
+    except ImportError:
+        if backend == ORJSON_BACKEND:
+            raise ValueError("JSON serializer orjson is configured but is not installed")
+        return JSON_BACKEND, None
+
+
+def get_json_backend() -> str:
+    """
+    Returns the configured JSON backend, resolving "auto" to orjson if it is installed.
+
+    :return: the JSON backend name
+    :raise: ValueError if the configured backend is not supported or not installed
+    """
+    return _resolve_json_backend(get_converter_config().json_serializer)[0]
+
+
+def dumps(data: Any, default: Optional[Callable[[Any], Any]] = None, sort_keys: bool = False) -> bytes:
+    """
+    Serializes data to compact UTF-8 encoded JSON using the configured backend.
+
+    :param data: The data to serialize
+    :param default: Optional function used to encode objects which are not natively serializable
+    :param sort_keys: Sorts object keys if True. Defaults to False.
+    :return: JSON bytes
+    """
+    _, orjson = _resolve_json_backend(get_converter_config().json_serializer)
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(data, default=default, option=option)
+
+    return json.dumps(data, default=default, sort_keys=sort_keys, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserializes JSON using the configured backend.
+
+    :param data: JSON str or bytes
+    :return: the deserialized data
+    """
+    _, orjson = _resolve_json_backend(get_converter_config().json_serializer)
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def _get_meta(data: Dict) -> Optional[Dict]:
+    """Returns a resource's meta from its dictionary representation"""
+    meta = data.get("meta")
+    if meta is not None and not isinstance(meta, dict):
+        meta = meta.dict()
+    return meta
+
+
+def serialize_resource(resource: Resource) -> SerializedResource:
+    """
+    Serializes a FHIR resource model to JSON.
+    The resource is converted to a dictionary and encoded once.
+
+    :param resource: The FHIR resource model
+    :return: SerializedResource
+    """
+    data: Dict = resource.dict()
+    payload: bytes = dumps(data, default=resource.__json_encoder__)
+    return SerializedResource(payload.decode("utf-8"), resource.resource_type, _get_meta(data))
+
+
+def format_resource(resource: Resource,
+                    output_format: OutputFormat,
+                    group_by_key: str = None,
+                    row_num: int = None) -> Union[SerializedResource, ConvertedResource]:
+    """
+    Formats a FHIR resource model using the requested output format.
+
+    OutputFormat.JSON returns a SerializedResource, which is compatible with the converter's JSON string results.
+    Other formats return a ConvertedResource. OutputFormat.DICT resources are not encoded, so date and decimal
+    values remain python types.
+
+    :param resource: The FHIR resource model
+    :param output_format: The requested output format
+    :param group_by_key: The source record group by key
+    :param row_num: The source record row number
+    :return: SerializedResource or ConvertedResource
+    """
+    output_format = OutputFormat(output_format)
+
+    if output_format == OutputFormat.JSON:
+        return serialize_resource(resource)
+
+    if output_format == OutputFormat.MODEL:
+        meta = resource.meta.dict() if resource.meta else None
+        return ConvertedResource(resource, resource.resource_type, resource.id, meta, row_num, group_by_key)
+
+    data: Dict = resource.dict()
+    formatted = dumps(data, default=resource.__json_encoder__) if output_format == OutputFormat.BYTES else data
+    return ConvertedResource(formatted, resource.resource_type, resource.id, _get_meta(data), row_num, group_by_key)
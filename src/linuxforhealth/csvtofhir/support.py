@@ -1,8 +1,15 @@
+import bz2
 import csv
+import gzip
+import io
 import json
 import logging
+import lzma
 import os
-from typing import Dict, List
+import queue
+import threading
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urlparse
 import re
 
@@ -12,6 +19,16 @@ is_windows_path = re.compile("^[a-zA-Z]:")
 # open function from the base library
 _base_library_open = open
 
+# file extensions for supported compression formats
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "xz": ".xz"
+}
+
+# file extension for zip archives, which may contain several source files
+ARCHIVE_EXTENSION = ".zip"
+
 
 def find_fhir_resources(resources: List, resource_type: str) -> List[Dict]:
     """
@@ -37,8 +54,11 @@ def get_fhir_resource_types(resources: List) -> List[str]:
     """
     retVal = []
     for result in resources:
-        resource = json.loads(result)
-        retVal.append(resource.get("resourceType", ""))
+        # serialized resources carry their type, avoiding a parse
+        resource_type = getattr(result, "resource_type", None)
+        if resource_type is None:
+            resource_type = json.loads(result).get("resourceType", "")
+        retVal.append(resource_type)
 
     return retVal
 
@@ -134,10 +154,302 @@ def parse_uri_scheme(uri: str) -> str:
         return urlparse(uri, scheme="file")[0]
 
 
-def open_file(*args, **kwargs):
-    """Opens a file based on installed options."""
+def open_file(*args, compression: Optional[str] = None, compresslevel: Optional[int] = None, **kwargs):
+    """
+    Opens a file based on installed options.
+
+    When compression is set, the file is opened for streaming compression and the compression format is not
+    inferred from the file extension.
+
+    :param compression: Optional compression format, one of COMPRESSION_EXTENSIONS' keys, or "none".
+    :param compresslevel: Optional compression level. Defaults to the compression library's default.
+    """
+    if compression and compression != "none":
+        return _open_compressed_file(*args, compression=compression, compresslevel=compresslevel, **kwargs)
+
     try:
         from smart_open import open
         return open(*args, **kwargs)
     except ImportError:
         return _base_library_open(*args, **kwargs)
+
+
+def _open_compressed_file(file_path: str,
+                          mode: str = "rb",
+                          compression: str = "gzip",
+                          compresslevel: Optional[int] = None,
+                          encoding: Optional[str] = None,
+                          **kwargs):
+    """
+    Opens a file with streaming compression or decompression.
+
+    :param file_path: The file path or URI
+    :param mode: The file mode
+    :param compression: The compression format
+    :param compresslevel: Optional compression level
+    :param encoding: The text encoding, used if the mode is a text mode
+    :return: file object
+    :raise: ValueError if the compression format is not supported
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported compression {compression}. Expected one of {list(COMPRESSION_EXTENSIONS)}")
+
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+    try:
+        from smart_open import open
+        raw_file = open(file_path, binary_mode, compression="disable", **kwargs)
+    except ImportError:
+        raw_file = _base_library_open(file_path, binary_mode, **kwargs)
+
+    if compression == "gzip":
+        level = 9 if compresslevel is None else compresslevel
+        compressed_file = gzip.GzipFile(fileobj=raw_file, mode=binary_mode, compresslevel=level)
+    elif compression == "bz2":
+        level = 9 if compresslevel is None else compresslevel
+        compressed_file = bz2.BZ2File(raw_file, mode=binary_mode, compresslevel=level)
+    else:
+        preset = compresslevel if "w" in binary_mode or "a" in binary_mode else None
+        compressed_file = lzma.LZMAFile(raw_file, mode=binary_mode, preset=preset)
+
+    # close the underlying file along with the compressed stream
+    compressed_close = compressed_file.close
+
+    def _close():
+        try:
+            compressed_close()
+        finally:
+            raw_file.close()
+
+    compressed_file.close = _close
+
+    if "b" not in mode:
+        return io.TextIOWrapper(compressed_file, encoding=encoding or "utf-8")
+    return compressed_file
+
+
+class ThreadedWriter:
+    """
+    A binary file wrapper which writes data on a background thread.
+
+    Writes are queued and drained by a single thread, so that costly operations such as compression overlap with
+    the caller's work. The queue is bounded to limit memory use. Errors raised by the background thread are raised
+    from the next write or close.
+    """
+
+    def __init__(self, file_obj, max_queue_size: int = 64):
+        """
+        :param file_obj: The file object written to on the background thread
+        :param max_queue_size: The maximum number of pending writes
+        """
+        self._file_obj = file_obj
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is None:
+                try:
+                    self._file_obj.write(data)
+                except BaseException as ex:
+                    self._error = ex
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, data: bytes) -> int:
+        self._raise_error()
+        self._queue.put(data)
+        return len(data)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            self._file_obj.close()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def is_archive(file_path: str) -> bool:
+    """
+    Returns True if a file is a zip archive, based on its extension.
+
+    :param file_path: The file path
+    :return: True if the file is a zip archive
+    """
+    return file_path.lower().endswith(ARCHIVE_EXTENSION)
+
+
+def list_archive_members(file_path: str) -> List[str]:
+    """
+    Lists the files within a zip archive. Directories, and hidden files such as __MACOSX metadata, are excluded.
+
+    :param file_path: The zip archive path
+    :return: list of member names
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        return [m.filename for m in archive.infolist()
+                if not m.is_dir() and not any(p.startswith((".", "__MACOSX")) for p in m.filename.split("/"))]
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    A binary file wrapper which reads ahead on a background thread.
+
+    Blocks of block_size bytes are read into a bounded queue, so that network reads from remote files overlap with the
+    caller's processing of earlier data. At most buffer_size bytes are read ahead. Errors raised by the background
+    thread are raised from the next read.
+    """
+
+    def __init__(self, file_obj, buffer_size: int, block_size: int = 1024 * 1024):
+        """
+        :param file_obj: The binary file object read on the background thread. It is closed when the reader is closed.
+        :param buffer_size: The maximum number of bytes read ahead
+        :param block_size: The number of bytes read from the file object at once
+        """
+        self._file_obj = file_obj
+        self._block_size = min(block_size, max(buffer_size, 1))
+        self._queue = queue.Queue(maxsize=max(buffer_size // self._block_size, 1))
+        self._stop_event = threading.Event()
+        self._pending = memoryview(b"")
+        self._is_eof = False
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self):
+        try:
+            while not self._stop_event.is_set():
+                data = self._file_obj.read(self._block_size)
+                if not data:
+                    break
+                if not self._put(data):
+                    return
+            self._put(None)
+        except BaseException as ex:
+            self._put(ex)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            if self._is_eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._is_eof = True
+                return 0
+            if isinstance(item, BaseException):
+                raise item
+            self._pending = memoryview(item).cast("B")
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop_event.set()
+            self._thread.join()
+            self._file_obj.close()
+        super().close()
+
+
+def open_remote_file(uri: str):
+    """
+    Opens a remote file, such as an s3, gs, or http URI, for binary reads.
+
+    Remote files are opened with smart_open if it is installed, which decompresses files based on their extension.
+    Otherwise, http and https URIs are opened with urllib, and other URIs are not supported.
+
+    :param uri: The remote file URI
+    :return: binary file object, or None if the URI scheme is not supported
+    """
+    try:
+        from smart_open import open
+        return open(uri, "rb")
+    except ImportError:
+        pass
+
+    if parse_uri_scheme(uri) not in ("http", "https"):
+        return None
+
+    from urllib.request import urlopen
+    response = urlopen(uri)
+    path = urlparse(uri).path
+    if path.endswith(COMPRESSION_EXTENSIONS["gzip"]):
+        return gzip.GzipFile(fileobj=response)
+    if path.endswith(COMPRESSION_EXTENSIONS["bz2"]):
+        return bz2.BZ2File(response)
+    if path.endswith(COMPRESSION_EXTENSIONS["xz"]):
+        return lzma.LZMAFile(response)
+    return response
+
+
+class ChunkedByteStream(io.RawIOBase):
+    """
+    A readable binary stream over an iterator of byte chunks, such as an HTTP response body or an object storage
+    download. Chunks are read as they are requested, so the content is not held in memory.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """
+        :param chunks: The byte chunks
+        """
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks)).cast("B")
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def open_stream(source: Any):
+    """
+    Returns a file-like object for a stream source.
+
+    :param source: A binary or text file-like object, bytes, or an iterable of byte chunks
+    :return: file-like object
+    :raise: TypeError if the source is not a supported stream source
+    """
+    if hasattr(source, "read"):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, str):
+        raise TypeError("a str source is ambiguous, use a file path with convert() or io.StringIO for content")
+    if isinstance(source, Iterable):
+        return io.BufferedReader(ChunkedByteStream(source))
+    raise TypeError(f"Unsupported stream source {type(source).__name__}")
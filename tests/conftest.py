@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Dict
+from typing import Callable, Dict
 
 import numpy as np
 import pytest
@@ -117,6 +117,47 @@ def data_contract_with_comments_data(data_contract_directory: str) -> Dict:
         return json.load(f)
 
 
+# general settings used by the data contracts written to tmp_path
+TEST_CONTRACT_GENERAL = {"timeZone": "US/Eastern", "tenantId": "sample-tenant", "assigningAuthority": "urn:id:client"}
+
+
+@pytest.fixture
+def write_data_contract(tmp_path, monkeypatch) -> Callable[[Dict], str]:
+    """
+    A fixture which writes a data contract to tmp_path, and sets MAPPING_CONFIG_DIRECTORY to tmp_path.
+    :return: function which accepts the file definitions, and returns the data contract directory
+    """
+    def write(file_definitions: Dict) -> str:
+        contract = {"general": TEST_CONTRACT_GENERAL, "fileDefinitions": file_definitions}
+        (tmp_path / "data-contract.json").write_text(json.dumps(contract))
+        monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(tmp_path))
+        return str(tmp_path)
+
+    return write
+
+
+@pytest.fixture
+def condition_contract_directory(write_data_contract: Callable[[Dict], str]) -> str:
+    """
+    A data contract directory with a Condition FileDefinition, without tasks, grouped by patientInternalId.
+    :return: the data contract directory
+    """
+    return write_data_contract(
+        {"Condition": {"resourceType": "Condition", "groupByKey": "patientInternalId", "tasks": []}})
+
+
+@pytest.fixture
+def change_capture_contract_directory(write_data_contract: Callable[[Dict], str]) -> str:
+    """
+    A data contract directory with a Patient FileDefinition which identifies records with patientSourceRecordId.
+    :return: the data contract directory
+    """
+    return write_data_contract({"Patient": {"resourceType": "Patient",
+                                            "groupByKey": "patientInternalId",
+                                            "recordIdField": "patientSourceRecordId",
+                                            "tasks": []}})
+
+
 @pytest.fixture
 def data_contract_with_headers_comments_data(data_contract_directory: str) -> Dict:
     """
@@ -174,4 +174,24 @@ def test_datacontract_with_valid_external_config(
     assert contract is not None
     assert isinstance(contract.fileDefinitions, Dict)
 
-    get_converter_config.cache_clear()
\ No newline at end of file
+    get_converter_config.cache_clear()
+
+
+@pytest.mark.parametrize("file_definition_update", [
+    {"headers": {"patientInternalId": 10}},
+    {"headers": ["patientInternalId"], "skiprows": 2}
+])
+def test_file_definition_columnar_file_type(data_contract_data: Dict, file_definition_update: Dict):
+    """
+    Tests FileDefinition validations for parquet and arrow file types
+    :param data_contract_data: The input data dictionary
+    :param file_definition_update: The invalid file definition settings
+    """
+    file_definition = data_contract_data["fileDefinitions"]["Patient"]
+    file_definition["fileType"] = "parquet"
+    file_definition.pop("headers", None)
+    DataContract(**data_contract_data)
+
+    file_definition.update(file_definition_update)
+    with pytest.raises(ValueError):
+        DataContract(**data_contract_data)
@@ -0,0 +1,92 @@
+import json
+from typing import List
+
+import pytest
+
+from fhir.resources.patient import Patient
+
+from linuxforhealth.csvtofhir.bundle import (BundleBuilder, bundle_results, create_transaction_bundle_data,
+                                             serialize_bundle)
+from linuxforhealth.csvtofhir.serialization import ConvertedResource, OutputFormat, format_resource
+
+
+def create_patient_resources(patient_id: str) -> List[ConvertedResource]:
+    patient = Patient(id=patient_id, gender="unknown")
+    return [format_resource(patient, OutputFormat.MODEL, patient_id, 1)]
+
+
+def test_bundle_builder():
+    """Validates that bundles are completed when they reach the maximum number of entries"""
+    builder = BundleBuilder(max_entries=2)
+    completed = builder.add("1001", create_patient_resources("1001"))
+    assert completed == []
+
+    completed = builder.add("1001", create_patient_resources("1002"))
+    assert len(completed) == 1
+    group_key, bundle = completed[0]
+    assert group_key == "1001"
+    assert bundle.type == "transaction"
+    assert [e.request.method for e in bundle.entry] == ["PUT", "PUT"]
+    assert [e.request.url for e in bundle.entry] == ["Patient/1001", "Patient/1002"]
+
+    assert builder.flush() == []
+    assert builder.bundle_count == 1
+
+
+def test_bundle_builder_max_open_bundles():
+    """Validates that the least recently updated bundle is completed when the open bundle limit is reached"""
+    builder = BundleBuilder(max_open_bundles=2)
+    builder.add("1001", create_patient_resources("1001"))
+    builder.add("1002", create_patient_resources("1002"))
+    builder.add("1001", create_patient_resources("1004"))
+
+    completed = builder.add("1003", create_patient_resources("1003"))
+    assert [k for k, _ in completed] == ["1002"]
+    assert [(k, len(b.entry)) for k, b in builder.flush()] == [("1001", 2), ("1003", 1)]
+
+
+def test_bundle_builder_duplicates():
+    """Validates that a duplicate resource replaces the earlier entry, and that resources without an id are posted"""
+    builder = BundleBuilder(max_entries=3)
+    builder.add("1001", create_patient_resources("1001"))
+    replacement = Patient(id="1001", gender="female")
+    builder.add("1001", [format_resource(replacement, OutputFormat.MODEL, "1001", 2)])
+    builder.add("1001", [format_resource(Patient(gender="male"), OutputFormat.MODEL, "1001", 3)])
+
+    [(_, bundle)] = builder.flush()
+    assert [(e.request.method, e.request.url) for e in bundle.entry] == [("PUT", "Patient/1001"), ("POST", "Patient")]
+    assert bundle.entry[0].resource.gender == "female"
+    assert bundle.entry[1].fullUrl is None
+    serialize_bundle(bundle)
+
+
+def test_create_transaction_bundle_data():
+    """Validates that duplicate resources are replaced, and that resources without an id are posted"""
+    bundle = create_transaction_bundle_data([{"resourceType": "Patient", "id": "1", "gender": "male"},
+                                             {"resourceType": "Patient"},
+                                             {"resourceType": "Patient", "id": "1", "gender": "female"}])
+    assert [(e["request"]["method"], e["request"]["url"]) for e in bundle["entry"]] == \
+        [("PUT", "Patient/1"), ("POST", "Patient")]
+    assert bundle["entry"][0]["resource"]["gender"] == "female"
+
+
+def test_bundle_builder_invalid():
+    with pytest.raises(ValueError):
+        BundleBuilder(max_entries=0)
+
+
+def test_bundle_results():
+    """Validates that conversion results are returned as bundles grouped by group key"""
+    error = ValueError("invalid record")
+    results = [(None, "1001", create_patient_resources("1001")),
+               (error, "1002", None),
+               (None, "1001", create_patient_resources("1004"))]
+
+    bundles = list(bundle_results(results, max_entries=10))
+    assert bundles[0] == (error, "1002", None)
+    assert bundles[1][1] == "1001"
+
+    data = json.loads(serialize_bundle(bundles[1][2]))
+    assert data["resourceType"] == "Bundle"
+    assert len(data["entry"]) == 2
+    assert data["entry"][0]["resource"]["resourceType"] == "Patient"
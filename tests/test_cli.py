@@ -1,8 +1,14 @@
+import json
+import shutil
+from typing import List
 from unittest.mock import MagicMock
 
 import pytest
 
+from linuxforhealth.csvtofhir import converter
 from linuxforhealth.csvtofhir.cli.main import main
+from linuxforhealth.csvtofhir.cli.writers import NdjsonResourceWriter
+from linuxforhealth.csvtofhir.config import get_converter_config
 
 
 def test_cli_no_args(capfd):
@@ -93,3 +99,334 @@ def test_convert_file_mode(monkeypatch):
     convert_args = ["convert", "-f", "/data/Patient.csv", "-c", "/data/config", "-o", "/output"]
     main(convert_args)
     mock_convert.assert_called()
+
+
+@pytest.mark.parametrize(
+    "output_args,expected_files",
+    [
+        ([], ["MRN1234/MRN1234-Patient-Patient-00001.json"]),
+        (["--output-format", "ndjson"], ["Patient-00001.ndjson"]),
+        (["--output-format", "ndjson", "--ndjson-partition", "source-file"], ["Patient-Patient-00001.ndjson"]),
+        (["--writer-threads", "2"], ["MRN1234/MRN1234-Patient-Patient-00001.json"]),
+        (["--output-format", "bundle"], ["MRN1234/MRN1234-Bundle-00001.json"])
+    ]
+)
+def test_convert_file_mode_output_format(csv_directory: str,
+                                         data_contract_directory: str,
+                                         monkeypatch,
+                                         tmp_path,
+                                         output_args: List[str],
+                                         expected_files: List[str]):
+    """
+    Validates the files written by the convert command for each output format
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    :param output_args: The output format arguments
+    :param expected_files: The expected output files, relative to the output directory
+    """
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    get_converter_config.cache_clear()
+
+    convert_args = ["convert", "-f", f"{csv_directory}/Patient.csv", "-c", data_contract_directory,
+                    "-o", str(tmp_path)] + output_args
+    main(convert_args)
+
+    output_files = sorted(str(p.relative_to(tmp_path)) for p in tmp_path.rglob("*") if p.is_file())
+    assert output_files == expected_files
+
+    lines = (tmp_path / expected_files[0]).read_text().splitlines()
+    assert len(lines) == 1
+    resource = json.loads(lines[0])
+    if resource["resourceType"] == "Bundle":
+        resource = resource["entry"][0]["resource"]
+    assert resource["resourceType"] == "Patient"
+
+
+@pytest.mark.parametrize("mode", ["-d", "-f"])
+def test_convert_config_directory_not_preset(csv_directory: str,
+                                             data_contract_directory: str,
+                                             monkeypatch,
+                                             tmp_path,
+                                             mode: str):
+    """
+    Validates that the convert command uses its config directory when MAPPING_CONFIG_DIRECTORY is not set, and the
+    converter config was read before the command ran
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    :param mode: The directory or file mode flag
+    """
+    input_path = tmp_path / "base" / "input"
+    input_path.mkdir(parents=True)
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    shutil.copytree(data_contract_directory, tmp_path / "base" / "config")
+    shutil.copy(f"{csv_directory}/Patient.csv", input_path / "Patient.csv")
+
+    monkeypatch.delenv("MAPPING_CONFIG_DIRECTORY", raising=False)
+    get_converter_config.cache_clear()
+    # the default config directory is cached
+    assert get_converter_config().mapping_config_directory == "/var/app/config"
+
+    if mode == "-d":
+        source_args = ["-d", str(tmp_path / "base")]
+    else:
+        source_args = ["-f", str(input_path / "Patient.csv"), "-c", str(tmp_path / "base" / "config")]
+    main(["convert"] + source_args + ["-o", str(output_path), "--output-format", "ndjson"])
+
+    assert (output_path / "Patient-00001.ndjson").exists()
+
+
+def test_convert_directory_mode_group_across_files(csv_directory: str,
+                                                   data_contract_directory: str,
+                                                   monkeypatch,
+                                                   tmp_path):
+    """
+    Validates that resources are bundled by group key across source files in directory mode
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    """
+    input_path = tmp_path / "base" / "input"
+    input_path.mkdir(parents=True)
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    shutil.copytree(data_contract_directory, tmp_path / "base" / "config")
+    for file_name in ["Patient-a.csv", "Patient-b.csv"]:
+        shutil.copy(f"{csv_directory}/Patient.csv", input_path / file_name)
+
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(tmp_path / "base" / "config"))
+    get_converter_config.cache_clear()
+
+    main(["convert", "-d", str(tmp_path / "base"), "-o", str(output_path), "--output-format", "bundle",
+          "--group-across-files", "--sort-buffer-records", "1"])
+
+    output_files = sorted(str(p.relative_to(output_path)) for p in output_path.rglob("*") if p.is_file())
+    assert output_files == ["MRN1234/MRN1234-Bundle-00001.json"]
+
+    bundle = json.loads((output_path / output_files[0]).read_text())
+    source_files = [e["resource"]["meta"]["extension"][1]["valueString"] for e in bundle["entry"]]
+    # both files contain the same patient, and the later resource replaces the earlier bundle entry
+    assert [f.split(":")[0] for f in source_files] == ["Patient-b.csv"]
+
+
+def test_convert_directory_mode_incremental(csv_directory: str,
+                                            data_contract_directory: str,
+                                            monkeypatch,
+                                            tmp_path,
+                                            capfd):
+    """
+    Validates that unchanged source files are skipped in directory mode, unless --force is used
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    :param capfd: The pytest capfd fixture
+    """
+    base_path = tmp_path / "base"
+    (base_path / "input").mkdir(parents=True)
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    shutil.copytree(data_contract_directory, base_path / "config")
+    for file_name in ["Patient-a.csv", "Patient-b.csv"]:
+        shutil.copy(f"{csv_directory}/Patient.csv", base_path / "input" / file_name)
+
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(base_path / "config"))
+    get_converter_config.cache_clear()
+    convert_args = ["convert", "-d", str(base_path), "-o", str(output_path)]
+
+    main(convert_args)
+    out, _ = capfd.readouterr()
+    assert "Skipped 0 unchanged file(s)" in out
+    assert (base_path / ".csvtofhir-manifest.json").exists()
+    assert not (output_path / ".csvtofhir-manifest.json").exists()
+
+    with open(base_path / "input" / "Patient-b.csv", "a") as f:
+        f.write("hospa,ENC2222,MRN5678,F,1960-01-01,Ann,Smith,987-65-4321,Ohio\n")
+
+    main(convert_args)
+    out, _ = capfd.readouterr()
+    assert "Skipped 1 unchanged file(s)" in out
+    assert "Patient-a.csv" in out.split("Skipped 1 unchanged file(s)")[1]
+    assert "Processing file = " + str(base_path / "input" / "Patient-b.csv") in out
+
+    main(convert_args)
+    out, _ = capfd.readouterr()
+    assert "Skipped 2 unchanged file(s)" in out
+
+    main(convert_args + ["--force"])
+    out, _ = capfd.readouterr()
+    assert "Skipped 0 unchanged file(s)" in out
+
+
+@pytest.mark.parametrize("output_args", [[], ["--output-format", "ndjson", "--ndjson-partition", "source-file"]])
+def test_convert_directory_mode_incremental_removes_output(csv_directory: str,
+                                                           data_contract_directory: str,
+                                                           monkeypatch,
+                                                           tmp_path,
+                                                           output_args: List[str]):
+    """
+    Validates that the previous output of a changed source file is removed when it is converted again, so that
+    resources which are no longer converted from the file are not left in the output directory.
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    :param output_args: The output format arguments
+    """
+    base_path = tmp_path / "base"
+    (base_path / "input").mkdir(parents=True)
+    shutil.copytree(data_contract_directory, base_path / "config")
+    with open(f"{csv_directory}/Patient.csv", encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    for n in range(2, 5):
+        lines.append(lines[1].replace("MRN1234", f"MRN{n}"))
+    (base_path / "input" / "Patient-a.csv").write_text("\n".join(lines))
+    (base_path / "input" / "Patient-b.csv").write_text("\n".join(lines))
+
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(base_path / "config"))
+    get_converter_config.cache_clear()
+
+    def list_output(output_path) -> List[str]:
+        return sorted(str(p.relative_to(output_path)) for p in output_path.rglob("*") if p.is_file())
+
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    main(["convert", "-d", str(base_path), "-o", str(output_path), "--max-records", "1"] + output_args)
+    assert any("Patient-a" in f for f in list_output(output_path))
+
+    # the changed file converts fewer resources
+    (base_path / "input" / "Patient-a.csv").write_text("\n".join(lines[:2]))
+    main(["convert", "-d", str(base_path), "-o", str(output_path), "--max-records", "1"] + output_args)
+
+    expected_path = tmp_path / "expected"
+    expected_path.mkdir()
+    main(["convert", "-d", str(base_path), "-o", str(expected_path), "--max-records", "1", "--manifest",
+          str(tmp_path / "expected-manifest.json")] + output_args)
+    assert list_output(output_path) == list_output(expected_path)
+
+
+def test_convert_checkpoint_resume(csv_directory: str, data_contract_directory: str, monkeypatch, tmp_path, capfd):
+    """
+    Validates that a failed conversion is resumed from its checkpoint without repeating written resources
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    :param capfd: The pytest capfd fixture
+    """
+    base_path = tmp_path / "base"
+    (base_path / "input").mkdir(parents=True)
+    shutil.copytree(data_contract_directory, base_path / "config")
+    with open(f"{csv_directory}/Patient.csv", encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    for n in range(2, 8):
+        lines.append(lines[1].replace("MRN1234", f"MRN{n}"))
+    (base_path / "input" / "Patient.csv").write_text("\n".join(lines))
+
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(base_path / "config"))
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "1")
+    monkeypatch.setenv("CHECKPOINT_INTERVAL", "2")
+    get_converter_config.cache_clear()
+
+    def read_resources(output_path) -> List[str]:
+        resources = []
+        for ndjson_path in sorted(output_path.glob("*.ndjson")):
+            resources.extend(json.loads(line)["id"] for line in ndjson_path.read_text().splitlines())
+        return resources
+
+    expected_path = tmp_path / "expected"
+    expected_path.mkdir()
+    main(["convert", "-d", str(base_path), "-o", str(expected_path), "--output-format", "ndjson"])
+    expected_count = len(read_resources(expected_path))
+    assert expected_count >= 7
+
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    checkpoint_path = tmp_path / "checkpoint.json"
+    convert_args = ["convert", "-d", str(base_path), "-o", str(output_path), "--output-format", "ndjson",
+                    "--checkpoint", str(checkpoint_path), "--force"]
+
+    write = NdjsonResourceWriter.write
+    write_count = {"count": 0}
+
+    def fail_write(self, group_key, resources):
+        write_count["count"] += 1
+        if write_count["count"] == 6:
+            raise IOError("disk full")
+        write(self, group_key, resources)
+
+    monkeypatch.setattr(NdjsonResourceWriter, "write", fail_write)
+    with pytest.raises(IOError):
+        main(convert_args)
+    assert json.loads(checkpoint_path.read_text())["rowsEmitted"] == 4
+
+    monkeypatch.setattr(NdjsonResourceWriter, "write", write)
+    capfd.readouterr()
+    main(convert_args + ["--resume"])
+    out, _ = capfd.readouterr()
+    assert "Resuming from checkpoint" in out
+    assert not checkpoint_path.exists()
+    assert len(read_resources(output_path)) == expected_count
+
+
+def test_convert_checkpoint_kept_on_errors(csv_directory: str, data_contract_directory: str, monkeypatch, tmp_path):
+    """
+    Validates that the checkpoint is kept when a source file is converted with errors, so that completed files are
+    skipped when the conversion is resumed
+
+    :param csv_directory: The CSV directory fixture
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The pytest monkeypatch fixture
+    :param tmp_path: The pytest tmp_path fixture
+    """
+    base_path = tmp_path / "base"
+    (base_path / "input").mkdir(parents=True)
+    shutil.copytree(data_contract_directory, base_path / "config")
+    for file_name in ["Patient-a.csv", "Patient-b.csv"]:
+        shutil.copy(f"{csv_directory}/Patient.csv", base_path / "input" / file_name)
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    checkpoint_path = tmp_path / "checkpoint.json"
+
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(base_path / "config"))
+    get_converter_config.cache_clear()
+
+    convert_to_fhir = converter.convert_to_fhir
+
+    def fail_file_b(group_by_key, row, *args):
+        if row["filePath"].endswith("Patient-b.csv"):
+            raise ValueError("conversion failed")
+        return convert_to_fhir(group_by_key, row, *args)
+
+    convert_args = ["convert", "-d", str(base_path), "-o", str(output_path), "--checkpoint", str(checkpoint_path)]
+    with monkeypatch.context() as m:
+        m.setattr(converter, "convert_to_fhir", fail_file_b)
+        main(convert_args)
+    completed_files = json.loads(checkpoint_path.read_text())["completedFiles"]
+    assert [f.split("/")[-1] for f in completed_files] == ["Patient-a.csv"]
+
+    main(convert_args + ["--resume"])
+    assert not checkpoint_path.exists()
+
+
+@pytest.mark.parametrize("output_args", [
+    ["-o", "output"],
+    ["-o", "output", "--output-format", "bundle"],
+    ["--post-to", "http://localhost/fhir", "--output-format", "ndjson"]
+])
+def test_convert_compression_thread_invalid(output_args: List[str]):
+    """Validates that --compression-thread is rejected for output which is not written to NDJSON files"""
+    with pytest.raises(SystemExit) as exc_info:
+        main(["convert", "-d", "base", "--compression-thread"] + output_args)
+    assert exc_info.value.code == 2
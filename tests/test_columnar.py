@@ -0,0 +1,184 @@
+import io
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from linuxforhealth.csvtofhir import columnar, converter
+from linuxforhealth.csvtofhir.columnar import ColumnarReader, dataframe_to_record_batch, derive_schema, write_parquet
+from linuxforhealth.csvtofhir.config import ConverterConfig, get_converter_config
+from linuxforhealth.csvtofhir.converter import transform
+from linuxforhealth.csvtofhir.model.contract import DataContract, FileType, load_data_contract
+from linuxforhealth.csvtofhir.serialization import TransformFormat
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def transform_contract(data_contract_directory: str, monkeypatch):
+    """Configures the converter with the fixed width transform only data contract"""
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    config = ConverterConfig(mapping_config_file_name="data-contract-fixed-width-transform-only.json")
+    contract: DataContract = load_data_contract(config.configuration_path)
+    monkeypatch.setattr(converter, "validate_contract", lambda: contract)
+
+
+def test_derive_schema():
+    """Validates that list columns are preserved and null columns are typed as strings"""
+    data_frame = pd.DataFrame({"rowNum": [1, 2],
+                               "codes": [["A", "B"], ["C"]],
+                               "empty": [None, None]})
+    schema = derive_schema(data_frame)
+    assert schema.field("rowNum").type == pa.int64()
+    assert schema.field("codes").type == pa.list_(pa.string())
+    assert schema.field("empty").type == pa.string()
+
+    record_batch = dataframe_to_record_batch(data_frame)
+    assert record_batch.num_rows == 2
+    assert record_batch.column("codes").to_pylist() == [["A", "B"], ["C"]]
+
+
+def test_dataframe_to_record_batch_schema():
+    """Validates that a schema from an earlier chunk is applied to later chunks"""
+    schema = derive_schema(pd.DataFrame({"value": [None]}))
+    record_batch = dataframe_to_record_batch(pd.DataFrame({"value": ["abc"]}), schema)
+    assert record_batch.schema == schema
+    assert record_batch.column("value").to_pylist() == ["abc"]
+
+
+def test_dataframe_to_record_batch_cast():
+    """Validates that later chunks with different inferred value types are cast to the schema"""
+    schema = derive_schema(pd.DataFrame({"rowNum": [1], "value": [None], "count": [1]}))
+    record_batch = dataframe_to_record_batch(pd.DataFrame({"rowNum": [2], "value": [1.5], "count": [np.nan]}), schema)
+    assert record_batch.schema == schema
+    assert record_batch.column("value").to_pylist() == ["1.5"]
+    assert record_batch.column("count").to_pylist() == [None]
+
+
+def test_transform_arrow_inferred_types(tmp_path, write_data_contract: Callable[[Dict], str], monkeypatch):
+    """
+    Validates that chunks are cast to the schema of the first chunk when value types are inferred, and a column only
+    contains null values in the first chunk
+    """
+    write_data_contract({"Observation": {"resourceType": "Observation",
+                                         "groupByKey": "patientInternalId",
+                                         "convertColumnsToString": False,
+                                         "tasks": []}})
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+    get_converter_config.cache_clear()
+    csv_path = tmp_path / "observation.csv"
+    csv_path.write_text("\n".join(["patientInternalId,observationValue", "P1,", "P2,", "P3,98.6", "P4,"]))
+
+    record_batches = [record_batch for _, _, record_batch in transform(str(csv_path), TransformFormat.ARROW)]
+    assert len(record_batches) == 2
+    assert record_batches[1].schema == record_batches[0].schema
+    values = [v for record_batch in record_batches for v in record_batch.column("observationValue").to_pylist()]
+    assert values == [None, None, "98.6", None]
+
+
+def test_transform_arrow(transform_contract, csv_directory: str):
+    """Validates that transform returns a RecordBatch per chunk"""
+    results = list(transform(f"{csv_directory}/2022-02-18-patient-fwf.dat", TransformFormat.ARROW))
+    assert len(results) == 1
+
+    processing_exception, group_by_key, record_batch = results[0]
+    assert processing_exception is None
+    assert group_by_key is None
+    assert record_batch.num_rows == 1
+    assert record_batch.column("groupByKey").to_pylist() == ["MRN1234"]
+
+
+def test_write_parquet(transform_contract, csv_directory: str, tmp_path):
+    output_path = str(tmp_path / "patient.parquet")
+    record_count = write_parquet(f"{csv_directory}/2022-02-18-patient-fwf.dat", output_path)
+    assert record_count == 1
+
+    table = pq.read_table(output_path)
+    assert table.num_rows == 1
+    assert table.column("groupByKey").to_pylist() == ["MRN1234"]
+
+
+@pytest.fixture
+def source_table():
+    """A source table with string, integer, and missing values"""
+    return pa.table({"patientInternalId": [f"P{n}" for n in range(10)],
+                     "age": [n if n % 3 else None for n in range(10)],
+                     "sex": ["male", "female", "unknown", "male", "female"] * 2})
+
+
+def _write_source_file(table, file_type: FileType, file_path: str, ipc_format: str = "file"):
+    if file_type == FileType.PARQUET:
+        pq.write_table(table, file_path, row_group_size=4)
+    elif ipc_format == "file":
+        with pa.ipc.new_file(file_path, table.schema) as writer:
+            writer.write_table(table, max_chunksize=4)
+    else:
+        with pa.ipc.new_stream(file_path, table.schema) as writer:
+            writer.write_table(table, max_chunksize=4)
+
+
+@pytest.mark.parametrize("file_type, ipc_format", [(FileType.PARQUET, None),
+                                                   (FileType.ARROW, "file"),
+                                                   (FileType.ARROW, "stream")])
+def test_columnar_reader(source_table, tmp_path, file_type: FileType, ipc_format: str):
+    """Validates that columnar files are read in chunks, with the CSV reader's index and value types"""
+    file_path = str(tmp_path / "patient.data")
+    _write_source_file(source_table, file_type, file_path, ipc_format)
+
+    with ColumnarReader(file_path, file_type, chunksize=3, dtype=str, na_values=["unknown"]) as reader:
+        chunks = list(reader)
+
+    # Arrow IPC chunks do not span record batches of 4 records
+    expected_sizes = [3, 3, 3, 1] if file_type == FileType.PARQUET else [3, 1, 3, 1, 2]
+    assert [len(c) for c in chunks] == expected_sizes
+    data_frame = pd.concat(chunks)
+    assert list(data_frame.index) == list(range(10))
+    assert pd.isna(data_frame["age"].iloc[0])
+    assert data_frame["age"].iloc[1] == "1"
+    assert pd.isna(data_frame["sex"].iloc[2])
+
+    with open(file_path, "rb") as f:
+        chunks = list(ColumnarReader(f, file_type, chunksize=5, columns=["sex", "patientInternalId"], skiprows=5))
+    data_frame = pd.concat(chunks)
+    assert list(data_frame.columns) == ["sex", "patientInternalId"]
+    assert data_frame["patientInternalId"].tolist() == [f"P{n}" for n in range(5, 10)]
+    assert list(data_frame.index) == list(range(5))
+
+
+@pytest.mark.parametrize("file_type", [FileType.PARQUET, FileType.ARROW])
+def test_columnar_reader_stream(source_table, monkeypatch, file_type: FileType):
+    """Validates that non-seekable sources are copied to a temporary file in blocks, rather than read into memory"""
+    monkeypatch.setattr(columnar, "SPOOL_BUFFER_SIZE", 64)
+    sink = io.BytesIO()
+    if file_type == FileType.PARQUET:
+        pq.write_table(source_table, sink)
+    else:
+        with pa.ipc.new_stream(sink, source_table.schema) as writer:
+            writer.write_table(source_table)
+
+    read_sizes = []
+
+    class Stream(io.BytesIO):
+        def seekable(self):
+            return False
+
+        def read(self, size=-1):
+            read_sizes.append(size)
+            return super().read(size)
+
+    reader = ColumnarReader(Stream(sink.getvalue()), file_type, chunksize=100)
+    data_frame = pd.concat(reader)
+    assert len(data_frame) == 10
+    assert data_frame["age"].dtype == np.float64
+    assert read_sizes and all(0 < size <= 64 for size in read_sizes)
+
+    spool_file = reader._opened_files[0]
+    reader.close()
+    assert spool_file.closed
+
+
+def test_columnar_reader_invalid_file_type():
+    with pytest.raises(ValueError):
+        ColumnarReader("patient.csv", FileType.CSV, chunksize=10)
@@ -0,0 +1,101 @@
+import json
+from typing import Dict, List
+
+import pytest
+
+from linuxforhealth.csvtofhir.consolidation import SortedEncounterConsolidator, consolidate_encounters
+from linuxforhealth.csvtofhir.fhirrs.converter import convert_to_fhir
+from linuxforhealth.csvtofhir.serialization import OutputFormat
+
+
+def create_condition_record(resource_id: str, code: str, rank: str, category: str = "encounter-diagnosis") -> Dict:
+    return {
+        "configResourceType": "Condition",
+        "patientInternalId": "112233",
+        "encounterInternalId": "encounter_123",
+        "resourceInternalId": resource_id,
+        "assigningAuthority": "urn:id:client",
+        "conditionCategory": category,
+        "conditionCode": code,
+        "conditionCodeSystem": "urn:id:clientcode",
+        "conditionDiagnosisRank": rank,
+        "filePath": "/home/csv/input.csv",
+        "rowNum": int(rank)
+    }
+
+
+@pytest.fixture
+def condition_results() -> List:
+    """Conversion results for three Conditions, and a problem list item, which reference the same Encounter"""
+    records = [create_condition_record("condition.1", "ABC1", "1"),
+               create_condition_record("condition.2", "ABC2", "2"),
+               create_condition_record("condition.3", "ABC3", "3"),
+               create_condition_record("condition.4", "ABC4", "4", "problem-list-item")]
+    return [(None, "112233", convert_to_fhir("112233", r, None, OutputFormat.MODEL)) for r in records]
+
+
+def test_consolidate_encounters(condition_results: List):
+    """Validates that Encounter fragments are merged into a single Encounter returned with the first record"""
+    results = consolidate_encounters(condition_results, OutputFormat.JSON)
+    assert len(results) == 4
+
+    encounters = [json.loads(r) for _, _, resources in results for r in resources if r.resource_type == "Encounter"]
+    assert len(encounters) == 1
+    assert "Encounter" in [r.resource_type for r in results[0][2]]
+
+    encounter = encounters[0]
+    assert [d["condition"]["reference"] for d in encounter["diagnosis"]] == [
+        "Condition/condition.1", "Condition/condition.2", "Condition/condition.3"]
+    assert [r["reference"] for r in encounter["reasonReference"]] == ["Condition/condition.4"]
+
+    conditions = [r for _, _, resources in results for r in resources if r.resource_type == "Condition"]
+    assert len(conditions) == 4
+
+
+def test_consolidate_encounters_model_format(condition_results: List):
+    """Validates that model results are returned as ConvertedResources"""
+    results = consolidate_encounters(condition_results, OutputFormat.MODEL)
+    encounters = [r for _, _, resources in results for r in resources if r.resource_type == "Encounter"]
+    assert len(encounters) == 1
+    assert len(encounters[0].resource.diagnosis) == 3
+
+
+def test_sorted_encounter_consolidator(condition_results: List):
+    """
+    Validates that results are held while their Encounter may be merged, and are returned once the group by key
+    changes
+    """
+    consolidator = SortedEncounterConsolidator(OutputFormat.JSON, max_pending=10)
+    completed = consolidator.add(condition_results[:2])
+    # the second result's Encounter fragment is merged, and the result is returned
+    assert [[r.resource_type for r in resources] for _, _, resources in completed] == [["Condition"]]
+    assert consolidator.has_pending
+
+    completed = consolidator.add(condition_results[2:])
+    assert len(completed) == 2
+    assert consolidator.merged_count == 3
+
+    other_record = create_condition_record("condition.5", "ABC5", "5")
+    other_record["patientInternalId"] = "445566"
+    completed = consolidator.add([(None, "445566", convert_to_fhir("445566", other_record, None, OutputFormat.MODEL))])
+    assert len(completed) == 1
+    encounter = json.loads(next(r for r in completed[0][2] if r.resource_type == "Encounter"))
+    assert len(encounter["diagnosis"]) == 3
+    assert encounter["reasonReference"][0]["reference"] == "Condition/condition.4"
+
+    completed = consolidator.flush()
+    assert [k for _, k, _ in completed] == ["445566"]
+    assert not consolidator.has_pending
+
+
+def test_sorted_encounter_consolidator_max_pending(condition_results: List):
+    """Validates that held results are returned when the bound is exceeded"""
+    records = [create_condition_record(f"condition.{n}", f"ABC{n}", str(n)) for n in range(1, 4)]
+    for n, record in enumerate(records):
+        record["encounterInternalId"] = f"encounter_{n}"
+    results = [(None, "112233", convert_to_fhir("112233", r, None, OutputFormat.MODEL)) for r in records]
+
+    consolidator = SortedEncounterConsolidator(OutputFormat.MODEL, max_pending=1)
+    assert consolidator.add(results[:1]) == []
+    assert len(consolidator.add(results[1:])) == 2
+    assert len(consolidator.flush()) == 1
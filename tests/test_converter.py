@@ -1,7 +1,16 @@
+import asyncio
+import bz2
+import gzip
+import io
 import json
+import threading
+import zipfile
 from datetime import datetime, timezone
-from typing import Dict
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
 
+import pandas as pd
 import pytest
 from deepdiff import DeepDiff
 from fhir.resources.meta import Meta
@@ -12,9 +21,10 @@ from pydantic import ValidationError
 from linuxforhealth.csvtofhir import converter
 from linuxforhealth.csvtofhir.config import ConverterConfig, get_converter_config
 from linuxforhealth.csvtofhir.converter import (ConverterDefinitionLookupException,
-                                                build_csv_reader_params, convert, transform,
+                                                build_csv_reader_params, convert, convert_stream, transform,
                                                 load_data_contract, validate_contract)
 from linuxforhealth.csvtofhir.model.contract import DataContract
+from linuxforhealth.csvtofhir.serialization import ConvertedResource, OutputFormat
 
 
 def raise_value_error(*args, **kwargs):
@@ -22,6 +32,17 @@ def raise_value_error(*args, **kwargs):
     raise ValueError("test exception")
 
 
+def create_condition_csv(row_count: int) -> str:
+    """
+    Creates Condition CSV content, with a row for each patient P1 to P<row_count>.
+
+    :param row_count: The number of rows
+    :return: the CSV content
+    """
+    return "\n".join(["patientInternalId,resourceInternalId,conditionCode"] +
+                     [f"P{n},C{n},A{n}" for n in range(1, row_count + 1)])
+
+
 @pytest.fixture
 def code_mapping() -> Dict[str, Dict[str, str]]:
     return {
@@ -181,6 +202,7 @@ def patient_dict_with_regex_filename() -> Dict:
 @pytest.fixture(autouse=True)
 def clear_config_cache():
     get_converter_config.cache_clear()
+    converter._load_file_data_contract.cache_clear()
 
 
 def test_validate_contract_file_not_found_error(monkeypatch, data_contract_directory: str):
@@ -522,6 +544,17 @@ def test_build_csv_reader_params(data_contract_model: DataContract):
     assert params["na_values"] == ["empty", "\\n"]
 
 
+def test_build_csv_reader_params_memory_map(data_contract_model: DataContract):
+    """
+    Tests that the CSV reader memory maps files when csv_memory_map is enabled
+
+    :param data_contract_model: The DataContract model fixture
+    """
+    file_definition = data_contract_model.fileDefinitions["Patient"]
+    params = build_csv_reader_params(ConverterConfig(csv_memory_map=True), data_contract_model.general, file_definition)
+    assert params["memory_map"] is True
+
+
 def test_build_csv_reader_params_include_headers(data_contract_with_headers_data: DataContract):
     """
     Tests build CSV reader parameters
@@ -581,3 +614,558 @@ def test_build_csv_reader_params_include_skiprows(data_contract_with_skiprows_mo
     assert params["dtype"] == str
     assert params["na_values"] == ["empty", "\\n"]
     assert params["skiprows"] == [2,3]
+
+
+@pytest.mark.parametrize(
+    "output_format,expected_type",
+    [
+        ("dict", dict),
+        ("model", Patient),
+        ("bytes", bytes)
+    ],
+)
+def test_convert_patient_output_format(data_contract_directory: str,
+                                       monkeypatch,
+                                       csv_directory: str,
+                                       output_format: str,
+                                       expected_type: type):
+    """
+    Validates that convert returns ConvertedResources for non-JSON output formats.
+
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param csv_directory: The CSV directory path
+    :param output_format: The requested output format
+    :param expected_type: The expected type of the converted resource
+    """
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    csv_file_path = f"{csv_directory}/Patient.csv"
+
+    records = [(e, k, r) for e, k, r in convert(csv_file_path, output_format)]
+    assert len(records) == 1
+
+    exception, group_by_key, resources = records[0]
+    assert exception is None
+    assert len(resources) == 1
+
+    converted_resource: ConvertedResource = resources[0]
+    assert isinstance(converted_resource, ConvertedResource)
+    assert isinstance(converted_resource.resource, expected_type)
+    assert converted_resource.resource_type == "Patient"
+    assert converted_resource.id == "MRN1234"
+    assert converted_resource.row_num == 1
+    assert converted_resource.group_by_key == group_by_key
+    assert len(converted_resource.meta["extension"]) > 0
+
+
+def test_convert_model_output_meta(tmp_path, condition_contract_directory: str):
+    """
+    Validates that resources returned in the model output format have their own Meta, with the source row number.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    """
+    rows = ["patientInternalId,resourceInternalId,conditionCode", "P1,C1,A1", "P1,C2,A2", "P2,C3,A3"]
+    csv_path = tmp_path / "condition.csv"
+    csv_path.write_text("\n".join(rows))
+
+    conditions = [r.resource for _, _, resources in convert(str(csv_path), OutputFormat.MODEL) for r in resources
+                  if r.resource_type == "Condition"]
+    source_file_ids = [c.meta.extension[1].valueString for c in conditions]
+    assert source_file_ids == [f"condition.csv:{str(n).zfill(5)}" for n in range(1, 4)]
+
+
+def test_convert_invalid_output_format(data_contract_directory: str, monkeypatch, csv_directory: str):
+    """
+    Validates that an unsupported output format raises a ValueError
+
+    :param data_contract_directory: The data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param csv_directory: The CSV directory path
+    """
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    with pytest.raises(ValueError):
+        next(convert(f"{csv_directory}/Patient.csv", "xml"))
+
+
+@pytest.mark.parametrize("consolidation_mode,expected_encounters", [("none", 5), ("chunk", 4), ("sorted", 2)])
+def test_convert_encounter_consolidation(tmp_path,
+                                         condition_contract_directory: str,
+                                         monkeypatch,
+                                         consolidation_mode: str,
+                                         expected_encounters: int):
+    """
+    Validates that Encounter fragments created for Condition records are consolidated within a chunk, or across
+    chunks when the input is sorted.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param consolidation_mode: The encounter consolidation mode
+    :param expected_encounters: The expected number of Encounter resources
+    """
+    rows = ["patientInternalId,encounterInternalId,resourceInternalId,conditionCategory,conditionCode," +
+            "conditionDiagnosisRank",
+            "P1,E1,C1,encounter-diagnosis,A1,1",
+            "P1,E1,C2,encounter-diagnosis,A2,2",
+            "P1,E1,C3,encounter-diagnosis,A3,3",
+            "P2,E2,C4,encounter-diagnosis,A4,1",
+            "P2,E2,C5,encounter-diagnosis,A5,2"]
+    csv_path = tmp_path / "condition.csv"
+    csv_path.write_text("\n".join(rows))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+    monkeypatch.setenv("ENCOUNTER_CONSOLIDATION", consolidation_mode)
+
+    records = list(convert(str(csv_path)))
+    assert len(records) == 5
+    assert all(e is None for e, _, _ in records)
+
+    encounters = [json.loads(r) for _, _, resources in records for r in resources if r.resource_type == "Encounter"]
+    assert len(encounters) == expected_encounters
+    assert sum(len(e["diagnosis"]) for e in encounters) == 5
+
+    conditions = [r for _, _, resources in records for r in resources if r.resource_type == "Condition"]
+    # results which hold an Encounter are returned after the other results for their group by key in sorted mode
+    source_file_ids = sorted(c.meta["extension"][1]["valueString"] for c in conditions)
+    assert source_file_ids == [f"condition.csv:{str(n).zfill(5)}" for n in range(1, 6)]
+
+
+@pytest.mark.parametrize("consolidation_mode", ["chunk", "sorted"])
+def test_convert_encounter_consolidation_dedup(tmp_path,
+                                               condition_contract_directory: str,
+                                               monkeypatch,
+                                               consolidation_mode: str):
+    """
+    Validates that the dedup index does not suppress Encounter fragments before they are consolidated, when
+    resources are deduplicated without a content hash.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param consolidation_mode: The encounter consolidation mode
+    """
+    rows = ["patientInternalId,encounterInternalId,resourceInternalId,conditionCategory,conditionCode," +
+            "conditionDiagnosisRank",
+            "P1,E1,C1,encounter-diagnosis,A1,1",
+            "P1,E1,C2,encounter-diagnosis,A2,2",
+            "P1,E1,C3,encounter-diagnosis,A3,3"]
+    csv_path = tmp_path / "condition.csv"
+    csv_path.write_text("\n".join(rows))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "3")
+    monkeypatch.setenv("ENCOUNTER_CONSOLIDATION", consolidation_mode)
+    monkeypatch.setenv("DEDUP_SCOPE", "run")
+    monkeypatch.setenv("DEDUP_CONTENT_HASH", "false")
+
+    records = list(convert(str(csv_path)))
+    assert all(e is None for e, _, _ in records)
+
+    encounters = [json.loads(r) for _, _, resources in records for r in resources if r.resource_type == "Encounter"]
+    assert len(encounters) == 1
+    assert len(encounters[0]["diagnosis"]) == 3
+
+
+def test_transform_multiple_rows(tmp_path, write_data_contract: Callable[[Dict], str], monkeypatch):
+    """
+    Validates that transform returns a JSON record, with its group by key, for each row across chunks.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param write_data_contract: The data contract writer fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    write_data_contract({"Patient": {"resourceType": "Patient", "groupByKey": "patientId", "tasks": []}})
+    rows = ["patientId,givenName,note",
+            "MRN1,Ann,plain",
+            'MRN2,Bob,"line one\nline two"',
+            "MRN3,Cal,"]
+    csv_path = tmp_path / "patient.csv"
+    csv_path.write_text("\n".join(rows))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+
+    records = [(e, k, r) for e, k, r in transform(str(csv_path))]
+    assert [k for _, k, _ in records] == ["MRN1", "MRN2", "MRN3"]
+
+    data = [json.loads(r) for _, _, r in records]
+    assert [d["rowNum"] for d in data] == [1, 2, 3]
+    assert data[1]["note"] == "line one\nline two"
+    assert data[2]["note"] is None
+
+
+def test_convert_change_capture(tmp_path, change_capture_contract_directory: str, monkeypatch):
+    """
+    Validates that only new and changed rows are converted when a full extract is re-delivered.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param change_capture_contract_directory: The change capture data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    rows = ["patientInternalId,patientSourceRecordId,givenName",
+            "P1,R1,Ann",
+            "P2,R2,Bob",
+            "P3,R3,Cal"]
+    csv_path = tmp_path / "patient.csv"
+    csv_path.write_text("\n".join(rows))
+
+    monkeypatch.setenv("CHANGE_CAPTURE_DIRECTORY", str(tmp_path / "fingerprints"))
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+
+    assert [k for _, k, _ in convert(str(csv_path))] == ["P1", "P2", "P3"]
+    assert (tmp_path / "fingerprints" / "Patient.fingerprints128").exists()
+
+    rows[2] = "P2,R2,Robert"
+    csv_path.write_text("\n".join(rows + ["P4,R4,Dee"]))
+    records = list(convert(str(csv_path)))
+    assert [k for _, k, _ in records] == ["P2", "P4"]
+
+    assert list(convert(str(csv_path))) == []
+
+
+def test_convert_change_capture_failed_rows(tmp_path, change_capture_contract_directory: str, monkeypatch):
+    """
+    Validates that rows which fail to convert are not fingerprinted, and are converted again by the next run.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param change_capture_contract_directory: The change capture data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    csv_path = tmp_path / "patient.csv"
+    csv_path.write_text("\n".join(["patientInternalId,patientSourceRecordId,givenName", "P1,R1,Ann", "P2,R2,Bob"]))
+
+    monkeypatch.setenv("CHANGE_CAPTURE_DIRECTORY", str(tmp_path / "fingerprints"))
+
+    convert_to_fhir = converter.convert_to_fhir
+
+    def fail_p2(group_by_key, *args):
+        if group_by_key == "P2":
+            raise ValueError("conversion failed")
+        return convert_to_fhir(group_by_key, *args)
+
+    with monkeypatch.context() as m:
+        m.setattr(converter, "convert_to_fhir", fail_p2)
+        records = list(convert(str(csv_path)))
+    assert [(k, e is None) for e, k, _ in records] == [("P1", True), ("P2", False)]
+
+    assert [(k, e is None) for e, k, _ in convert(str(csv_path))] == [("P2", True)]
+    assert list(convert(str(csv_path))) == []
+
+
+def test_convert_checkpoint_resume(tmp_path, condition_contract_directory: str, monkeypatch):
+    """
+    Validates that checkpoints are reported every checkpoint interval, and that a resumed conversion skips the rows
+    which were emitted while preserving source row numbers.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    rows = ["patientInternalId,resourceInternalId,conditionCode,conditionCodeText",
+            'P1,C1,A1,"first\nline"',
+            "P1,C2,A2,second",
+            'P2,C3,A3,"third\nline"',
+            "P2,C4,A4,fourth",
+            "P3,C5,A5,fifth",
+            "P3,C6,A6,sixth",
+            "P4,C7,A7,seventh"]
+    csv_path = tmp_path / "condition.csv"
+    csv_path.write_text("\n".join(rows))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+    monkeypatch.setenv("CHECKPOINT_INTERVAL", "2")
+
+    def get_source_file_ids(records):
+        return [r.meta["extension"][1]["valueString"] for _, _, resources in records for r in resources
+                if r.resource_type == "Condition"]
+
+    checkpoints = []
+    records = list(convert(str(csv_path), checkpoint_callback=checkpoints.append))
+    assert checkpoints == [4]
+    assert len(get_source_file_ids(records)) == 7
+
+    resumed_records = list(convert(str(csv_path), start_row=4))
+    assert [k for _, k, _ in resumed_records] == ["P3", "P3", "P4"]
+    assert get_source_file_ids(resumed_records) == [f"condition.csv:{str(n).zfill(5)}" for n in range(5, 8)]
+
+
+@pytest.mark.parametrize("lines,skiprows,expected_skiprows", [
+    (["id,name", "1,a", "2,b", "3,c", "4,d"], None, 4),
+    (["comment", "id,name", "1,a", "2,b", "3,c", "4,d"], 1, 5),
+    (["comment", "id,name", "comment", "1,a", "2,b", "3,c", "4,d"], [0, 2], [0, 1, 2, 3, 4, 5])
+])
+def test_build_resume_params(tmp_path, lines, skiprows, expected_skiprows):
+    """
+    Validates that resume parameters skip the emitted data rows after the header row.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param lines: The source file lines
+    :param skiprows: The file definition skiprows setting
+    :param expected_skiprows: The expected reader skiprows parameter
+    """
+    csv_path = tmp_path / "patient.csv"
+    csv_path.write_text("\n".join(lines))
+
+    params = {"chunksize": 2, "delimiter": ","}
+    if skiprows is not None:
+        params["skiprows"] = skiprows
+
+    resume_params = converter._build_resume_params(pd.read_csv, str(csv_path), params, 3)
+    assert resume_params["names"] == ["id", "name"]
+    assert resume_params["skiprows"] == expected_skiprows
+
+    with pd.read_csv(str(csv_path), **resume_params) as reader:
+        assert list(pd.concat(reader)["id"]) == [4]
+
+
+def test_aconvert(tmp_path, condition_contract_directory: str, monkeypatch):
+    """
+    Validates that aconvert returns the same results as convert, and stops converting when the consumer stops.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    csv_path = tmp_path / "condition.csv"
+    csv_path.write_text(create_condition_csv(20))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "3")
+
+    async def collect(limit=None):
+        results = []
+        async for result in converter.aconvert(str(csv_path), OutputFormat.DICT, prefetch_batches=1):
+            results.append(result)
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    results = asyncio.run(collect())
+    assert [k for _, k, _ in results] == [f"P{n}" for n in range(1, 21)]
+    assert [len(r) for _, _, r in results] == [len(r) for _, _, r in convert(str(csv_path), OutputFormat.DICT)]
+
+    assert len(asyncio.run(collect(limit=4))) == 4
+
+    async def collect_stream():
+        return [r async for r in converter.aconvert(csv_path.read_bytes(), logical_name="condition.csv")]
+
+    assert [k for _, k, _ in asyncio.run(collect_stream())] == [f"P{n}" for n in range(1, 21)]
+
+    (tmp_path / "unknown.csv").write_text("a,b\n1,2")
+    with pytest.raises(ConverterDefinitionLookupException):
+        asyncio.run(converter.aconvert(str(tmp_path / "unknown.csv")).__anext__())
+
+
+@pytest.mark.parametrize("stream_type", ["bytes", "binary", "text", "chunks"])
+def test_convert_stream(condition_contract_directory: str, monkeypatch, stream_type: str):
+    """
+    Validates that streams are converted with the logical name used for definition matching and Meta.
+
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param stream_type: The stream source type
+    """
+    content = create_condition_csv(5)
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+
+    stream = {"bytes": content.encode(),
+              "binary": io.BytesIO(content.encode()),
+              "text": io.StringIO(content),
+              "chunks": (content[i:i + 7].encode() for i in range(0, len(content), 7))}[stream_type]
+    records = list(convert_stream(stream, "2022-01-01-condition.csv", OutputFormat.DICT))
+
+    assert [k for _, k, _ in records] == [f"P{n}" for n in range(1, 6)]
+    conditions = [r for _, _, resources in records for r in resources if r.resource_type == "Condition"]
+    assert [c.meta["extension"][1]["valueString"] for c in conditions] == \
+        [f"2022-01-01-condition.csv:{str(n).zfill(5)}" for n in range(1, 6)]
+
+    with pytest.raises(ConverterDefinitionLookupException):
+        list(convert_stream(content.encode(), "unknown.csv"))
+
+
+@pytest.mark.parametrize("prefetch_buffer_size", ["0", "16"])
+def test_convert_remote_file(tmp_path, condition_contract_directory: str, monkeypatch, prefetch_buffer_size: str):
+    """
+    Validates that remote source files are converted, with and without read-ahead.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param prefetch_buffer_size: The read-ahead buffer size
+    """
+    (tmp_path / "2022-01-01-condition.csv").write_text(create_condition_csv(50))
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "7")
+    monkeypatch.setenv("PREFETCH_BUFFER_SIZE", prefetch_buffer_size)
+    monkeypatch.setattr(SimpleHTTPRequestHandler, "log_message", lambda *args: None)
+    remote_files = []
+    open_remote_file = converter._open_remote_file
+    monkeypatch.setattr(converter, "_open_remote_file", lambda p: remote_files.append(open_remote_file(p)) or
+                        remote_files[-1])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/2022-01-01-condition.csv"
+        records = list(convert(url, OutputFormat.DICT))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [k for _, k, _ in records] == [f"P{n}" for n in range(1, 51)]
+    assert (remote_files[0] is not None) == (prefetch_buffer_size != "0")
+    assert remote_files[0] is None or remote_files[0].closed
+
+
+@pytest.mark.parametrize("file_name", ["2022-01-01-condition.csv.gz", "2022-01-01-condition.csv.bz2",
+                                       "2022-01-01-condition.zip"])
+def test_convert_compressed_file(tmp_path, condition_contract_directory: str, monkeypatch, file_name: str):
+    """
+    Validates that compressed source files are decompressed based on their extension.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param file_name: The compressed source file name
+    """
+    content = create_condition_csv(5).encode()
+
+    file_path = tmp_path / file_name
+    if file_name.endswith(".gz"):
+        # a multi-member gzip file, as written by parallel compressors
+        file_path.write_bytes(gzip.compress(content[:40]) + gzip.compress(content[40:]))
+    elif file_name.endswith(".bz2"):
+        file_path.write_bytes(bz2.compress(content))
+    else:
+        with zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("2022-01-01-condition.csv", content)
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "2")
+
+    records = list(convert(str(file_path), OutputFormat.DICT))
+    assert [k for _, k, _ in records] == [f"P{n}" for n in range(1, 6)]
+
+
+@pytest.mark.parametrize("archive_max_workers", ["1", "4"])
+def test_convert_archive_members(tmp_path,
+                                 write_data_contract: Callable[[Dict], str],
+                                 monkeypatch,
+                                 archive_max_workers: str):
+    """
+    Validates that each zip archive member is matched to its own FileDefinition, and that members which do not match
+    a FileDefinition are skipped.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param write_data_contract: The data contract writer fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param archive_max_workers: The maximum number of members converted in parallel
+    """
+    write_data_contract({"Condition": {"resourceType": "Condition", "groupByKey": "patientInternalId", "tasks": []},
+                         "Diagnosis": {"resourceType": "Condition", "groupByKey": "patientInternalId", "tasks": []}})
+
+    file_path = tmp_path / "vendor-extract.zip"
+    header = "patientInternalId,resourceInternalId,conditionCode"
+    with zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("extract/condition.csv", "\n".join([header] + [f"P{n},C{n},A{n}" for n in range(1, 21)]))
+        archive.writestr("extract/diagnosis.csv", "\n".join([header] + [f"P{n},D{n},B{n}" for n in range(1, 11)]))
+        archive.writestr("extract/readme.txt", "vendor extract")
+        archive.writestr("__MACOSX/extract/._condition.csv", "")
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "3")
+    monkeypatch.setenv("ARCHIVE_MAX_WORKERS", archive_max_workers)
+
+    records = list(convert(str(file_path), OutputFormat.DICT))
+    resources = [r for _, _, resources in records for r in resources]
+    conditions = [r for r in resources if r.resource_type == "Condition"]
+
+    assert sorted(c.id for c in conditions) == sorted([f"C{n}" for n in range(1, 21)] + [f"D{n}" for n in range(1, 11)])
+    source_files = {c.id[0]: c.meta["extension"][1]["valueString"].split(":")[0] for c in conditions}
+    assert source_files == {"C": "condition.csv", "D": "diagnosis.csv"}
+
+    with pytest.raises(ValueError):
+        list(convert(str(file_path), start_row=5))
+
+    with zipfile.ZipFile(tmp_path / "readme.zip", "w") as archive:
+        archive.writestr("readme.txt", "vendor extract")
+    with pytest.raises(ConverterDefinitionLookupException):
+        list(convert(str(tmp_path / "readme.zip")))
+
+
+@pytest.mark.parametrize("file_type, file_name", [("parquet", "2022-01-01-condition.parquet"),
+                                                  ("arrow", "2022-01-01-condition.feather")])
+def test_convert_columnar_file(tmp_path,
+                               write_data_contract: Callable[[Dict], str],
+                               monkeypatch,
+                               file_type: str,
+                               file_name: str):
+    """
+    Validates that parquet and arrow source files are converted using the task pipeline, reading the header columns.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param write_data_contract: The data contract writer fixture
+    :param monkeypatch: The monkeypatch fixture
+    :param file_type: The FileDefinition fileType
+    :param file_name: The source file name
+    """
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    feather = pytest.importorskip("pyarrow.feather")
+
+    write_data_contract({
+        "Condition": {
+            "fileType": file_type,
+            "resourceType": "Condition",
+            "groupByKey": "patientInternalId",
+            "headers": ["patientInternalId", "resourceInternalId", "code"],
+            "tasks": [{"name": "rename_columns", "params": {"column_map": {"code": "conditionCode"}}}]
+        }
+    })
+    table = pa.table({"patientInternalId": [f"P{n}" for n in range(1, 11)],
+                      "resourceInternalId": [f"C{n}" for n in range(1, 11)],
+                      "code": [f"A{n}" for n in range(1, 11)],
+                      "notes": ["unused"] * 10})
+    if file_type == "parquet":
+        pq.write_table(table, tmp_path / file_name, row_group_size=4)
+    else:
+        feather.write_feather(table, str(tmp_path / file_name), chunksize=4)
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "3")
+
+    records = list(convert(str(tmp_path / file_name), OutputFormat.DICT))
+    assert [k for _, k, _ in records] == [f"P{n}" for n in range(1, 11)]
+    conditions = [r for _, _, resources in records for r in resources]
+    assert [c.resource["code"]["coding"][0]["code"] for c in conditions] == [f"A{n}" for n in range(1, 11)]
+    assert conditions[0].meta["extension"][1]["valueString"] == f"{file_name}:00001"
+
+    resumed_records = list(convert(str(tmp_path / file_name), OutputFormat.DICT, start_row=6))
+    assert [k for _, k, _ in resumed_records] == [f"P{n}" for n in range(7, 11)]
+    resumed_conditions = [r for _, _, resources in resumed_records for r in resources]
+    assert resumed_conditions[0].meta["extension"][1]["valueString"] == f"{file_name}:00007"
+
+
+def test_convert_memory_map(tmp_path, condition_contract_directory: str, monkeypatch):
+    """
+    Validates that local files are converted and resumed with memory mapped reads, and that streams are not mapped.
+
+    :param tmp_path: The pytest tmp_path fixture
+    :param condition_contract_directory: The Condition data contract directory fixture
+    :param monkeypatch: The monkeypatch fixture
+    """
+    content = create_condition_csv(10)
+    (tmp_path / "2022-01-01-condition.csv").write_text(content)
+
+    monkeypatch.setenv("CSV_BUFFER_SIZE", "3")
+    monkeypatch.setenv("CSV_MEMORY_MAP", "true")
+
+    reader_params = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(pd, "read_csv",
+                        lambda *args, **kwargs: reader_params.append(kwargs) or read_csv(*args, **kwargs))
+
+    records = list(convert(str(tmp_path / "2022-01-01-condition.csv"), OutputFormat.DICT, start_row=4))
+    assert [k for _, k, _ in records] == [f"P{n}" for n in range(5, 11)]
+    assert all(p["memory_map"] for p in reader_params)
+
+    reader_params.clear()
+    records = list(convert_stream(io.BytesIO(content.encode()), "2022-01-01-condition.csv", OutputFormat.DICT))
+    assert len(records) == 10
+    assert "memory_map" not in reader_params[0]
@@ -0,0 +1,91 @@
+import pytest
+from fhir.resources.encounter import Encounter
+from fhir.resources.location import Location
+from fhir.resources.practitioner import Practitioner
+
+from linuxforhealth.csvtofhir.config import ConverterConfig
+from linuxforhealth.csvtofhir.dedup import DedupIndex, DedupScope, create_dedup_index
+
+
+@pytest.fixture
+def practitioner() -> Practitioner:
+    return Practitioner.construct(id="ABCDEF", meta={"versionId": "1"})
+
+
+def test_dedup_run_scope(practitioner: Practitioner):
+    """Validates that referenced resources are emitted once per run, regardless of group key or meta"""
+    dedup_index = DedupIndex(scope=DedupScope.RUN)
+    assert not dedup_index.is_duplicate("patient-1", practitioner)
+    assert dedup_index.is_duplicate("patient-2", practitioner)
+
+    other_meta = Practitioner.construct(id="ABCDEF", meta={"versionId": "2"})
+    assert dedup_index.is_duplicate("patient-2", other_meta)
+
+    assert dedup_index.suppressed == 2
+    assert dedup_index.suppressed_by_type == {"Practitioner": 2}
+
+
+def test_dedup_group_scope(practitioner: Practitioner):
+    """Validates that referenced resources are emitted once per group key"""
+    dedup_index = DedupIndex(scope=DedupScope.GROUP)
+    assert not dedup_index.is_duplicate("patient-1", practitioner)
+    assert dedup_index.is_duplicate("patient-1", practitioner)
+    assert not dedup_index.is_duplicate("patient-2", practitioner)
+    assert dedup_index.suppressed == 1
+
+
+def test_dedup_content_hash():
+    """Validates that resources sharing an id with different content are only suppressed without content hashing"""
+    first = Location.construct(id="LOC1", name="Clinic")
+    second = Location.construct(id="LOC1", name="Clinic, 2nd floor")
+
+    dedup_index = DedupIndex(content_hash=True)
+    assert not dedup_index.is_duplicate("patient-1", first)
+    assert not dedup_index.is_duplicate("patient-1", second)
+
+    dedup_index = DedupIndex(content_hash=False)
+    assert not dedup_index.is_duplicate("patient-1", first)
+    assert dedup_index.is_duplicate("patient-1", second)
+
+
+@pytest.mark.parametrize("content_hash", [True, False])
+def test_dedup_encounter_fragments(content_hash: bool):
+    """Validates that Encounter fragments sharing an id are keyed on their content, so they are not suppressed"""
+    first = Encounter.construct(id="EZ100", status="finished", reasonReference=[{"reference": "Condition/1"}])
+    second = Encounter.construct(id="EZ100", status="finished", reasonReference=[{"reference": "Condition/2"}])
+
+    dedup_index = DedupIndex(content_hash=content_hash)
+    assert not dedup_index.is_duplicate("patient-1", first)
+    assert not dedup_index.is_duplicate("patient-1", second)
+    assert dedup_index.is_duplicate("patient-1", first)
+
+
+def test_dedup_filter(practitioner: Practitioner):
+    """Validates that the primary resource type and ineligible resource types are not filtered"""
+    dedup_index = DedupIndex(resource_types=["Practitioner", "Location"])
+    location = Location.construct(id="LOC1")
+    resources = [practitioner, location, Location.construct(id="LOC1")]
+
+    assert dedup_index.filter("patient-1", resources) == [practitioner, location]
+    assert dedup_index.filter("patient-1", resources, "Location") == resources[1:]
+    assert dedup_index.filter("patient-1", [Location.construct()]) != []
+
+
+def test_dedup_max_entries():
+    """Validates that the index is bounded, evicting the least recently used entries"""
+    dedup_index = DedupIndex(max_entries=2)
+    for resource_id in ["A", "B", "C"]:
+        dedup_index.is_duplicate("patient-1", Practitioner.construct(id=resource_id))
+
+    assert len(dedup_index) == 2
+    assert not dedup_index.is_duplicate("patient-1", Practitioner.construct(id="A"))
+    assert dedup_index.is_duplicate("patient-1", Practitioner.construct(id="C"))
+
+
+def test_create_dedup_index():
+    assert create_dedup_index(ConverterConfig()) is None
+    assert create_dedup_index(ConverterConfig(dedup_scope="run")).scope == DedupScope.RUN
+    assert create_dedup_index(ConverterConfig(dedup_scope="run"), "group").scope == DedupScope.GROUP
+
+    with pytest.raises(ValueError):
+        create_dedup_index(ConverterConfig(dedup_scope="file"))
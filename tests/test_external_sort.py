@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from linuxforhealth.csvtofhir.external_sort import ExternalGroupSort
+
+
+@pytest.mark.parametrize("buffer_records,max_merge_files", [(1000, 64), (3, 64), (2, 2)])
+def test_external_group_sort(tmp_path, buffer_records: int, max_merge_files: int):
+    """Validates that records are grouped by key, in the order they were added, with and without sort runs"""
+    records = [(f"patient-{i % 4}", i) for i in range(20)]
+
+    with ExternalGroupSort(buffer_records, str(tmp_path), max_merge_files) as sorter:
+        for key, value in records:
+            sorter.add(key, value)
+
+        groups = list(sorter.groups())
+        assert sorter.record_count == 20
+        assert sorter.run_count <= max_merge_files
+
+    assert [k for k, _ in groups] == ["patient-0", "patient-1", "patient-2", "patient-3"]
+    for i, (_, values) in enumerate(groups):
+        assert values == list(range(i, 20, 4))
+
+    # run files are removed
+    assert os.listdir(tmp_path) == []
+
+
+def test_external_group_sort_empty(tmp_path):
+    with ExternalGroupSort(temp_dir=str(tmp_path)) as sorter:
+        assert list(sorter.groups()) == []
+
+
+def test_external_group_sort_invalid():
+    with pytest.raises(ValueError):
+        ExternalGroupSort(buffer_records=0)
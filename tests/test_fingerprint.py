@@ -0,0 +1,133 @@
+import pandas as pd
+import pytest
+
+from linuxforhealth.csvtofhir import fingerprint
+from linuxforhealth.csvtofhir.fingerprint import FINGERPRINT_DTYPE, RowFingerprintStore, hash_rows
+
+
+@pytest.fixture
+def data_frame() -> pd.DataFrame:
+    return pd.DataFrame({"groupByKey": ["P1", "P2", "P3"],
+                         "patientSourceRecordId": ["R1", "R2", "R3"],
+                         "givenName": ["Ann", "Bob", "Cal"],
+                         "codes": [["A"], ["B", "C"], None],
+                         "rowNum": [1, 2, 3],
+                         "filePath": ["/data/2022-01-01-patient.csv"] * 3})
+
+
+def test_hash_rows(data_frame: pd.DataFrame):
+    """Validates that row hashes exclude the row number and file path"""
+    keys, digests = hash_rows(data_frame, "patientSourceRecordId")
+    assert len(set(keys)) == 3
+
+    redelivered = data_frame.copy()
+    redelivered["rowNum"] = [10, 11, 12]
+    redelivered["filePath"] = "/data/2022-01-02-patient.csv"
+    redelivered.loc[1, "givenName"] = "Robert"
+
+    redelivered_keys, redelivered_digests = hash_rows(redelivered, "patientSourceRecordId")
+    assert list(redelivered_keys) == list(keys)
+    assert [a == b for a, b in zip(digests, redelivered_digests)] == [True, False, True]
+
+
+def test_hash_rows_separator():
+    """Validates that row hashes identify values which contain the value separator"""
+    data_frame = pd.DataFrame({"groupByKey": ["P1", "P1", "P1", "P1", "P1"],
+                               "a": ["x\x1fy", "x", "x\x1e", "x", "x"],
+                               "b": ["z", "y\x1fz", "y", "\x1ey", "y"]})
+    keys, digests = hash_rows(data_frame)
+    assert len(set(digests)) == 5
+    assert len(set(keys)) == 5
+
+    # rows without separators are hashed the same way in every chunk
+    assert hash_rows(data_frame.iloc[[4]])[1][0] == digests[4]
+
+
+def test_row_fingerprint_store(tmp_path, data_frame: pd.DataFrame):
+    """Validates that only new and changed rows are returned for a re-delivered extract"""
+    store_path = str(tmp_path / "Patient.fingerprints")
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    changed = store.filter_changed(data_frame)
+    assert len(changed) == 3
+    store.commit(changed.index)
+    store.save()
+    assert len(store) == 3
+    assert (tmp_path / "Patient.fingerprints").stat().st_size == 3 * FINGERPRINT_DTYPE.itemsize
+
+    new_row = pd.DataFrame({"groupByKey": ["P4"],
+                            "patientSourceRecordId": ["R4"],
+                            "givenName": ["Dee"],
+                            "codes": [None],
+                            "rowNum": [4],
+                            "filePath": ["/data/2022-01-02-patient.csv"]})
+    redelivered = pd.concat([data_frame, new_row]).reset_index(drop=True)
+    redelivered.loc[0, "givenName"] = "Anne"
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    changed = store.filter_changed(redelivered)
+    assert list(changed["groupByKey"]) == ["P1", "P4"]
+    assert (store.new_rows, store.changed_rows, store.unchanged_rows) == (1, 1, 2)
+    store.commit(changed.index)
+    store.save()
+    assert len(store) == 4
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    assert store.filter_changed(redelivered).empty
+
+
+def test_row_fingerprint_store_without_record_id(tmp_path, data_frame: pd.DataFrame):
+    """Validates that changed rows are detected as new rows without a record id field"""
+    store = RowFingerprintStore(str(tmp_path / "Patient.fingerprints"))
+    store.commit(store.filter_changed(data_frame).index)
+    store.save()
+
+    data_frame.loc[2, "givenName"] = "Cy"
+    store = RowFingerprintStore(str(tmp_path / "Patient.fingerprints"))
+    assert list(store.filter_changed(data_frame)["groupByKey"]) == ["P3"]
+    assert store.new_rows == 1
+
+
+def test_row_fingerprint_store_uncommitted_rows(tmp_path, data_frame: pd.DataFrame):
+    """Validates that only committed rows are recorded, so that rows which failed are returned again"""
+    store_path = str(tmp_path / "Patient.fingerprints")
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    changed = store.filter_changed(data_frame)
+    store.commit(changed.index[[0, 2]])
+    store.save()
+    assert len(store) == 2
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    assert list(store.filter_changed(data_frame)["groupByKey"]) == ["P2"]
+
+
+def test_row_fingerprint_store_merge(tmp_path, monkeypatch):
+    """Validates that updates are merged into the store file one block at a time"""
+    monkeypatch.setattr(fingerprint, "MERGE_BLOCK_SIZE", 3)
+    store_path = str(tmp_path / "Patient.fingerprints")
+
+    def create_data_frame(record_ids, given_name):
+        return pd.DataFrame({"groupByKey": record_ids,
+                             "patientSourceRecordId": record_ids,
+                             "givenName": given_name})
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    initial = create_data_frame([f"R{i}" for i in range(10)], "Ann")
+    store.commit(store.filter_changed(initial).index)
+    store.save()
+    assert len(store) == 10
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    updated = create_data_frame([f"R{i}" for i in range(0, 20, 2)], "Bob")
+    changed = store.filter_changed(updated)
+    assert (store.new_rows, store.changed_rows) == (5, 5)
+    store.commit(changed.index)
+    store.save()
+    assert len(store) == 15
+    keys = store._fingerprints["key"]
+    assert (keys[1:] > keys[:-1]).all()
+
+    store = RowFingerprintStore(store_path, "patientSourceRecordId")
+    assert store.filter_changed(updated).empty
+    assert list(store.filter_changed(initial)["groupByKey"]) == [f"R{i}" for i in range(0, 10, 2)]
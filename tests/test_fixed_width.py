@@ -0,0 +1,77 @@
+import io
+from typing import Dict
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from linuxforhealth.csvtofhir.fixed_width import FixedWidthReader, read_fixed_width
+
+FIXED_WIDTH_DATA = "\n".join([
+    "MRN1  Doe   12 x",
+    "   ",
+    "",
+    "MRN2  Bösch 3  y",
+    "\tMRN3",
+    "NA    NULL      ",
+    "  MRN4  Ng  45  zzzz",
+    "MRN5",
+    "\"Q\"   n/a   ab\r",
+    "MRN6  \t     "
+])
+
+READER_PARAMS = {"widths": [6, 6, 4], "names": ["mrn", "name", "code"], "header": None, "dtype": str}
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+@pytest.mark.parametrize("params", [
+    {},
+    {"skiprows": 3},
+    {"skiprows": [0, 2, 4]},
+    {"na_values": ["zz", "ab"]}
+])
+def test_fixed_width_reader(chunksize: int, params: Dict):
+    """
+    Validates that FixedWidthReader returns the same chunks as pandas.read_fwf
+
+    :param chunksize: The reader chunk size
+    :param params: Additional reader parameters
+    """
+    expected_chunks = list(pd.read_fwf(io.StringIO(FIXED_WIDTH_DATA), chunksize=chunksize, **READER_PARAMS, **params))
+
+    with read_fixed_width(io.BytesIO(FIXED_WIDTH_DATA.encode()), chunksize=chunksize, **READER_PARAMS, **params) \
+            as reader:
+        assert isinstance(reader, FixedWidthReader)
+        chunks = list(reader)
+
+    assert len(chunks) == len(expected_chunks)
+    for chunk, expected_chunk in zip(chunks, expected_chunks):
+        assert_frame_equal(chunk, expected_chunk, check_index_type=False)
+
+
+def test_fixed_width_reader_file(tmp_path):
+    """Validates that files are read, and that a byte order mark is removed"""
+    file_path = tmp_path / "patient.dat"
+    file_path.write_text(FIXED_WIDTH_DATA, encoding="utf-8-sig")
+
+    data_frame = pd.concat(read_fixed_width(str(file_path), chunksize=4, **READER_PARAMS))
+    assert data_frame["mrn"].iloc[0] == "MRN1"
+    assert data_frame["name"].tolist()[:2] == ["Doe", "Bösch"]
+    assert list(data_frame.index) == list(range(len(data_frame)))
+
+
+@pytest.mark.parametrize("source, params", [
+    ("patient.dat.gz", {"chunksize": 2, **READER_PARAMS}),
+    ("patient.dat", {"chunksize": 2, "widths": [6, 6, 4], "names": ["mrn", "name", "code"], "header": None}),
+    ("patient.dat", {**READER_PARAMS, "chunksize": 2, "nrows": 1}),
+    ("patient.dat", READER_PARAMS)
+])
+def test_read_fixed_width_unsupported(monkeypatch, source: str, params: Dict):
+    """Validates that unsupported sources and parameters are read with pandas.read_fwf"""
+    monkeypatch.setattr(pd, "read_fwf", lambda *args, **kwargs: "read_fwf")
+    assert read_fixed_width(source, **params) == "read_fwf"
+
+
+def test_fixed_width_reader_invalid_widths():
+    with pytest.raises(ValueError):
+        FixedWidthReader("patient.dat", [6, 6], ["mrn", "name", "code"], 10)
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+from linuxforhealth.csvtofhir.fhirrs import CONVERTER_MODULES, conversion_by_resource
+from linuxforhealth.csvtofhir.model.contract import FHIR_RESOURCES
+
+IMPORT_BENCHMARK_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": list(sys.modules)}}))
+"""
+
+
+def run_import_benchmark(module: str) -> Dict:
+    """
+    Imports a module in a new interpreter.
+
+    :param module: The module to import
+    :return: dictionary containing the import time in seconds, "elapsed", and the loaded modules, "modules"
+    """
+    src_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "src")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([src_directory, env.get("PYTHONPATH", "")])
+
+    result = subprocess.run([sys.executable, "-c", IMPORT_BENCHMARK_SCRIPT.format(module=module)],
+                            capture_output=True,
+                            check=True,
+                            env=env,
+                            text=True)
+    benchmark = json.loads(result.stdout)
+    print(f"import {module}: {benchmark['elapsed']:.3f}s")
+    return benchmark
+
+
+def test_import_converter_benchmark():
+    """Validates that importing the converter does not import the resource converter modules"""
+    benchmark = run_import_benchmark("linuxforhealth.csvtofhir.converter")
+    converter_modules = [f"linuxforhealth.csvtofhir.fhirrs.{m}" for m in CONVERTER_MODULES.values()]
+    assert not set(converter_modules).intersection(benchmark["modules"])
+
+
+def test_import_contract_benchmark():
+    """Validates that importing the data contract model does not import fhir.resources"""
+    benchmark = run_import_benchmark("linuxforhealth.csvtofhir.model.contract")
+    assert "fhir.resources" not in benchmark["modules"]
+
+
+def test_import_cli_benchmark():
+    """Validates that importing the CLI does not import the converter, the FHIR models, or the command modules"""
+    benchmark = run_import_benchmark("linuxforhealth.csvtofhir.cli.main")
+    excluded_modules = {"pandas",
+                        "fhir.resources",
+                        "linuxforhealth.csvtofhir.converter",
+                        "linuxforhealth.csvtofhir.bundle",
+                        "linuxforhealth.csvtofhir.loader",
+                        "linuxforhealth.csvtofhir.cli.convert",
+                        "linuxforhealth.csvtofhir.cli.load",
+                        "linuxforhealth.csvtofhir.cli.serve",
+                        "linuxforhealth.csvtofhir.cli.watch",
+                        "linuxforhealth.csvtofhir.cli.writers"}
+    assert not excluded_modules.intersection(benchmark["modules"])
+
+
+def test_conversion_by_resource():
+    """Validates that the converter registry resolves convert_record functions"""
+    from linuxforhealth.csvtofhir.fhirrs.patient import convert_record
+
+    assert conversion_by_resource["Patient"] is convert_record
+    assert len(conversion_by_resource) == len(CONVERTER_MODULES)
+    assert set(conversion_by_resource) == set(CONVERTER_MODULES)
+
+    with pytest.raises(KeyError):
+        conversion_by_resource["NotAResource"]
+
+
+@pytest.mark.parametrize("resource_type", ["patient", "observation", "medication_use", "unstructured"])
+def test_fhir_resources(resource_type: str):
+    assert resource_type in FHIR_RESOURCES
+
+
+@pytest.mark.parametrize("module_name", ["fhirresourcemodel", "fhirtypes", "fhirtypesvalidators", "STU3", "DSTU2"])
+def test_fhir_resources_exclude_non_models(module_name: str):
+    """Validates that fhir.resources modules and packages which do not implement an R4 model are excluded"""
+    assert module_name not in FHIR_RESOURCES
@@ -0,0 +1,185 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Generator, List
+
+import pytest
+
+from linuxforhealth.csvtofhir.checkpoint import ConversionCheckpoint
+from linuxforhealth.csvtofhir.cli.main import main
+from linuxforhealth.csvtofhir.config import get_converter_config
+from linuxforhealth.csvtofhir.loader import FhirLoader
+
+
+class FhirServer(ThreadingHTTPServer):
+    """A stand-in FHIR server which records posted Bundles and returns queued response statuses"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FhirRequestHandler)
+        self.bundles: List[Dict] = []
+        self.statuses: List[int] = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/fhir"
+
+
+class FhirRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+            if status == 200:
+                self.server.bundles.append(json.loads(body))
+
+        response = b'{"resourceType": "Bundle", "type": "transaction-response"}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/fhir+json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fhir_server() -> Generator[FhirServer, None, None]:
+    server = FhirServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_bundle(entry_count: int) -> bytes:
+    entries = [{"resource": {"resourceType": "Patient", "id": str(i)}} for i in range(entry_count)]
+    return json.dumps({"resourceType": "Bundle", "type": "transaction", "entry": entries}).encode()
+
+
+def test_loader(fhir_server: FhirServer):
+    """Validates that bundles are posted over persistent connections"""
+    with FhirLoader(fhir_server.url, concurrency=2) as loader:
+        for _ in range(10):
+            loader.submit(create_bundle(3), 3)
+
+    assert len(fhir_server.bundles) == 10
+    assert len(fhir_server.connections) <= 2
+    assert loader.stats.status_counts == {200: 10}
+    assert loader.stats.entries == 30
+
+
+def test_loader_retry(fhir_server: FhirServer):
+    """Validates that 429 and 5xx responses are retried and that 4xx responses are not"""
+    fhir_server.statuses = [429, 503, 200, 400]
+    with FhirLoader(fhir_server.url, concurrency=1, backoff_factor=0.01) as loader:
+        loader.submit(create_bundle(1), 1)
+        loader.submit(create_bundle(1), 1)
+
+    assert len(fhir_server.bundles) == 1
+    assert loader.stats.retries == 2
+    assert loader.stats.status_counts == {200: 1, 400: 1}
+    assert loader.stats.failures == 1
+
+
+def test_loader_max_retries(fhir_server: FhirServer):
+    fhir_server.statuses = [500, 500, 500]
+    with FhirLoader(fhir_server.url, max_retries=2, backoff_factor=0.01) as loader:
+        loader.submit(create_bundle(1), 1)
+
+    assert loader.stats.status_counts == {500: 1}
+    assert loader.stats.retries == 2
+
+
+def test_loader_connection_error():
+    """Validates that connection errors are counted as failures"""
+    with FhirLoader("http://127.0.0.1:9", max_retries=1, backoff_factor=0.01, timeout=1) as loader:
+        loader.submit(create_bundle(1), 1)
+    assert loader.stats.failures == 1
+
+
+def test_loader_invalid_url():
+    with pytest.raises(ValueError):
+        FhirLoader("ftp://localhost/fhir")
+
+
+def test_cli_convert_post_to(csv_directory: str, data_contract_directory: str, monkeypatch, fhir_server: FhirServer):
+    """Validates that the convert command posts transaction Bundles"""
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    get_converter_config.cache_clear()
+
+    main(["convert", "-f", f"{csv_directory}/Patient.csv", "-c", data_contract_directory,
+          "--post-to", fhir_server.url])
+
+    assert len(fhir_server.bundles) == 1
+    assert fhir_server.bundles[0]["entry"][0]["request"]["method"] == "PUT"
+
+
+def test_cli_load(tmp_path, fhir_server: FhirServer):
+    """
+    Validates that the load command posts NDJSON resources as Bundles, posts Bundle files as-is, and skips hidden
+    files
+    """
+    (tmp_path / "Patient-00001.ndjson").write_text(
+        "\n".join(json.dumps({"resourceType": "Patient", "id": str(i)}) for i in range(5)))
+    (tmp_path / "MRN1234").mkdir()
+    (tmp_path / "MRN1234" / "MRN1234-Bundle-00001.json").write_bytes(create_bundle(2))
+    (tmp_path / "MRN1234" / "Patient-MRN1234.json").write_text(
+        json.dumps({"resourceType": "Patient", "id": "5"}, indent=2))
+    (tmp_path / "notes.txt").write_text("not a resource")
+    (tmp_path / ".csvtofhir-manifest.json").write_text(json.dumps({"files": {}}, indent=2))
+
+    main(["load", "-i", str(tmp_path), "--post-to", fhir_server.url, "--bundle-max-entries", "3",
+          "--post-header", "Authorization: Bearer token"])
+
+    entry_counts = sorted(len(b["entry"]) for b in fhir_server.bundles)
+    assert entry_counts == [2, 3, 3]
+    urls = [e["request"]["url"] for b in fhir_server.bundles for e in b["entry"] if "request" in e]
+    assert sorted(urls) == [f"Patient/{i}" for i in range(6)]
+
+
+def test_cli_load_failure(tmp_path, fhir_server: FhirServer):
+    """Validates that the load command exits with a non-zero status when a request fails"""
+    (tmp_path / "Patient-00001.ndjson").write_text(json.dumps({"resourceType": "Patient", "id": "1"}))
+    fhir_server.statuses = [400]
+
+    with pytest.raises(SystemExit) as exc_info:
+        main(["load", "-i", str(tmp_path), "--post-to", fhir_server.url])
+    assert exc_info.value.code != 0
+
+
+def test_cli_convert_post_to_failure(csv_directory: str,
+                                     data_contract_directory: str,
+                                     monkeypatch,
+                                     tmp_path,
+                                     fhir_server: FhirServer):
+    """
+    Validates that the convert command exits with a non-zero status when a post fails, keeping the checkpoint so that
+    a resumed conversion posts the failed bundle again
+    """
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    get_converter_config.cache_clear()
+    fhir_server.statuses = [400]
+    checkpoint_path = tmp_path / "checkpoint.json"
+    convert_args = ["convert", "-f", f"{csv_directory}/Patient.csv", "-c", data_contract_directory,
+                    "--post-to", fhir_server.url, "--checkpoint", str(checkpoint_path)]
+
+    with pytest.raises(SystemExit) as exc_info:
+        main(convert_args)
+    assert exc_info.value.code != 0
+    assert fhir_server.bundles == []
+    checkpoint = ConversionCheckpoint(str(checkpoint_path))
+    checkpoint.load()
+    assert not checkpoint.is_completed(f"{csv_directory}/Patient.csv")
+
+    main(convert_args + ["--resume"])
+    assert len(fhir_server.bundles) == 1
+    assert not checkpoint_path.exists()
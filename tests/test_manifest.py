@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from linuxforhealth.csvtofhir.manifest import ConversionManifest, hash_directory, hash_file
+
+
+@pytest.fixture
+def source_file(tmp_path) -> str:
+    file_path = tmp_path / "patient.csv"
+    file_path.write_text("patientId\nMRN1234\n")
+    return str(file_path)
+
+
+def test_hash_file(source_file: str):
+    source_hash = hash_file(source_file)
+    assert source_hash == hash_file(source_file)
+
+    with open(source_file, "a") as f:
+        f.write("MRN5678\n")
+    assert hash_file(source_file) != source_hash
+
+
+def test_hash_directory(tmp_path):
+    """Validates that the directory hash changes when a file changes, and ignores hidden files"""
+    (tmp_path / "data-contract.json").write_text("{}")
+    (tmp_path / "codes").mkdir()
+    (tmp_path / "codes" / "sex.csv").write_text("F,female")
+    directory_hash = hash_directory(str(tmp_path))
+
+    (tmp_path / ".hidden").write_text("ignored")
+    assert hash_directory(str(tmp_path)) == directory_hash
+
+    (tmp_path / "codes" / "sex.csv").write_text("F,female\nM,male")
+    assert hash_directory(str(tmp_path)) != directory_hash
+
+
+def test_conversion_manifest(tmp_path, source_file: str):
+    """Validates that a source file is current if its content, configuration, and output are unchanged"""
+    manifest_path = str(tmp_path / "manifest.json")
+    output = {"directory": "/output", "outputFormat": "json"}
+
+    manifest = ConversionManifest(manifest_path, output)
+    assert not manifest.is_current(source_file, "source", "contract")
+    manifest.record(source_file, "source", "contract", ["source"])
+    manifest.save()
+
+    manifest = ConversionManifest(manifest_path, output)
+    assert manifest.is_current(source_file, "source", "contract")
+    assert not manifest.is_current(source_file, "changed", "contract")
+    assert not manifest.is_current(source_file, "source", "changed")
+
+    manifest = ConversionManifest(manifest_path, {"directory": "/other", "outputFormat": "json"})
+    assert not manifest.is_current(source_file, "source", "contract")
+
+
+def test_conversion_manifest_save(tmp_path, source_file: str):
+    """Validates that the manifest is only written when entries are recorded"""
+    manifest_path = tmp_path / "manifest.json"
+    manifest = ConversionManifest(str(manifest_path), {})
+    manifest.save()
+    assert not manifest_path.exists()
+
+    manifest.record(source_file, "source", "contract", ["source"])
+    manifest.save()
+    entries = json.loads(manifest_path.read_text())["files"]
+    assert entries[source_file]["sourceHash"] == "source"
@@ -0,0 +1,77 @@
+import json
+import pickle
+
+import pytest
+from fhir.resources.patient import Patient
+
+from linuxforhealth.csvtofhir import serialization
+from linuxforhealth.csvtofhir.config import ConverterConfig, get_converter_config
+from linuxforhealth.csvtofhir.serialization import (SerializedResource, dumps, get_json_backend, loads,
+                                                    serialize_resource)
+from linuxforhealth.csvtofhir.support import get_fhir_resource_types
+
+
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    get_converter_config.cache_clear()
+
+
+@pytest.fixture
+def patient_resource() -> Patient:
+    return Patient(**{
+        "id": "MRN1234",
+        "birthDate": "1951-07-06",
+        "gender": "male",
+        "meta": {"extension": [{"url": "http://ibm.com/fhir/cdm/StructureDefinition/tenant-id",
+                                "valueString": "sample-tenant"}]}
+    })
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_serialize_resource(monkeypatch, patient_resource: Patient, backend: str):
+    """
+    Validates that serialized resources match the fhir.resources JSON encoding and carry the resource type and meta.
+    """
+    pytest.importorskip(backend)
+    monkeypatch.setattr(serialization, "get_converter_config", lambda: ConverterConfig(json_serializer=backend))
+    assert get_json_backend() == backend
+
+    result = serialize_resource(patient_resource)
+    assert isinstance(result, str)
+    assert json.loads(result) == json.loads(patient_resource.json())
+    assert result.resource_type == "Patient"
+    assert result.meta["extension"][0]["valueString"] == "sample-tenant"
+    assert get_fhir_resource_types([result]) == ["Patient"]
+
+
+def test_serialized_resource_pickle():
+    """Validates that SerializedResource attributes survive pickling, used when results cross process boundaries."""
+    resource = SerializedResource('{"resourceType":"Patient"}', "Patient", {"versionId": "1"})
+    copied = pickle.loads(pickle.dumps(resource))
+    assert copied == resource
+    assert copied.resource_type == "Patient"
+    assert copied.meta == {"versionId": "1"}
+
+
+def test_dumps_and_loads():
+    data = {"b": 1, "a": [1, 2]}
+    result = dumps(data, sort_keys=True)
+    assert isinstance(result, bytes)
+    assert result == b'{"a":[1,2],"b":1}'
+    assert loads(result) == data
+
+
+def test_invalid_json_backend(monkeypatch):
+    monkeypatch.setattr(serialization, "get_converter_config", lambda: ConverterConfig(json_serializer="yaml"))
+    with pytest.raises(ValueError):
+        get_json_backend()
+
+
+def test_json_backend_resolved_once(monkeypatch):
+    """Validates that the JSON backend is resolved once for each configured serializer"""
+    monkeypatch.setattr(serialization, "get_converter_config", lambda: ConverterConfig(json_serializer="json"))
+    serialization._resolve_json_backend.cache_clear()
+
+    assert get_json_backend() == "json"
+    assert loads(dumps({"a": 1})) == {"a": 1}
+    assert serialization._resolve_json_backend.cache_info().misses == 1
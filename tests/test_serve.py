@@ -0,0 +1,138 @@
+import http.client
+import json
+import os
+import sys
+import threading
+from argparse import Namespace
+from typing import Generator, List, Tuple
+
+import pytest
+
+from linuxforhealth.csvtofhir.cli.serve import ConversionServer, is_allowed_path, serve
+from linuxforhealth.csvtofhir.fhirrs import conversion_by_resource
+from linuxforhealth.csvtofhir.config import get_converter_config
+
+
+@pytest.fixture
+def conversion_server(data_contract_directory: str,
+                      csv_directory: str,
+                      monkeypatch) -> Generator[ConversionServer, None, None]:
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", data_contract_directory)
+    get_converter_config.cache_clear()
+
+    server = ConversionServer(("127.0.0.1", 0), max_concurrent_requests=1, path_roots=[csv_directory])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server: ConversionServer, url: str, body: bytes = b"") -> Tuple[int, List[dict]]:
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request("POST", url, body=body)
+    response = connection.getresponse()
+    data = response.read().decode()
+    connection.close()
+
+    if response.getheader("Content-Type") == "application/x-ndjson":
+        return response.status, [json.loads(line) for line in data.splitlines()]
+    return response.status, [json.loads(data)]
+
+
+def test_convert_payload(conversion_server: ConversionServer, csv_directory: str):
+    """Validates that a posted CSV payload is converted and streamed as NDJSON"""
+    with open(os.path.join(csv_directory, "Patient.csv"), "rb") as f:
+        status, resources = post(conversion_server, "/convert?fileName=Patient.csv", f.read())
+
+    assert status == 200
+    assert "Patient" in [r["resourceType"] for r in resources]
+
+
+def test_convert_path(conversion_server: ConversionServer, csv_directory: str):
+    """Validates that a source file path is converted"""
+    status, resources = post(conversion_server, f"/convert?path={os.path.join(csv_directory, 'Patient.csv')}")
+
+    assert status == 200
+    assert "Patient" in [r["resourceType"] for r in resources]
+
+
+@pytest.mark.parametrize("url,expected_status", [
+    ("/convert", 400),
+    ("/convert?fileName=unknown.csv", 400),
+    ("/convert?path=/tmp/not-a-real-dir/Patient.csv", 403),
+    ("/unknown", 404)
+])
+def test_convert_errors(conversion_server: ConversionServer, url: str, expected_status: int):
+    """Validates the error responses for invalid requests"""
+    status, data = post(conversion_server, url, b"a,b\n1,2")
+    assert status == expected_status
+    assert "error" in data[0]
+
+
+def test_convert_path_not_found(conversion_server: ConversionServer, csv_directory: str):
+    """Validates that a missing file within a path root receives a 404 response"""
+    status, data = post(conversion_server, f"/convert?path={os.path.join(csv_directory, 'missing', 'Patient.csv')}")
+    assert status == 404
+    assert "error" in data[0]
+
+
+@pytest.mark.parametrize("relative_path", ["../config/data-contract.json", "../../setup.cfg"])
+def test_convert_path_outside_root(conversion_server: ConversionServer, csv_directory: str, relative_path: str):
+    """Validates that paths which resolve outside of the path roots receive a 403 response"""
+    status, data = post(conversion_server, f"/convert?path={os.path.join(csv_directory, relative_path)}")
+    assert status == 403
+    assert "error" in data[0]
+
+
+def test_convert_path_without_roots(conversion_server: ConversionServer, csv_directory: str):
+    """Validates that path requests are refused when no path roots are configured"""
+    conversion_server.path_roots = []
+    status, _ = post(conversion_server, f"/convert?path={os.path.join(csv_directory, 'Patient.csv')}")
+    assert status == 403
+
+
+@pytest.mark.parametrize("file_path,expected", [
+    ("/data/input/patient.csv", True),
+    ("/data/input/nested/patient.csv", True),
+    ("/data/input/../output/patient.csv", False),
+    ("/data/input-other/patient.csv", False),
+    ("/etc/passwd", False)
+])
+def test_is_allowed_path(file_path: str, expected: bool):
+    """Validates that paths are compared to the path roots after they are resolved"""
+    assert is_allowed_path(file_path, ["/data/input"]) is expected
+    assert is_allowed_path(file_path, []) is False
+
+
+def test_concurrency_limit(conversion_server: ConversionServer, csv_directory: str):
+    """Validates that requests which exceed the concurrency limit receive a 503 response"""
+    conversion_server.request_slots.acquire()
+    try:
+        status, _ = post(conversion_server, f"/convert?path={os.path.join(csv_directory, 'Patient.csv')}")
+        assert status == 503
+    finally:
+        conversion_server.request_slots.release()
+
+    connection = http.client.HTTPConnection(*conversion_server.server_address)
+    connection.request("GET", "/health")
+    assert connection.getresponse().status == 200
+    connection.close()
+
+
+def test_serve_loads_converters(data_contract_directory: str, monkeypatch):
+    """Validates that the data contract's resource converters are imported before the first request is served"""
+    monkeypatch.setattr(conversion_by_resource, "_converters", {})
+    monkeypatch.delitem(sys.modules, "linuxforhealth.csvtofhir.fhirrs.patient", raising=False)
+
+    loaded_modules = []
+
+    def serve_forever(self):
+        loaded_modules.extend(sys.modules)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(ConversionServer, "serve_forever", serve_forever)
+    serve(Namespace(c=data_contract_directory, unix_socket=None, host="127.0.0.1", port=0, workers=1,
+                    max_concurrent_requests=1, path_root=None))
+
+    assert "linuxforhealth.csvtofhir.fhirrs.patient" in loaded_modules
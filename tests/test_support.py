@@ -1,10 +1,12 @@
+import io
 import json
 import os
 from typing import Dict, List
 
 import pytest
 
-from linuxforhealth.csvtofhir.support import (find_fhir_resources, is_valid_year, read_csv,
+from linuxforhealth.csvtofhir.support import (PrefetchReader, ThreadedWriter, find_fhir_resources, is_valid_year,
+                                              open_file, open_stream, read_csv,
 
                                               validate_paths, parse_uri_scheme)
 
@@ -267,3 +269,86 @@ def test_validate_paths(data_contract_directory: str):
 def test_parse_uri_scheme(input_uri, expected_uri):
     actual_scheme = parse_uri_scheme(input_uri)
     assert expected_uri == actual_scheme
+
+
+@pytest.mark.parametrize("compression,extension,magic", [("gzip", ".gz", b"\x1f\x8b"),
+                                                         ("bz2", ".bz2", b"BZh"),
+                                                         ("xz", ".xz", b"\xfd7zXZ")])
+def test_open_file_compression(tmp_path, compression: str, extension: str, magic: bytes):
+    """Validates that open_file round trips data with streaming compression"""
+    file_path = str(tmp_path / f"data.txt{extension}")
+    with open_file(file_path, "w", compression=compression, compresslevel=1) as f:
+        f.write("line one\nline two\n")
+
+    with open(file_path, "rb") as f:
+        assert f.read().startswith(magic)
+
+    with open_file(file_path, "r", compression=compression) as f:
+        assert f.read().splitlines() == ["line one", "line two"]
+
+
+def test_open_file_invalid_compression(tmp_path):
+    with pytest.raises(ValueError):
+        open_file(str(tmp_path / "data.txt"), "wb", compression="zstd")
+
+
+def test_threaded_writer(tmp_path):
+    """Validates that ThreadedWriter writes data in order and closes the underlying file"""
+    file_path = tmp_path / "data.txt"
+    file_obj = open(file_path, "wb")
+    with ThreadedWriter(file_obj, max_queue_size=2) as writer:
+        for i in range(100):
+            writer.write(f"{i}\n".encode())
+
+    assert file_obj.closed
+    assert file_path.read_text().splitlines() == [str(i) for i in range(100)]
+
+
+@pytest.mark.parametrize("source", [
+    b"id,name\n1,abc\n",
+    io.BytesIO(b"id,name\n1,abc\n"),
+    [b"id,", b"", b"name\n1,a", bytearray(b"bc\n")],
+    (c.encode() for c in ["id,name\n", "1,abc\n"])
+])
+def test_open_stream(source):
+    """Validates that stream sources are read as binary file-like objects"""
+    assert open_stream(source).read() == b"id,name\n1,abc\n"
+
+
+def test_open_stream_invalid_source():
+    """Validates that a str source, which may be a path or content, is rejected"""
+    with pytest.raises(TypeError):
+        open_stream("id,name\n1,abc\n")
+
+    text_stream = io.StringIO("id,name\n")
+    assert open_stream(text_stream) is text_stream
+
+
+@pytest.mark.parametrize("buffer_size", [1, 5, 1024])
+def test_prefetch_reader(buffer_size: int):
+    """Validates that the prefetch reader returns the file contents, and closes the file"""
+    content = b"".join(f"{n},row {n}\n".encode() for n in range(100))
+    source = io.BytesIO(content)
+    reader = PrefetchReader(source, buffer_size, block_size=16)
+
+    assert reader.read(10) + reader.read() == content
+    assert reader.read() == b""
+    reader.close()
+    assert source.closed
+
+
+def test_prefetch_reader_error():
+    """Validates that read errors are raised by the reader, and that a reader may be closed before it is read"""
+    class FailingFile(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell() >= 32:
+                raise OSError("connection reset")
+            return super().read(size)
+
+    with PrefetchReader(FailingFile(b"x" * 64), 8, block_size=16) as reader:
+        with pytest.raises(OSError, match="connection reset"):
+            reader.read()
+
+    source = io.BytesIO(b"x" * 1024)
+    PrefetchReader(source, 16, block_size=16).close()
+    assert source.closed
@@ -0,0 +1,82 @@
+import shutil
+import sys
+import threading
+
+import pytest
+
+from linuxforhealth.csvtofhir.cli.watch import DirectoryWatcher
+from linuxforhealth.csvtofhir.cli.writers import NdjsonResourceWriter
+from linuxforhealth.csvtofhir.config import get_converter_config
+from linuxforhealth.csvtofhir.fhirrs import conversion_by_resource
+
+
+@pytest.fixture
+def base_path(tmp_path, csv_directory: str, data_contract_directory: str, monkeypatch):
+    base_path = tmp_path / "base"
+    (base_path / "input").mkdir(parents=True)
+    shutil.copytree(data_contract_directory, base_path / "config")
+    monkeypatch.setenv("MAPPING_CONFIG_DIRECTORY", str(base_path / "config"))
+    get_converter_config.cache_clear()
+    return base_path
+
+
+def test_watcher_settle(base_path, csv_directory: str, tmp_path):
+    """Validates that files are converted once they are unchanged, and moved to the processed directory"""
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    state_path = str(output_path / "state.json")
+
+    with NdjsonResourceWriter(str(output_path)) as writer:
+        watcher = DirectoryWatcher(str(base_path), writer, settle_seconds=0, state_path=state_path)
+        shutil.copy(f"{csv_directory}/Patient.csv", base_path / "input" / "Patient-1.csv")
+        (base_path / "input" / "Patient-2.csv.tmp").write_text("partial")
+
+        # the first poll records the file size
+        assert watcher.poll() == []
+        assert watcher.poll() == [str(base_path / "input" / "Patient-1.csv")]
+        assert (base_path / "processed" / "Patient-1.csv").exists()
+        assert (base_path / "input" / "Patient-2.csv.tmp").exists()
+        assert (output_path / "Patient-00001.ndjson").exists()
+
+    patient_count = len((output_path / "Patient-00001.ndjson").read_text().splitlines())
+
+    # a restarted watcher continues the open NDJSON part
+    with NdjsonResourceWriter(str(output_path)) as writer:
+        watcher = DirectoryWatcher(str(base_path), writer, settle_seconds=0, state_path=state_path)
+        shutil.copy(f"{csv_directory}/Patient.csv", base_path / "input" / "Patient-3.csv")
+        watcher.poll()
+        assert len(watcher.poll()) == 1
+
+    assert len((output_path / "Patient-00001.ndjson").read_text().splitlines()) == 2 * patient_count
+    assert not (output_path / "Patient-00002.ndjson").exists()
+
+
+def test_watcher_ready_marker(base_path, csv_directory: str, tmp_path):
+    """Validates that files are converted once their ready marker exists, and unmatched files are moved to failed"""
+    with NdjsonResourceWriter(str(tmp_path)) as writer:
+        watcher = DirectoryWatcher(str(base_path), writer, ready_marker=".done")
+        shutil.copy(f"{csv_directory}/Patient.csv", base_path / "input" / "Patient.csv")
+        (base_path / "input" / "unknown.csv").write_text("a,b\n1,2")
+        assert watcher.poll() == []
+
+        (base_path / "input" / "Patient.csv.done").touch()
+        (base_path / "input" / "unknown.csv.done").touch()
+        assert watcher.poll() == [str(base_path / "input" / "Patient.csv")]
+
+    assert list((base_path / "input").iterdir()) == []
+    assert (base_path / "processed" / "Patient.csv").exists()
+    assert (base_path / "failed" / "unknown.csv").exists()
+    assert (watcher.processed_count, watcher.failed_count) == (1, 1)
+
+
+def test_watcher_loads_converters(base_path, tmp_path, monkeypatch):
+    """Validates that the data contract's resource converters are imported when the watcher starts"""
+    monkeypatch.setattr(conversion_by_resource, "_converters", {})
+    monkeypatch.delitem(sys.modules, "linuxforhealth.csvtofhir.fhirrs.patient", raising=False)
+
+    stop_event = threading.Event()
+    stop_event.set()
+    with NdjsonResourceWriter(str(tmp_path)) as writer:
+        DirectoryWatcher(str(base_path), writer).run(stop_event=stop_event)
+
+    assert "linuxforhealth.csvtofhir.fhirrs.patient" in sys.modules
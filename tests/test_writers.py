@@ -0,0 +1,241 @@
+import gzip
+import json
+import lzma
+from typing import List
+
+import pytest
+
+from linuxforhealth.csvtofhir.cli.writers import (FileResourceWriter, GroupedResourceWriter, NdjsonResourceWriter,
+                                                  QueuedResourceWriter, ResourceWriter, get_safe_file_id)
+from linuxforhealth.csvtofhir.serialization import ConvertedResource
+from linuxforhealth.csvtofhir.support import open_file
+
+
+def create_resource(resource_type: str, resource_id: str, source_file: str = "patient.csv:00001") \
+        -> ConvertedResource:
+    meta = {"extension": [{"url": "http://ibm.com/fhir/cdm/StructureDefinition/source-file-id",
+                           "valueString": source_file}]}
+    data = {"resourceType": resource_type, "id": resource_id}
+    return ConvertedResource(json.dumps(data).encode(), resource_type, resource_id, meta, 1, "MRN1234")
+
+
+@pytest.fixture
+def resources() -> List[ConvertedResource]:
+    return [create_resource("Patient", str(i)) for i in range(5)] + [create_resource("Encounter", "E1")]
+
+
+def test_ndjson_writer(tmp_path, resources: List[ConvertedResource]):
+    """Validates that NDJSON files are written per resource type"""
+    with NdjsonResourceWriter(str(tmp_path)) as writer:
+        writer.write("MRN1234", resources)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Encounter-00001.ndjson", "Patient-00001.ndjson"]
+    lines = (tmp_path / "Patient-00001.ndjson").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["0", "1", "2", "3", "4"]
+    assert writer.resource_count == 6
+
+
+def test_ndjson_writer_rotation(tmp_path, resources: List[ConvertedResource]):
+    """Validates that NDJSON files are rotated by record count and size"""
+    with NdjsonResourceWriter(str(tmp_path), max_records=2) as writer:
+        writer.write("MRN1234", resources[:5])
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "Patient-00001.ndjson", "Patient-00002.ndjson", "Patient-00003.ndjson"]
+
+    size_path = tmp_path / "size"
+    size_path.mkdir()
+    record_size = len(resources[0].resource) + 1
+    with NdjsonResourceWriter(str(size_path), max_bytes=record_size * 3) as writer:
+        writer.write("MRN1234", resources[:5])
+    assert sorted(p.name for p in size_path.iterdir()) == ["Patient-00001.ndjson", "Patient-00002.ndjson"]
+    assert len((size_path / "Patient-00001.ndjson").read_text().splitlines()) == 3
+
+
+def test_ndjson_writer_source_file_partition(tmp_path):
+    """Validates that NDJSON files are partitioned by resource type and source file"""
+    resources = [create_resource("Patient", "1", "patient-a.csv:00001"),
+                 create_resource("Patient", "2", "patient-b.csv:00001")]
+    with NdjsonResourceWriter(str(tmp_path), partition="source-file") as writer:
+        writer.write("MRN1234", resources)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "Patient-patient-a-00001.ndjson", "Patient-patient-b-00001.ndjson"]
+
+
+@pytest.mark.parametrize("compression_thread", [False, True])
+def test_ndjson_writer_compression(tmp_path, resources: List[ConvertedResource], compression_thread: bool):
+    """Validates that NDJSON files are compressed, optionally on a background thread"""
+    with NdjsonResourceWriter(str(tmp_path),
+                              buffer_size=64,
+                              compression="gzip",
+                              compression_level=1,
+                              compression_thread=compression_thread) as writer:
+        writer.write("MRN1234", resources)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Encounter-00001.ndjson.gz", "Patient-00001.ndjson.gz"]
+    with gzip.open(tmp_path / "Patient-00001.ndjson.gz", "rt") as f:
+        assert [json.loads(line)["id"] for line in f] == ["0", "1", "2", "3", "4"]
+
+
+def test_file_writer_compression(tmp_path, resources: List[ConvertedResource]):
+    """Validates that per-resource files are compressed"""
+    with FileResourceWriter(str(tmp_path), compression="xz") as writer:
+        writer.write("MRN1234", resources[-1:])
+
+    output_path = tmp_path / "MRN1234" / "MRN1234-Encounter-patient-00001.json.xz"
+    with lzma.open(output_path) as f:
+        assert json.loads(f.read())["id"] == "E1"
+
+
+@pytest.mark.parametrize("writer_threads", [1, 4])
+def test_queued_writer(tmp_path, writer_threads: int):
+    """Validates that queued writes for each group key are written in order"""
+    with QueuedResourceWriter(FileResourceWriter(str(tmp_path)), writer_threads, max_queue_size=2) as writer:
+        for i in range(20):
+            writer.write(f"MRN{i % 5}", [create_resource("Patient", str(i))])
+
+    assert writer.resource_count == 20
+    assert writer.stats.batch_count == 20
+    assert writer.stats.max_queue_depth <= 2 * writer_threads
+    for i in range(5):
+        file_names = sorted(p.name for p in (tmp_path / f"MRN{i}").iterdir())
+        ids = [json.loads((tmp_path / f"MRN{i}" / f).read_text())["id"] for f in file_names]
+        assert ids == [str(n) for n in range(i, 20, 5)]
+
+
+def test_queued_writer_single_thread(tmp_path, resources: List[ConvertedResource]):
+    """Validates that writers which are not group key thread safe use a single writer thread"""
+    writer = QueuedResourceWriter(NdjsonResourceWriter(str(tmp_path)), writer_threads=4)
+    writer.write("MRN1234", resources)
+    writer.close()
+    assert len(writer._threads) == 1
+    assert len((tmp_path / "Patient-00001.ndjson").read_text().splitlines()) == 5
+
+
+def test_queued_writer_error(tmp_path):
+    """Validates that writer thread errors are raised to the caller"""
+
+    class FailingWriter(ResourceWriter):
+        def write(self, group_key, resources):
+            raise OSError("disk full")
+
+    writer = QueuedResourceWriter(FailingWriter(str(tmp_path)))
+    writer.write("MRN1234", [])
+    with pytest.raises(OSError):
+        writer.close()
+
+
+def test_resource_writer_is_abstract(tmp_path):
+    """Validates that writers must implement write"""
+
+    class IncompleteWriter(ResourceWriter):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteWriter(str(tmp_path))
+
+
+def test_grouped_writer(tmp_path):
+    """Validates that resources are grouped by group key across writes into an NDJSON file per group key"""
+    sort_path = tmp_path / "sort"
+    sort_path.mkdir()
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+
+    ndjson_writer = NdjsonResourceWriter(str(output_path), partition="group-key", max_records=3)
+    with GroupedResourceWriter(ndjson_writer, sort_buffer_records=2, sort_temp_dir=str(sort_path)) as writer:
+        for i in range(4):
+            writer.write("MRN1", [create_resource("Encounter", f"E{i}")])
+            writer.write("MRN2", [create_resource("Patient", str(i))])
+
+    assert writer.resource_count == 8
+    assert sorted(p.name for p in output_path.iterdir()) == [
+        "MRN1-00001.ndjson", "MRN1-00002.ndjson", "MRN2-00001.ndjson", "MRN2-00002.ndjson"]
+    lines = (output_path / "MRN1-00001.ndjson").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["E0", "E1", "E2"]
+    assert list(sort_path.iterdir()) == []
+
+
+def test_get_safe_file_id():
+    assert get_safe_file_id(create_resource("Patient", "1", "2022 patient.csv:00001").meta) == "2022_patient"
+    assert get_safe_file_id({}) == ""
+
+
+@pytest.mark.parametrize("compression, extension", [(None, ""), ("gzip", ".gz"), ("xz", ".xz")])
+def test_ndjson_writer_checkpoint_restore(tmp_path, resources: List[ConvertedResource], compression: str,
+                                          extension: str):
+    """
+    Validates that a restored NDJSON writer continues the open part after a checkpoint, removing the resources
+    written after the checkpoint
+    """
+    writer = NdjsonResourceWriter(str(tmp_path), max_records=6, compression=compression)
+    writer.write("MRN1234", resources[:3])
+    state = writer.checkpoint()
+    assert state["openParts"]["Patient"]["records"] == 3
+    writer.write("MRN1234", resources[3:5])
+    writer.checkpoint()
+
+    restored_writer = NdjsonResourceWriter(str(tmp_path), max_records=6, compression=compression)
+    restored_writer.restore(json.loads(json.dumps(state)))
+    with restored_writer:
+        restored_writer.write("MRN1234", resources[3:5] + [create_resource("Patient", str(n)) for n in range(5, 8)])
+
+    with open_file(str(tmp_path / f"Patient-00001.ndjson{extension}"), "rt", compression=compression) as f:
+        assert [json.loads(line)["id"] for line in f] == [str(n) for n in range(6)]
+    with open_file(str(tmp_path / f"Patient-00002.ndjson{extension}"), "rt", compression=compression) as f:
+        assert [json.loads(line)["id"] for line in f] == ["6", "7"]
+
+
+def test_ndjson_writer_restore_missing_part(tmp_path, resources: List[ConvertedResource]):
+    """Validates that a restored NDJSON writer continues with the next part if an open part is missing"""
+    (tmp_path / "output").mkdir()
+    writer = NdjsonResourceWriter(str(tmp_path / "output"))
+    writer.write("MRN1234", resources[:2])
+    state = writer.checkpoint()
+
+    (tmp_path / "other").mkdir()
+    with NdjsonResourceWriter(str(tmp_path / "other")) as restored_writer:
+        restored_writer.restore(json.loads(json.dumps(state)))
+        restored_writer.write("MRN1234", resources[2:3])
+
+    assert [p.name for p in (tmp_path / "other").iterdir()] == ["Patient-00002.ndjson"]
+
+
+def test_file_writer_checkpoint_restore(tmp_path, resources: List[ConvertedResource]):
+    """Validates that a restored file writer continues the resource counters after a checkpoint"""
+    writer = FileResourceWriter(str(tmp_path))
+    writer.write("MRN1234", resources[:2])
+
+    restored_writer = FileResourceWriter(str(tmp_path))
+    restored_writer.restore(json.loads(json.dumps(writer.checkpoint())))
+    restored_writer.write("MRN1234", resources[2:3])
+
+    file_names = sorted(p.name for p in (tmp_path / "MRN1234").iterdir())
+    assert file_names == [f"MRN1234-Patient-patient-0000{n}.json" for n in range(1, 4)]
+
+
+def test_file_writer_checkpoint_state(tmp_path):
+    """
+    Validates that file writer checkpoints contain the counters for the source files written since the previous
+    checkpoint, and that other counters are restored from the output files
+    """
+    writer = FileResourceWriter(str(tmp_path))
+    writer.write("MRN1", [create_resource("Patient", "1", "patient-a.csv:00001")])
+    writer.write("MRN2", [create_resource("Patient", "2", "patient-a.csv:00002")])
+    writer.checkpoint()
+    writer.write("MRN1", [create_resource("Patient", "3", "patient-b.csv:00001")])
+    state = writer.checkpoint()
+    assert state == {"groupKeyResourceCounter": {"MRN1": {"Patient-patient-b": 1}}}
+    assert writer.checkpoint() == state
+
+    # written after the checkpoint, and written again when resumed
+    writer.write("MRN1", [create_resource("Patient", "4", "patient-b.csv:00002")])
+
+    restored_writer = FileResourceWriter(str(tmp_path))
+    restored_writer.restore(json.loads(json.dumps(state)))
+    restored_writer.write("MRN1", [create_resource("Patient", "4", "patient-b.csv:00002"),
+                                   create_resource("Patient", "5", "patient-a.csv:00003")])
+
+    file_names = sorted(p.name for p in (tmp_path / "MRN1").iterdir())
+    assert file_names == ["MRN1-Patient-patient-a-00001.json", "MRN1-Patient-patient-a-00002.json",
+                          "MRN1-Patient-patient-b-00001.json", "MRN1-Patient-patient-b-00002.json"]